@@ -1,35 +1,126 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt  # Importing Flask-Bcrypt
 from flask_login import LoginManager  # Import Flask-Login
 
-# Initialize db, migration tools, bcrypt, and login manager globally
-db = SQLAlchemy()
-migrate = Migrate()
-bcrypt = Bcrypt()  # Initialize Bcrypt for password hashing
+from .database import RoutingSession
+
+# Initialize db and login manager globally; Flask-Migrate is set up in create_app
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Routes @read_only views to the read engine
 login_manager = LoginManager()  # Initialize LoginManager
 
 # Set up the login view
 login_manager.login_view = 'main.login'  # If user is not authenticated, redirect to the login page
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
 
     # Set the SECRET_KEY for session management
     app.config['SECRET_KEY'] = 'your_unique_and_secret_key_here'  # Make sure to replace this with a secure key
 
-    # Load app configuration from 'config.Config'
-    app.config.from_object('config.Config')
+    # Load app configuration from 'config.Config', or the profile named by APP_CONFIG
+    # (e.g. APP_CONFIG=config.ProductionConfig)
+    app.config.from_object(os.environ.get('APP_CONFIG', 'config.Config'))
+
+    # Scripts (e.g. scripts/stress_signup.py) can point the app at another database
+    if config_overrides:
+        app.config.update(config_overrides)
 
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
-    bcrypt.init_app(app)  # Initialize bcrypt with the app
+    from . import database
+    database.init_app(app, db)  # SQLite PRAGMAs and the optional read engine
     login_manager.init_app(app)  # Initialize Flask-Login
 
+    # Password hashing pool
+    from .passwords import password_hasher
+    password_hasher.init_app(app)
+
+    # Cached account snapshots for the user loader
+    from . import auth
+    auth.init_app(app)
+
+    # Rendered-fragment cache (featured events, event summaries)
+    from .cache import fragment_cache
+    fragment_cache.init_app(app)
+
+    # Full-text search index over events
+    from .search import search_index
+    search_index.init_app(app)
+
+    # Per-client rate limits (navbar search)
+    from .ratelimit import rate_limiter
+    rate_limiter.init_app(app)
+
+    # In-memory autocomplete for the navbar search box
+    from .suggest import suggest_index
+    suggest_index.init_app(app)
+
+    # Lazy-load check for templates ('raise' under TESTING)
+    from .loading import loading_guard
+    loading_guard.init_app(app)
+
+    # Opt-in per-request SQL/template timing, Server-Timing header and /metrics
+    from .instrumentation import instrumentation
+    instrumentation.init_app(app)
+
+    # Background job worker, notification jobs and the reminder scheduler
+    from .jobs import job_queue
+    from . import notifications
+    job_queue.init_app(app)
+    notifications.init_app(app)
+
+    # Precomputed event recommendations (rebuild and refresh jobs)
+    from . import recommendations
+    recommendations.init_app(app)
+
+    # Attendance log rollups for the organizer dashboard (compaction job)
+    from . import analytics
+    analytics.init_app(app)
+
+    # Calendar (.ics) feed settings
+    from . import ics
+    ics.init_app(app)
+
+    # Interval index for schedule conflicts at signup and event creation
+    from .conflicts import conflict_index
+    conflict_index.init_app(app)
+
+    # Live attendee counts for open event pages (Server-Sent Events)
+    from .live import broadcaster
+    broadcaster.init_app(app)
+
+    # Venue gazetteer coordinates and nearby-event queries
+    from . import geo
+    geo.init_app(app)
+
+    # Built, fingerprinted static bundles and the asset_tags() template helper
+    from . import assets
+    assets.init_app(app)
+
+    # Shared Jinja bytecode cache (JINJA_BYTECODE_CACHE)
+    from . import templating
+    templating.init_app(app)
+
+    # `flask db ...` (Flask-Migrate), `flask events import/export`, `flask jobs work/stats`,
+    # `flask recommendations rebuild`, `flask analytics compact/rebuild`, `flask templates precompile`,
+    # `flask geo import-venues/backfill`, `flask assets vendor/build`.
+    # Under STARTUP_OPTIMIZED, web workers skip these and the Alembic import that comes with them.
+    if not app.config.get('STARTUP_OPTIMIZED') or _running_cli():
+        from flask_migrate import Migrate
+        Migrate(app, db)
+        from . import cli
+        cli.init_app(app)
+
     # Register blueprints
     from .views import main_bp
     app.register_blueprint(main_bp)
 
     return app
+
+
+def _running_cli():
+    # The flask command builds the app inside its click context; gunicorn and scripts do not
+    import click
+    return click.get_current_context(silent=True) is not None
@@ -0,0 +1,289 @@
+"""Organizer analytics from rollups of ``attendance_log``.
+
+app/attendance.py appends one ``attendance_log`` row per signup, waitlist
+entry, promotion, decline and waitlist exit, in the same transaction as the
+change. Every ``ANALYTICS_COMPACT_INTERVAL`` seconds a job folds the rows
+written since its last run into three rollups:
+
+* ``attendance_daily``: counts per organizer and day;
+* ``event_attendance_stats``: counts per event;
+* ``tag_attendance_stats``: counts per organizer and tag.
+
+Each batch of up to ``ANALYTICS_COMPACT_BATCH`` log rows is grouped in SQL.
+It is added to the rollups and the ``rollup_state`` watermark moves past it
+in one transaction, so every log row is counted exactly once. Signups never
+write the rollup rows themselves, so a burst of clicks on one event does
+not queue on one hot counter row.
+
+``dashboard()`` reads the rollups (a window of daily rows, the organizer's
+event and tag rows) and reports them as of the watermark. The attendance
+series starts from the seats held at the watermark: the organizer's current
+``attendee_count`` total less the net change of the few log rows not folded
+yet. It walks back through the daily rollups from there, and leaves out the
+days before the log began, whose history it cannot know. Its cost follows
+the number of days, events and tags, not the length of the log. The
+numbers lag the log by at most one compaction interval; ``flask analytics
+compact`` catches up immediately.
+"""
+import math
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, insert, select, tuple_, update
+
+from . import attendance, db
+from .jobs import job_queue
+from .models import (AttendanceDaily, AttendanceLog, Event, EventAttendanceStats, EventTag, RollupState, Tag,
+                     TagAttendanceStats)
+
+# Log actions; each rollup has one counter column per action, named after it
+ACTIONS = (attendance.SIGNED_UP, attendance.WAITLISTED, attendance.PROMOTED, attendance.DECLINED,
+           attendance.LEFT_WAITLIST)
+
+# rollup_state row of the attendance_log rollups
+LOG_STATE = 'attendance_log'
+
+# Rollup keys looked up per query while folding
+FOLD_CHUNK = 500
+
+# Rows in the dashboard's top events and top tags tables
+TOP_EVENTS = 10
+TOP_TAGS = 10
+
+
+def init_app(app):
+    app.config.setdefault('ANALYTICS_COMPACT_INTERVAL', 60)
+    app.config.setdefault('ANALYTICS_COMPACT_BATCH', 20000)  # log rows folded per transaction
+    app.config.setdefault('ANALYTICS_DEFAULT_DAYS', 30)
+    app.config.setdefault('ANALYTICS_MAX_DAYS', 365)
+
+
+def compact(batch_size=None):
+    """Fold the next batch of log rows into the rollups and commit; returns the rows folded."""
+    batch_size = batch_size or current_app.config['ANALYTICS_COMPACT_BATCH']
+    state = db.session.get(RollupState, LOG_STATE)
+    if state is None:
+        state = RollupState(name=LOG_STATE, last_id=0)
+        db.session.add(state)
+        db.session.flush()
+    last_id = state.last_id
+
+    batch = select(AttendanceLog.id).where(AttendanceLog.id > last_id).order_by(AttendanceLog.id).limit(batch_size)
+    batch = batch.subquery()
+    folded, upper = db.session.execute(select(func.count(), func.max(batch.c.id))).one()
+    if not folded:
+        db.session.rollback()
+        return 0
+
+    window = (AttendanceLog.id > last_id, AttendanceLog.id <= upper, Event.organizer.isnot(None))
+    day = func.date(AttendanceLog.created_at, type_=db.Date)
+    _fold(AttendanceDaily, 2, db.session.execute(
+        select(Event.organizer, day, AttendanceLog.action, func.count())
+        .join(Event, Event.id == AttendanceLog.event_id)
+        .where(*window)
+        .group_by(Event.organizer, day, AttendanceLog.action)
+    ))
+    _fold(EventAttendanceStats, 1, db.session.execute(
+        select(AttendanceLog.event_id, Event.organizer, AttendanceLog.action, func.count())
+        .join(Event, Event.id == AttendanceLog.event_id)
+        .where(*window)
+        .group_by(AttendanceLog.event_id, Event.organizer, AttendanceLog.action)
+    ), extra=('organizer',))
+    _fold(TagAttendanceStats, 2, db.session.execute(
+        select(Event.organizer, EventTag.tag_id, AttendanceLog.action, func.count())
+        .join(Event, Event.id == AttendanceLog.event_id)
+        .join(EventTag, EventTag.event_id == AttendanceLog.event_id)
+        .where(*window)
+        .group_by(Event.organizer, EventTag.tag_id, AttendanceLog.action)
+    ))
+
+    # Another process may have folded the same rows meanwhile; then drop ours
+    moved = db.session.execute(
+        update(RollupState)
+        .where(RollupState.name == LOG_STATE, RollupState.last_id == last_id)
+        .values(last_id=upper, updated_at=datetime.now())
+    ).rowcount
+    if not moved:
+        db.session.rollback()
+        return 0
+    db.session.commit()
+    return folded
+
+
+def compact_all(batch_size=None):
+    """Compact until the rollups have caught up with the log; returns the rows folded."""
+    batch_size = batch_size or current_app.config['ANALYTICS_COMPACT_BATCH']
+    total = 0
+    while True:
+        folded = compact(batch_size)
+        total += folded
+        if folded < batch_size:
+            return total
+
+
+def rebuild():
+    """Empty the rollups and fold the whole log again; returns the rows folded."""
+    for model in (AttendanceDaily, EventAttendanceStats, TagAttendanceStats, RollupState):
+        db.session.execute(delete(model))
+    db.session.commit()
+    return compact_all()
+
+
+def _fold(model, key_size, rows, extra=()):
+    """Add ``(*key, *extra, action, count)`` rows to ``model``'s counters, inserting missing rows."""
+    table = model.__table__
+    key_columns = list(table.primary_key.columns)
+    counts = {}
+    for row in rows:
+        key, rest = tuple(row[:key_size]), row[key_size:]
+        counts.setdefault(key, (rest[:len(extra)], Counter()))[1][rest[-2]] += rest[-1]
+    if not counts:
+        return
+
+    existing = set()
+    keys = list(counts)
+    for start in range(0, len(keys), FOLD_CHUNK):
+        existing.update(db.session.execute(
+            select(*key_columns).where(tuple_(*key_columns).in_(keys[start:start + FOLD_CHUNK]))
+        ).all())
+
+    # One executemany UPDATE for the rows that exist and one INSERT for the rest
+    updates, inserts = [], []
+    for key, (values, counters) in counts.items():
+        if key in existing:
+            updates.append({**{f'key_{column.name}': value for column, value in zip(key_columns, key)},
+                            **{f'add_{action}': counters[action] for action in ACTIONS}})
+        else:
+            inserts.append({**{column.name: value for column, value in zip(key_columns, key)},
+                            **dict(zip(extra, values)),
+                            **{action: counters[action] for action in ACTIONS}})
+    if updates:
+        db.session.execute(
+            update(table)
+            .where(*[column == bindparam(f'key_{column.name}') for column in key_columns])
+            .values({action: table.c[action] + bindparam(f'add_{action}') for action in ACTIONS}),
+            updates,
+        )
+    if inserts:
+        db.session.execute(insert(table), inserts)
+
+
+def dashboard(organizer, days=None, today=None):
+    """Attendance figures for one organizer's last ``days`` days, read from the rollups only."""
+    config = current_app.config
+    days = max(1, min(days or config['ANALYTICS_DEFAULT_DAYS'], config['ANALYTICS_MAX_DAYS']))
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+
+    rows = {
+        row.day: row for row in db.session.scalars(
+            select(AttendanceDaily)
+            .where(AttendanceDaily.organizer == organizer, AttendanceDaily.day.between(start, today))
+            .order_by(AttendanceDaily.day)
+        )
+    }
+    series = []
+    for offset in reversed(range(days)):
+        day = today - timedelta(days=offset)
+        row = rows.get(day)
+        series.append({'day': day.isoformat(), **{action: getattr(row, action, 0) for action in ACTIONS}})
+
+    # Seats held at the watermark, then walked back through the rollups' daily net changes to
+    # the end of each earlier day. Days before the first log row, or after the watermark, are
+    # not covered by the rollups and get None.
+    state = db.session.get(RollupState, LOG_STATE)
+    attending, as_of, first_day = _attending_at_watermark(organizer, state)
+    later = 0
+    for point in reversed(series):
+        day = date.fromisoformat(point['day'])
+        covered = attending is not None and first_day is not None and first_day <= day <= as_of.date()
+        point['attending'] = attending - later if covered else None
+        later += _net(point)
+
+    totals = {action: sum(point[action] for point in series) for action in ACTIONS}
+    totals['decline_rate'] = _decline_rate(totals)
+
+    top_events = db.session.execute(
+        select(EventAttendanceStats, Event.event_name, Event.date)
+        .join(Event, Event.id == EventAttendanceStats.event_id)
+        .where(EventAttendanceStats.organizer == organizer)
+        .order_by((EventAttendanceStats.signed_up + EventAttendanceStats.promoted).desc(), Event.id)
+        .limit(TOP_EVENTS)
+    ).all()
+    top_tags = db.session.execute(
+        select(TagAttendanceStats, Tag.name)
+        .join(Tag, Tag.id == TagAttendanceStats.tag_id)
+        .where(TagAttendanceStats.organizer == organizer)
+        .order_by((TagAttendanceStats.signed_up + TagAttendanceStats.promoted).desc(), Tag.name)
+        .limit(TOP_TAGS)
+    ).all()
+
+    return {
+        'organizer': organizer,
+        'days': days,
+        'as_of': as_of.isoformat(timespec='seconds') if as_of else None,
+        'attending': attending,
+        'totals': totals,
+        'daily': series,
+        'top_events': [
+            {'id': stats.event_id, 'event_name': name, 'date': event_date, **_counters(stats)}
+            for stats, name, event_date in top_events
+        ],
+        'top_tags': [{'tag': name, **_counters(stats)} for stats, name in top_tags],
+    }
+
+
+def _attending_at_watermark(organizer, state):
+    """``(seats, as_of, first_log_day)``: the organizer's seats when the rollups were last folded.
+
+    The maintained ``attendee_count`` total includes log rows the rollups have not folded yet, and
+    seats taken before the log existed; subtracting the net change of the unfolded rows gives the
+    count at the watermark, consistent with the rollups. ``as_of`` is when the first unfolded row
+    was written (now if there is none). All three are None before the first compaction.
+    """
+    if state is None:
+        return None, None, None
+    live = db.session.scalar(
+        select(func.coalesce(func.sum(Event.attendee_count), 0)).where(Event.organizer == organizer)
+    )
+    # Rows since the last compaction: at most one compaction interval's worth
+    unfolded = Counter(dict(db.session.execute(
+        select(AttendanceLog.action, func.count())
+        .join(Event, Event.id == AttendanceLog.event_id)
+        .where(AttendanceLog.id > state.last_id, Event.organizer == organizer)
+        .group_by(AttendanceLog.action)
+    ).all()))
+    next_unfolded = db.session.scalar(
+        select(AttendanceLog.created_at).where(AttendanceLog.id > state.last_id).order_by(AttendanceLog.id).limit(1)
+    )
+    first_logged = db.session.scalar(select(AttendanceLog.created_at).order_by(AttendanceLog.id).limit(1))
+    return live - _net(unfolded), next_unfolded or datetime.now(), first_logged and first_logged.date()
+
+
+def _net(counts):
+    return counts[attendance.SIGNED_UP] + counts[attendance.PROMOTED] - counts[attendance.DECLINED]
+
+
+def _counters(stats):
+    counts = {action: getattr(stats, action) for action in ACTIONS}
+    counts['decline_rate'] = _decline_rate(counts)
+    return counts
+
+
+def _decline_rate(counts):
+    seats = counts[attendance.SIGNED_UP] + counts[attendance.PROMOTED]
+    return round(counts[attendance.DECLINED] / seats, 4) if seats else None
+
+
+@job_queue.task()
+def compact_attendance_log():
+    compact_all()
+
+
+@job_queue.every('ANALYTICS_COMPACT_INTERVAL')
+def schedule_compaction():
+    # One compaction per interval across all processes sharing the job table
+    interval = current_app.config['ANALYTICS_COMPACT_INTERVAL']
+    job_queue.enqueue('compact_attendance_log', dedupe_key=f'compact_attendance_log:{math.floor(time.time() / interval)}')
@@ -0,0 +1,278 @@
+"""Static assets: vendored libraries, content-hashed bundles and precompressed copies.
+
+Pages used to load Bootstrap, jQuery and Font Awesome from CDNs, and
+base.html inlined its search script into every response. Now:
+
+* ``flask assets vendor`` downloads the pinned files in ``VENDOR`` into
+  ``app/static/vendor`` and checks their Subresource Integrity hashes where
+  the CDN publishes one. They are not part of the repository: run it once
+  per checkout, or as a deploy step before ``build``. It only fetches files
+  that are missing, and afterwards building and serving need no network.
+* ``flask assets build`` joins the files of each bundle in ``BUNDLES`` and
+  names the result after its content (``site.3f9c2a1b7d4e.js``). It also
+  copies the fonts the stylesheets reference, with hashed names and
+  rewritten ``url()``s. Text files get ``.gz`` and, with the optional
+  ``brotli`` package (requirements-optional.txt), ``.br`` copies. A bundle
+  whose vendor files have not been downloaded is skipped with a warning and
+  keeps loading from the CDN. Our own bundles are built regardless. ``manifest.json`` maps bundle names
+  to files and is written last, so workers never see a half-built set.
+  Files of the previous build are kept for pages rendered before a deploy.
+* ``/assets/<file>`` serves the built files with a one-year ``immutable``
+  Cache-Control, since a changed file gets a new name. It picks the
+  precompressed copy the client accepts, so nothing is compressed on the
+  request path.
+
+``asset_tags(name)`` in templates emits the tags for a bundle. Before the
+first build it falls back to the source files, and to the CDN for vendor
+files not downloaded yet, so a fresh checkout still renders.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from markupsafe import Markup
+
+CDNJS = 'https://cdnjs.cloudflare.com/ajax/libs'
+FONT_AWESOME = f'{CDNJS}/font-awesome/6.4.2'
+
+# Third-party files: path under app/static/vendor, pinned URL, Subresource Integrity hash if published
+VENDOR = (
+    ('bootswatch/cosmo/bootstrap.min.css', f'{CDNJS}/bootswatch/5.3.2/cosmo/bootstrap.min.css', None),
+    ('font-awesome/css/all.min.css', f'{FONT_AWESOME}/css/all.min.css',
+     'sha512-z3gLpd7yknf1YoNbCzqRKc4qyor8gaKU1qmn+CShxbuBusANI9QpRohGBreCFkKxLhei6S9CQXFEbbKuqLg0DA=='),
+    *((f'font-awesome/webfonts/{font}', f'{FONT_AWESOME}/webfonts/{font}', None)
+      for name in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility')
+      for font in (f'{name}.woff2', f'{name}.ttf')),
+    ('jquery/jquery.min.js', 'https://code.jquery.com/jquery-3.7.1.min.js',
+     'sha256-/JqT3SQfawRcv/BIHPThkBvs0OEvtFFmqPF/lYI/Cxo='),
+    ('bootstrap/bootstrap.bundle.min.js', 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.bundle.min.js',
+     'sha384-C6RzsynM9kWDrMNeT87bh95OGNyZPhcTNXj1NW7RuBCsyN/o0jlpcV8Qyq46cDfL'),
+)
+
+# Bundle name -> files under the static folder, in order. Vendor code changes rarely, so it is
+# bundled apart from ours and stays cached across our deploys.
+BUNDLES = {
+    'vendor.css': ['vendor/bootswatch/cosmo/bootstrap.min.css', 'vendor/font-awesome/css/all.min.css'],
+    'vendor.js': ['vendor/jquery/jquery.min.js', 'vendor/bootstrap/bootstrap.bundle.min.js'],
+    'site.css': ['src/css/site.css'],
+    'site.js': ['src/js/back_to_top.js', 'src/js/search.js'],
+    'event_live.js': ['src/js/event_live.js'],
+}
+
+MANIFEST = 'manifest.json'
+
+# Worth precompressing; fonts in woff2 are compressed already
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ttf', '.json')
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL = re.compile(r'''url\(\s*(?:"([^"]*)"|'([^']*)'|([^'")\s]+))\s*\)''')
+SOURCE_MAP = re.compile(rb'(?m)^\s*(//# sourceMappingURL=\S+|/\*# sourceMappingURL=\S+ \*/)\s*$')
+
+
+class AssetError(Exception):
+    """A vendor download or build step failed; the message says which file."""
+
+
+class MissingVendorFile(AssetError):
+    """A bundle needs a vendor file that ``flask assets vendor`` has not downloaded."""
+
+
+def init_app(app):
+    app.config.setdefault('ASSETS_SOURCE_DIR', app.static_folder)
+    app.config.setdefault('ASSETS_DIR', os.path.join(app.static_folder, 'dist'))
+    app.config.setdefault('ASSETS_MAX_AGE', 365 * 86400)
+    app.extensions['assets'] = _read_manifest(app.config['ASSETS_DIR'])
+    app.add_template_global(asset_tags)
+
+
+def asset_tags(name):
+    """``<link>`` or ``<script defer>`` tags for bundle ``name``."""
+    built = current_app.extensions['assets']['bundles'].get(name)
+    if built is not None:
+        sources = [(url_for('main.asset', filename=built), '')]
+    else:
+        sources = [_unbuilt_source(path) for path in BUNDLES[name]]
+    if name.endswith('.css'):
+        tag = Markup('<link rel="stylesheet" href="{}"{}>')
+    else:
+        tag = Markup('<script src="{}"{} defer></script>')
+    return Markup('\n').join(tag.format(url, attributes) for url, attributes in sources)
+
+
+def _unbuilt_source(path):
+    """URL and extra attributes for one file of a bundle that has not been built."""
+    if not os.path.exists(os.path.join(current_app.config['ASSETS_SOURCE_DIR'], path)):
+        for vendor_path, url, integrity in VENDOR:
+            if path == f'vendor/{vendor_path}':
+                attributes = Markup(' crossorigin="anonymous" referrerpolicy="no-referrer"')
+                if integrity:
+                    attributes = Markup(' integrity="{}"').format(integrity) + attributes
+                return url, attributes
+    return url_for('static', filename=path), ''
+
+
+def send(filename):
+    """Response for a built file, precompressed when the client accepts it."""
+    encodings = current_app.extensions['assets']['files'].get(filename)
+    if encodings is None:
+        abort(404)
+    accepted = request.accept_encodings
+    encoding = next((name for name, _ in ENCODINGS if name in encodings and accepted[name]), None)
+    suffix = dict(ENCODINGS)[encoding] if encoding else ''
+    # The type of the file itself, not of its .gz/.br copy
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(current_app.config['ASSETS_DIR'], filename + suffix, mimetype=mimetype,
+                                   max_age=current_app.config['ASSETS_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if encoding:
+        response.content_encoding = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def vendor(app, force=False):
+    """Download the ``VENDOR`` files that are missing (all with ``force``); returns their paths."""
+    import urllib.request  # only this command needs it; keeps it out of worker startup
+
+    fetched = []
+    for path, url, integrity in VENDOR:
+        target = os.path.join(app.config['ASSETS_SOURCE_DIR'], 'vendor', path)
+        if os.path.exists(target) and not force:
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                content = response.read()
+        except OSError as error:
+            raise AssetError(f'{url}: {error}') from error
+        if integrity:
+            algorithm, _, expected = integrity.partition('-')
+            if base64.b64encode(hashlib.new(algorithm, content).digest()).decode() != expected:
+                raise AssetError(f'{url}: content does not match {integrity}')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write_atomic(target, content)
+        fetched.append(path)
+    return fetched
+
+
+def build(app):
+    """Write every bundle, its fonts and their compressed copies to ``ASSETS_DIR``; returns the manifest."""
+    source_dir, dist = app.config['ASSETS_SOURCE_DIR'], app.config['ASSETS_DIR']
+    os.makedirs(dist, exist_ok=True)
+    files = {}  # built file -> encodings of its precompressed copies
+    bundles = {}
+    for name, paths in BUNDLES.items():
+        bundle_files = dict(files)  # merged only if the whole bundle builds
+        try:
+            parts = []
+            for path in paths:
+                content = _read(source_dir, path)
+                content = SOURCE_MAP.sub(b'', content)  # the .map files are not shipped
+                if name.endswith('.css'):
+                    content = _rewrite_urls(source_dir, path, content, dist, bundle_files)
+                parts.append(content.strip())
+            separator = b'\n' if name.endswith('.css') else b';\n'  # a file may end without a semicolon
+            bundles[name] = _emit(dist, name, separator.join(parts) + b'\n', bundle_files)
+        except MissingVendorFile as error:
+            # asset_tags() keeps loading this bundle's files from the CDN
+            app.logger.warning('Skipped %s: %s', name, error)
+            continue
+        files = bundle_files
+
+    previous = _read_manifest(dist)
+    kept = {name: encodings for name, encodings in previous['files'].items()
+            if name in previous['build'] and name not in files}
+    manifest = {'bundles': bundles, 'build': sorted(files), 'files': {**kept, **files}}
+    _write_atomic(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # Anything older than the previous build is no longer referenced by any page
+    wanted = {MANIFEST, *(name + suffix for name, encodings in manifest['files'].items()
+                          for suffix in ['', *(dict(ENCODINGS)[encoding] for encoding in encodings)])}
+    for name in os.listdir(dist):
+        if name not in wanted:
+            os.remove(os.path.join(dist, name))
+
+    app.extensions['assets'] = manifest
+    return manifest
+
+
+def _read(source_dir, path):
+    try:
+        with open(os.path.join(source_dir, path), 'rb') as handle:
+            return handle.read()
+    except FileNotFoundError:
+        if path.startswith('vendor/'):
+            raise MissingVendorFile(f'{path} is missing; run `flask assets vendor`') from None
+        raise AssetError(f'{path} is missing') from None
+
+
+def _rewrite_urls(source_dir, path, content, dist, files):
+    """Copy the files a stylesheet refers to into ``dist`` and point its ``url()``s at the copies."""
+    def replace(match):
+        reference = next(group for group in match.groups() if group is not None).strip()
+        if re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', reference, re.I):
+            return match.group(0)  # data:, absolute and same-document URLs
+        target, _, query = reference.partition('?')
+        target, _, fragment = target.partition('#')
+        relative = os.path.normpath(os.path.join(os.path.dirname(path), target))
+        built = _emit(dist, os.path.basename(relative), _read(source_dir, relative), files)
+        return f'url({built}{"#" + fragment if fragment else ""})'  # the query only busted CDN caches
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _emit(dist, name, content, files):
+    """Write ``content`` as ``name`` with its hash inserted, plus compressed copies; returns the new name."""
+    stem, extension = os.path.splitext(name)
+    built = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+    if built in files:
+        return built
+    _write_atomic(os.path.join(dist, built), content)
+    encodings = []
+    if extension in COMPRESSIBLE:
+        for encoding, suffix in ENCODINGS:
+            compressed = _compress(encoding, content)
+            if compressed is not None and len(compressed) < len(content):
+                _write_atomic(os.path.join(dist, built + suffix), compressed)
+                encodings.append(encoding)
+    files[built] = encodings
+    return built
+
+
+def _compress(encoding, content):
+    if encoding == 'gzip':
+        return gzip.compress(content, compresslevel=9, mtime=0)
+    try:
+        import brotli  # optional; without it only gzip copies are built
+    except ImportError:
+        return None
+    return brotli.compress(content, quality=11)
+
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(content)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_manifest(dist):
+    try:
+        with open(os.path.join(dist, MANIFEST), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {'bundles': {}, 'build': [], 'files': {}}
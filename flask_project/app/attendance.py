@@ -0,0 +1,151 @@
+"""Signing accounts up for events and declining them.
+
+Membership is a primary-key lookup on ``event_attendance`` and
+``Event.attendee_count`` is updated in the same transaction as the row it
+counts. Neither operation loads the attendee list, so a click costs the same
+for an event with three attendees as for one with three thousand.
+
+Capacity is enforced by the counter update itself: a seat is claimed with
+``UPDATE event SET attendee_count = attendee_count + 1 WHERE attendee_count <
+capacity``. Concurrent signups therefore cannot oversubscribe an event.
+Signups that find the event full go on ``event_waitlist``, and the oldest
+waitlisted account takes the seat of anyone who declines.
+
+Every change is also appended to ``attendance_log`` in the same transaction;
+app/analytics.py rolls the log up for the organizer dashboard, and
+app/live.py pushes the new counts to open event pages. The confirmation
+and recommendation jobs for a change are queued in that transaction too.
+"""
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db, recommendations
+from .jobs import job_queue
+from .live import broadcaster
+from .models import Account, AttendanceLog, Event, EventAttendance, EventWaitlist
+
+SIGNED_UP = 'signed_up'
+ALREADY_SIGNED_UP = 'already_signed_up'
+WAITLISTED = 'waitlisted'
+ALREADY_WAITLISTED = 'already_waitlisted'
+DECLINED = 'declined'
+LEFT_WAITLIST = 'left_waitlist'
+NOT_SIGNED_UP = 'not_signed_up'
+PROMOTED = 'promoted'  # Moved off the waitlist when a seat opened; seen by notifications and the log
+
+
+def is_attending(account_id, event_id):
+    return db.session.get(EventAttendance, (account_id, event_id)) is not None
+
+
+def is_waitlisted(account_id, event_id):
+    return db.session.get(EventWaitlist, (event_id, account_id)) is not None
+
+
+def sign_up(event_id, account_id):
+    if is_attending(account_id, event_id):
+        return ALREADY_SIGNED_UP
+
+    # Claim a seat; matches no row once the event is full
+    claimed = db.session.execute(
+        update(Event)
+        .where(Event.id == event_id, or_(Event.capacity.is_(None), Event.attendee_count < Event.capacity))
+        .values(attendee_count=Event.attendee_count + 1)
+    ).rowcount
+    try:
+        if claimed:
+            db.session.execute(insert(EventAttendance).values(account_id=account_id, event_id=event_id))
+            db.session.execute(
+                delete(EventWaitlist).where(
+                    EventWaitlist.event_id == event_id,
+                    EventWaitlist.account_id == account_id,
+                )
+            )
+        else:
+            db.session.execute(insert(EventWaitlist).values(event_id=event_id, account_id=account_id))
+        _log(event_id, account_id, SIGNED_UP if claimed else WAITLISTED)
+        _queue_jobs(event_id, account_id, SIGNED_UP if claimed else WAITLISTED)
+        db.session.commit()
+    except IntegrityError:
+        # Another request added the same account in the meantime; the seat claim is rolled back too
+        db.session.rollback()
+        return ALREADY_SIGNED_UP if claimed else ALREADY_WAITLISTED
+    return SIGNED_UP if claimed else WAITLISTED
+
+
+def decline(event_id, account_id):
+    removed = db.session.execute(
+        delete(EventAttendance).where(
+            EventAttendance.account_id == account_id,
+            EventAttendance.event_id == event_id,
+        )
+    ).rowcount
+    if removed:
+        _log(event_id, account_id, DECLINED)
+        _queue_jobs(event_id, account_id, DECLINED)
+        # Hand the seat to the longest-waiting account, or give it back to the event
+        promoted = _promote_next(event_id)
+        if promoted is None:
+            db.session.execute(
+                update(Event).where(Event.id == event_id).values(attendee_count=Event.attendee_count - 1)
+            )
+        else:
+            _log(event_id, promoted, PROMOTED)
+            _queue_jobs(event_id, promoted, PROMOTED)
+        db.session.commit()
+        return DECLINED
+
+    left = db.session.execute(
+        delete(EventWaitlist).where(
+            EventWaitlist.event_id == event_id,
+            EventWaitlist.account_id == account_id,
+        )
+    ).rowcount
+    if left:
+        _log(event_id, account_id, LEFT_WAITLIST)
+        _queue_jobs(event_id, account_id, LEFT_WAITLIST)
+    db.session.commit()
+    return LEFT_WAITLIST if left else NOT_SIGNED_UP
+
+
+def _log(event_id, account_id, action):
+    db.session.execute(insert(AttendanceLog).values(event_id=event_id, account_id=account_id, action=action))
+    broadcaster.changed(event_id)
+
+
+def _queue_jobs(event_id, account_id, status):
+    # Run by the job worker after the commit, so the click does not wait on them
+    job_queue.enqueue('attendance_confirmation', {'account_id': account_id, 'event_id': event_id, 'status': status})
+    recommendations.queue_refresh(account_id)
+
+
+def _promote_next(event_id):
+    """Move the first waitlisted account into a freed seat; returns its id or ``None``."""
+    next_account_id = db.session.execute(
+        select(EventWaitlist.account_id)
+        .where(EventWaitlist.event_id == event_id)
+        .order_by(EventWaitlist.created_at, EventWaitlist.account_id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).scalar()
+    if next_account_id is None:
+        return None
+    db.session.execute(
+        delete(EventWaitlist).where(
+            EventWaitlist.event_id == event_id,
+            EventWaitlist.account_id == next_account_id,
+        )
+    )
+    db.session.execute(insert(EventAttendance).values(account_id=next_account_id, event_id=event_id))
+    return next_account_id
+
+
+def attendee_names(event_id):
+    """First and last names of an event's attendees, without loading full accounts."""
+    return (
+        db.session.query(Account.first_name, Account.last_name)
+        .join(EventAttendance, EventAttendance.account_id == Account.id)
+        .filter(EventAttendance.event_id == event_id)
+        .order_by(Account.last_name, Account.first_name)
+        .all()
+    )
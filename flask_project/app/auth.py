@@ -0,0 +1,95 @@
+"""Loading the logged-in account without a database query per request.
+
+Flask-Login calls the user loader on every request to a ``@login_required``
+page. Instead of an ``Account`` row, the loader returns an ``AccountSnapshot``
+holding the few fields the pages render. Snapshots come from one of two
+places. By default they come from a bounded, per-process LRU cache with a
+TTL. With ``LOGIN_SESSION_SNAPSHOT`` enabled they come from the signed
+session cookie, which records when the snapshot was loaded. Either way a
+snapshot is used for at most ``ACCOUNT_CACHE_TTL`` seconds before the row
+is read again, so a deleted account is logged out and a revoked organizer
+loses access within that time. ``settings()`` replaces the snapshot of the
+worker that saved the profile at once.
+"""
+import time
+
+from flask import current_app, session
+from flask_login import UserMixin
+
+from . import db
+from .cache import TTLCache
+from .models import Account
+
+# Account fields the templates and views read from current_user
+SNAPSHOT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'desc', 'hobbies', 'age', 'is_organizer')
+
+SESSION_KEY = '_account'
+
+account_cache = TTLCache()
+
+
+class AccountSnapshot(UserMixin):
+    """Read-only copy of an Account; use ``.account`` to load the row for writes."""
+
+    def __init__(self, fields):
+        for field in SNAPSHOT_FIELDS:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_account(cls, account):
+        return cls({field: getattr(account, field) for field in SNAPSHOT_FIELDS})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in SNAPSHOT_FIELDS}
+
+    @property
+    def account(self):
+        return db.session.get(Account, self.id)
+
+
+def init_app(app):
+    app.config.setdefault('ACCOUNT_CACHE_SIZE', 1024)
+    app.config.setdefault('ACCOUNT_CACHE_TTL', 60)
+    app.config.setdefault('LOGIN_SESSION_SNAPSHOT', False)
+    account_cache.configure(maxsize=app.config['ACCOUNT_CACHE_SIZE'], ttl=app.config['ACCOUNT_CACHE_TTL'])
+
+
+def load_account(user_id):
+    try:
+        account_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    if current_app.config['LOGIN_SESSION_SNAPSHOT']:
+        fields = session.get(SESSION_KEY)
+        if (fields and fields.get('id') == account_id
+                and time.time() - fields.get('loaded_at', 0) < current_app.config['ACCOUNT_CACHE_TTL']):
+            return AccountSnapshot(fields)
+        # Missing or expired: read the row, not the cache, so the cookie is never older than the TTL
+        account = db.session.get(Account, account_id)
+        if account is None:
+            clear_session()
+            return None
+        return remember(account)
+
+    snapshot = account_cache.get(account_id)
+    if snapshot is None:
+        account = db.session.get(Account, account_id)
+        if account is None:
+            return None
+        snapshot = AccountSnapshot.from_account(account)
+        account_cache.set(account_id, snapshot)
+    return snapshot
+
+
+def remember(account):
+    """Cache a freshly loaded or updated account and return its snapshot."""
+    snapshot = AccountSnapshot.from_account(account)
+    account_cache.set(account.id, snapshot)
+    if current_app.config['LOGIN_SESSION_SNAPSHOT']:
+        session[SESSION_KEY] = {**snapshot.to_dict(), 'loaded_at': time.time()}
+    return snapshot
+
+
+def clear_session():
+    session.pop(SESSION_KEY, None)
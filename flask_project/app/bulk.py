@@ -0,0 +1,210 @@
+"""Bulk import and export of events as CSV or JSONL.
+
+Imports are a generator pipeline: read rows, validate them, group them into
+batches. Each batch is one multi-row Core ``INSERT`` plus its ``event_tag``
+links, committed as its own transaction. Memory therefore stays bounded by
+the batch size rather than the file. A bad row is reported with its line
+number and skipped; it does not abort the import.
+
+Core inserts bypass the ORM mapper hooks, so this module fills in
+``starts_at``, the coordinates (app/geo.py) and the tag links itself and
+tells the search and suggestion indexes about the new rows.
+
+Exports stream rows with ``yield_per``, so memory stays constant too.
+"""
+import csv
+import json
+from datetime import datetime, time as dt_time
+from functools import lru_cache
+from itertools import islice
+
+from sqlalchemy import func, insert, select
+
+from . import db, geo
+from .cache import fragment_cache
+from .dates import parse_date, parse_time
+from .models import Event
+from .search import FIELD_WEIGHTS, search_index
+from .suggest import suggest_index
+from .tags import add_event_tags
+
+FORMATS = ('csv', 'jsonl')
+
+# Columns read on import; anything else in a row (e.g. an exported id) is ignored
+IMPORT_FIELDS = ('event_name', 'event_type', 'organizer', 'date', 'time', 'location', 'desc', 'tags', 'capacity')
+REQUIRED_FIELDS = ('event_name', 'event_type')
+EXPORT_FIELDS = ('id',) + IMPORT_FIELDS
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Rejected rows beyond this are counted but not kept
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors = []  # (line, message)
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def guess_format(filename):
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+def read_rows(stream, fmt, report):
+    """Yield ``(line, row)`` pairs from a CSV or JSONL stream."""
+    if fmt == 'csv':
+        # Line numbers count the header row, as a spreadsheet shows them
+        yield from enumerate(csv.DictReader(stream), start=2)
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            report.reject(line, f'invalid JSON: {e}')
+            continue
+        if not isinstance(row, dict):
+            report.reject(line, 'expected a JSON object')
+            continue
+        yield line, row
+
+
+def validate_rows(rows, report, organizer=None):
+    """Yield insertable ``event`` values for each valid row, rejecting the rest."""
+    lengths = {field: Event.__table__.c[field].type.length for field in IMPORT_FIELDS if field != 'capacity'}
+    # A calendar repeats the same few hundred dates and times; strptime is the slow part
+    cached_date = lru_cache(maxsize=4096)(parse_date)
+    cached_time = lru_cache(maxsize=1024)(parse_time)
+    for line, row in rows:
+        values = {}
+        for field in IMPORT_FIELDS:
+            value = row.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+            values[field] = None if value in ('', None) else value
+        values['organizer'] = values['organizer'] or organizer
+
+        try:
+            for field in REQUIRED_FIELDS:
+                if values[field] is None:
+                    raise ValueError(f'{field} is required')
+            for field, length in lengths.items():
+                if values[field] is not None:
+                    values[field] = str(values[field])
+                    if len(values[field]) > length:
+                        raise ValueError(f'{field} is longer than {length} characters')
+            if values['capacity'] is not None:
+                values['capacity'] = int(values['capacity'])
+                if values['capacity'] < 1:  # Same rule as the create_event form
+                    raise ValueError('capacity must be at least 1')
+            day = cached_date(values['date']) if values['date'] is not None else None
+            if values['date'] is not None and day is None:
+                raise ValueError(f"unrecognized date {values['date']!r}")
+            clock = cached_time(values['time']) if values['time'] is not None else None
+            if values['time'] is not None and clock is None:
+                raise ValueError(f"unrecognized time {values['time']!r}")
+        except ValueError as e:
+            report.reject(line, str(e))
+            continue
+
+        # Same rule as dates.parse_starts_at
+        values['starts_at'] = datetime.combine(day, clock or dt_time.min) if day else None
+        values['attendee_count'] = 0
+        yield values
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_events(stream, fmt, organizer=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert every valid row of ``stream``; returns an ``ImportReport``."""
+    report = ImportReport()
+    return import_rows(read_rows(stream, fmt, report), report, organizer, batch_size)
+
+
+def import_rows(rows, report=None, organizer=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert ``(line, row)`` pairs from any source, e.g. a generator of dicts."""
+    report = report or ImportReport()
+    rows = validate_rows(rows, report, organizer)
+    for batch in batched(rows, batch_size):
+        connection = db.session.connection()
+        geo.fill_coordinates(batch, connection)  # one gazetteer lookup per batch
+        event_ids = _insert_events(connection, batch)
+        add_event_tags(connection, [(event_id, values['tags']) for event_id, values in zip(event_ids, batch)])
+        db.session.commit()
+
+        search_index.add_events({
+            event_id: {field: values[field] for field, _ in FIELD_WEIGHTS}
+            for event_id, values in zip(event_ids, batch)
+        })
+        report.imported += len(batch)
+        report.batches += 1
+
+    if report.imported:
+        suggest_index.invalidate()
+        fragment_cache.invalidate_featured()
+    return report
+
+
+def _insert_events(connection, batch):
+    """Insert one batch of event rows and return their ids in row order."""
+    table = Event.__table__
+    if connection.dialect.name != 'sqlite':
+        return connection.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), batch
+        ).scalars().all()
+
+    # SQLAlchemy can only order SQLite RETURNING rows by inserting one row per
+    # statement. Instead insert the first row alone, which takes the write
+    # lock, then the rest in one executemany; holding the lock, SQLite hands
+    # out consecutive rowids.
+    first_id = connection.execute(insert(table).returning(table.c.id), batch[0]).scalar_one()
+    if len(batch) > 1:
+        connection.execute(insert(table), batch[1:])
+    last_id = connection.execute(select(func.max(table.c.id))).scalar_one()
+    if last_id != first_id + len(batch) - 1:
+        raise RuntimeError(f'expected event ids {first_id}..{first_id + len(batch) - 1}, table ends at {last_id}')
+    return list(range(first_id, last_id + 1))
+
+
+def export_rows(query=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield one dict per event in id order, fetching ``batch_size`` rows at a time."""
+    query = query if query is not None else Event.query
+    columns = [getattr(Event, field) for field in EXPORT_FIELDS]
+    for row in query.with_entities(*columns).order_by(Event.id).yield_per(batch_size):
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def export_events(stream, fmt, query=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Write events to ``stream``; returns the number written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in export_rows(query, batch_size):
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in export_rows(query, batch_size):
+            stream.write(json.dumps(row) + '\n')
+            count += 1
+    return count
@@ -0,0 +1,295 @@
+"""Caches shared by the rest of the app.
+
+``TTLCache`` is a small in-process LRU used for account snapshots and
+search results. ``SingleFlight`` lets concurrent callers asking for the same
+key share one computation.
+
+``FragmentCache`` stores rendered template fragments (featured events,
+per-event detail blocks) with an ETag and Last-Modified time. That way
+views can skip both the query and the render, and answer conditional
+requests with 304. It has pluggable backends:
+
+* ``filesystem`` (the default): one file per entry under ``CACHE_DIR``,
+  shared by every worker process on the host, so an invalidation in one
+  worker is seen by all.
+* ``memory``: per-process LRU bounded by total size in bytes. Only for a
+  single worker process: a signup invalidates the cache of the worker that
+  handled it, and the others keep serving their copy until it expires.
+* ``null``: never stores anything.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; callers that arrive meanwhile wait for its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call in progress
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, function):
+        """Return ``function()``, or the result of the identical call already running.
+
+        If that call raises, every caller waiting on it gets the same exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+# A cached fragment: rendered HTML, a few values the surrounding page needs,
+# and validators for conditional requests
+Fragment = namedtuple('Fragment', 'html data etag last_modified')
+
+
+class NullBackend:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryBackend:
+    """LRU that evicts the least recently used entries once ``max_bytes`` is exceeded."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (time.time() + timeout, size, value)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class FileSystemBackend:
+    """One pickle file per key; writes are atomic renames so readers never see partial files."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as handle:
+                expires_at, value = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, timeout):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                pickle.dump((time.time() + timeout, value), handle, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+class FragmentCache:
+    FEATURED_KEY = 'fragment:featured'
+
+    def __init__(self):
+        self.backend = NullBackend()
+        self.timeout = 300
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'filesystem')  # 'filesystem', 'memory' or 'null'
+        # One directory per database, so scripts pointed at another database never see the site's fragments
+        database = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode('utf-8')).hexdigest()[:12]
+        app.config.setdefault('CACHE_DIR', os.path.join(app.instance_path, 'cache', database))
+        app.config.setdefault('CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        app.config.setdefault('CACHE_DEFAULT_TIMEOUT', 300)
+
+        backend = app.config['CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['CACHE_MAX_BYTES'])
+        elif backend == 'filesystem':
+            self.backend = FileSystemBackend(app.config['CACHE_DIR'])
+        elif backend == 'null':
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND {backend!r}')
+        self.timeout = app.config['CACHE_DEFAULT_TIMEOUT']
+        app.extensions['fragment_cache'] = self
+
+    @staticmethod
+    def event_key(event_id):
+        return f'fragment:event:{event_id}'
+
+    def get_or_render(self, key, render):
+        """Return the cached ``Fragment`` for ``key``.
+
+        On a miss ``render()`` is called and must return ``(html, data)``.
+        """
+        fragment = self.backend.get(key)
+        if fragment is None:
+            html, data = render()
+            etag = hashlib.sha1(html.encode('utf-8')).hexdigest()
+            fragment = Fragment(html, data, etag, int(time.time()))
+            self.backend.set(key, fragment, self.timeout)
+        return fragment
+
+    def invalidate_featured(self):
+        self.backend.delete(self.FEATURED_KEY)
+
+    def invalidate_event(self, event_id):
+        # Featured events show attendee counts too
+        self.backend.delete(self.event_key(event_id))
+        self.backend.delete(self.FEATURED_KEY)
+
+    def clear(self):
+        self.backend.clear()
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,186 @@
+"""``flask events ...``, ``flask jobs ...``, ``flask recommendations ...``, ``flask analytics ...``,
+``flask templates ...``, ``flask geo ...`` and ``flask assets ...`` commands."""
+import csv
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from . import analytics, assets, bulk, geo, recommendations, templating
+from .jobs import job_queue
+from .models import Event
+
+events_cli = AppGroup('events', help='Bulk import and export of events.')
+jobs_cli = AppGroup('jobs', help='Background job worker.')
+recommendations_cli = AppGroup('recommendations', help='Precomputed event recommendations.')
+analytics_cli = AppGroup('analytics', help='Attendance log rollups for the organizer dashboard.')
+templates_cli = AppGroup('templates', help='Jinja template bytecode cache.')
+geo_cli = AppGroup('geo', help='Venue gazetteer and event coordinates.')
+assets_cli = AppGroup('assets', help='Vendored libraries and built static bundles.')
+
+
+def init_app(app):
+    app.cli.add_command(events_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(templates_cli)
+    app.cli.add_command(geo_cli)
+    app.cli.add_command(assets_cli)
+
+
+def _format(fmt, file):
+    fmt = fmt or bulk.guess_format(file.name)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format csv or --format jsonl.')
+    return fmt
+
+
+@events_cli.command('import')
+@click.argument('file', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS), help='Defaults to the file extension.')
+@click.option('--organizer', help='Organizer for rows that do not name one.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=bulk.DEFAULT_BATCH_SIZE, show_default=True)
+def import_command(file, fmt, organizer, batch_size):
+    """Import events from a CSV or JSONL FILE ("-" for stdin)."""
+    fmt = _format(fmt, file)
+    started = time.perf_counter()
+    report = bulk.import_events(file, fmt, organizer=organizer, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+
+    for line, message in report.errors:
+        click.echo(f'line {line}: {message}', err=True)
+    if report.rejected > len(report.errors):
+        click.echo(f'... and {report.rejected - len(report.errors)} more rejected rows', err=True)
+    click.echo(
+        f'Imported {report.imported} events in {report.batches} batches ({elapsed:.2f}s, '
+        f'{report.imported / elapsed if elapsed else 0:.0f} rows/s); rejected {report.rejected}.'
+    )
+
+
+@events_cli.command('export')
+@click.argument('file', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS), help='Defaults to the file extension.')
+@click.option('--organizer', help='Only export this organizer\'s events.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=bulk.DEFAULT_BATCH_SIZE, show_default=True)
+def export_command(file, fmt, organizer, batch_size):
+    """Export events to a CSV or JSONL FILE (stdout by default)."""
+    fmt = _format(fmt, file) if file.name != '<stdout>' else (fmt or 'jsonl')
+    query = Event.query.filter_by(organizer=organizer) if organizer else None
+    count = bulk.export_events(file, fmt, query=query, batch_size=batch_size)
+    click.echo(f'Exported {count} events.', err=True)
+
+
+@jobs_cli.command('work')
+def work_command():
+    """Run the job worker in the foreground until interrupted.
+
+    Unlike the worker inside web processes, it always runs the dedicated tasks
+    (recommendation refreshes and rebuilds); with JOB_DEDICATED_WORKER set, it is
+    the only one that does, so keep one running.
+    """
+    app = current_app._get_current_object()
+    job_queue.start(app, dedicated=True)
+    click.echo(f'Job worker running with {app.config["JOB_WORKERS"]} threads; Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        click.echo('Waiting for running jobs to finish...')
+        job_queue.stop(wait=True)
+
+
+@jobs_cli.command('stats')
+def stats_command():
+    """Show how many jobs are queued, running, done and failed."""
+    for status, count in job_queue.stats().items():
+        if not status.startswith('worker_'):
+            click.echo(f'{status:>8} {count}')
+
+
+@recommendations_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the stored recommendations of every account now."""
+    count = recommendations.rebuild(log=click.echo)
+    click.echo(f'Stored recommendations for {count} accounts.')
+
+
+@analytics_cli.command('compact')
+def compact_command():
+    """Fold attendance log rows written since the last compaction into the rollups."""
+    started = time.perf_counter()
+    count = analytics.compact_all()
+    click.echo(f'Folded {count} log rows in {time.perf_counter() - started:.2f}s.')
+
+
+@analytics_cli.command('rebuild')
+def analytics_rebuild_command():
+    """Empty the rollups and fold the whole attendance log again."""
+    started = time.perf_counter()
+    count = analytics.rebuild()
+    click.echo(f'Folded {count} log rows in {time.perf_counter() - started:.2f}s.')
+
+
+@templates_cli.command('precompile')
+def precompile_command():
+    """Compile every template into the shared bytecode cache (run at deploy time)."""
+    if not current_app.config['JINJA_BYTECODE_CACHE']:
+        raise click.UsageError('JINJA_BYTECODE_CACHE is off, so workers would not read the compiled templates.')
+    started = time.perf_counter()
+    names = templating.precompile(current_app)
+    click.echo(f'Compiled {len(names)} templates into {current_app.config["JINJA_BYTECODE_CACHE_DIR"]} '
+               f'in {time.perf_counter() - started:.2f}s.')
+
+
+@geo_cli.command('import-venues')
+@click.argument('file', type=click.File('r', encoding='utf-8'))
+def import_venues_command(file):
+    """Add or replace venues from a CSV FILE with name, latitude and longitude columns."""
+    reader = csv.DictReader(file)
+    try:
+        count = geo.import_venues((row['name'], row['latitude'], row['longitude']) for row in reader)
+    except (KeyError, ValueError) as e:
+        raise click.UsageError(f'Line {reader.line_num}: {e}')
+    click.echo(f'Stored {count} venues; run `flask geo backfill` to geocode existing events.')
+
+
+@geo_cli.command('backfill')
+@click.option('--batch-size', type=click.IntRange(min=1), default=1000, show_default=True)
+def backfill_command(batch_size):
+    """Geocode every event again from the venue table."""
+    started = time.perf_counter()
+    count = geo.backfill(batch_size)
+    click.echo(f'{count} events have coordinates ({time.perf_counter() - started:.2f}s).')
+
+
+@assets_cli.command('vendor')
+@click.option('--force', is_flag=True, help='Download every file again, not just the missing ones.')
+def vendor_command(force):
+    """Download the pinned third-party files into app/static/vendor (needed before build)."""
+    try:
+        fetched = assets.vendor(current_app, force=force)
+    except assets.AssetError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Downloaded {len(fetched)} of {len(assets.VENDOR)} files.')
+
+
+@assets_cli.command('build')
+def build_command():
+    """Bundle, fingerprint and precompress the static assets (run at deploy time)."""
+    started = time.perf_counter()
+    try:
+        manifest = assets.build(current_app)
+    except assets.AssetError as e:
+        raise click.ClickException(str(e))
+    for name, built in sorted(manifest['bundles'].items()):
+        encodings = manifest['files'][built]
+        click.echo(f'{name} -> {built}' + (f' (+{", ".join(encodings)})' if encodings else ''))
+    skipped = sorted(set(assets.BUNDLES) - set(manifest['bundles']))
+    if skipped:
+        click.echo(f'Skipped {", ".join(skipped)}: run `flask assets vendor` first; '
+                   'until then they load from the CDN.', err=True)
+    if 'br' not in {encoding for encodings in manifest['files'].values() for encoding in encodings}:
+        click.echo('No .br copies: install the brotli package to build them.', err=True)
+    click.echo(f'Built {len(manifest["build"])} files into {current_app.config["ASSETS_DIR"]} '
+               f'in {time.perf_counter() - started:.2f}s.')
@@ -0,0 +1,367 @@
+"""Schedule conflicts: overlapping events for one attendee, one organizer or one location.
+
+Events have no end time yet, so each is taken to last
+``CALENDAR_EVENT_DURATION`` seconds, as in the calendar feeds. Two events
+conflict when their intervals overlap; one ending as the next starts does
+not.
+
+``conflict_index`` keeps the upcoming events of every account (from
+``event_attendance``), organizer and location as lists of ``(start, end,
+event_id)`` sorted by start. The overlaps of an interval are found with a
+bisect to ``start`` minus the longest duration in the list, then a scan
+until entries start after its end: O(log n) plus the matches.
+
+The index is built on first use and then updated incrementally. Before each
+lookup it reads the ``attendance_log`` rows (written by app/attendance.py)
+and ``event`` rows with ids above the last ones it applied, and the events
+whose ``updated_at`` is past the latest one it has seen. All three are index
+range scans and are usually empty. Signups, new events and edits to an
+event's date, time or location made by other worker processes are therefore
+seen at once, with nothing to invalidate. An edited event moves in every
+calendar that holds it. Every ``CONFLICT_INDEX_MAX_AGE`` seconds the index
+is rebuilt in the background to drop events that have ended.
+
+``CONFLICT_MODE`` decides what signup and event creation do about a
+conflict: ``'warn'`` flashes a warning and goes ahead, ``'block'`` refuses
+and ``'off'`` skips the check.
+
+``report()`` lists an organizer's double bookings and the clashes at their
+locations in one sweep-line pass over the merged, start-sorted calendars.
+Each event is compared only with the events still running when it starts.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from . import attendance, db
+from .geo import location_key
+from .models import AttendanceLog, Event, EventAttendance
+
+MODES = ('warn', 'block', 'off')
+
+# Log actions that give an account a seat, and the one that takes it away
+SEATED = (attendance.SIGNED_UP, attendance.PROMOTED)
+UNSEATED = (attendance.DECLINED,)
+
+# Report rows: the organizer runs both events, or another organizer's event shares the location
+ORGANIZER, LOCATION = 'organizer', 'location'
+
+
+class Calendar:
+    """``(start, end, event_id)`` entries sorted by start, and the longest duration among them."""
+
+    def __init__(self, entries=()):
+        self.entries = sorted(entries)
+        self.longest = max((end - start for start, end, _ in self.entries), default=timedelta(0))
+
+    def add(self, start, end, event_id):
+        entry = (start, end, event_id)
+        position = bisect.bisect_left(self.entries, entry)
+        if position == len(self.entries) or self.entries[position] != entry:
+            self.entries.insert(position, entry)
+            self.longest = max(self.longest, end - start)
+
+    def remove(self, start, end, event_id):
+        entry = (start, end, event_id)
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def overlapping(self, start, end):
+        """Entries whose interval overlaps ``[start, end)``."""
+        matches = []
+        # Nothing starting before start - longest can still be running at start
+        position = bisect.bisect_left(self.entries, (start - self.longest,))
+        while position < len(self.entries) and self.entries[position][0] < end:
+            if self.entries[position][1] > start:
+                matches.append(self.entries[position])
+            position += 1
+        return matches
+
+
+class _Calendars:
+    """One build of the index; changed only under ``ConflictIndex._lock``."""
+
+    def __init__(self, duration, horizon):
+        self.duration = duration
+        self.horizon = horizon  # events starting earlier have ended and are left out
+        self.events = {}  # event_id -> (start, end, organizer, location key)
+        self.accounts = defaultdict(Calendar)
+        self.organizers = defaultdict(Calendar)
+        self.locations = defaultdict(Calendar)
+        self.last_event_id = 0
+        self.last_log_id = 0
+        self.last_updated_at = datetime.min
+        self.built_at = time.monotonic()
+
+    def add_event(self, event_id, starts_at, organizer, location):
+        if starts_at is None or starts_at < self.horizon or event_id in self.events:
+            return
+        end = starts_at + self.duration
+        key = location_key(location)
+        self.events[event_id] = (starts_at, end, organizer, key)
+        if organizer:
+            self.organizers[organizer].add(starts_at, end, event_id)
+        if key:
+            self.locations[key].add(starts_at, end, event_id)
+
+    def move_event(self, event_id, starts_at, organizer, location, attendees):
+        """Re-index an edited event, including in the calendars of ``attendees``."""
+        old = self.events.pop(event_id, None)
+        if old is not None:
+            start, end, old_organizer, old_key = old
+            if old_organizer:
+                self.organizers[old_organizer].remove(start, end, event_id)
+            if old_key:
+                self.locations[old_key].remove(start, end, event_id)
+            for account_id in attendees:
+                if account_id in self.accounts:
+                    self.accounts[account_id].remove(start, end, event_id)
+        self.add_event(event_id, starts_at, organizer, location)
+        for account_id in attendees:
+            self.set_attending(account_id, event_id, True)
+
+    def set_attending(self, account_id, event_id, attending):
+        interval = self.events.get(event_id)
+        if interval is None:
+            return
+        calendar = self.accounts[account_id]
+        if attending:
+            calendar.add(interval[0], interval[1], event_id)
+        else:
+            calendar.remove(interval[0], interval[1], event_id)
+
+
+class ConflictIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calendars = None
+        self._rebuilding = False
+
+    def init_app(self, app):
+        app.config.setdefault('CONFLICT_MODE', 'warn')  # 'warn', 'block' or 'off'
+        app.config.setdefault('CONFLICT_INDEX_MAX_AGE', 600)  # seconds between full rebuilds
+        if app.config['CONFLICT_MODE'] not in MODES:
+            raise ValueError(f'Unknown CONFLICT_MODE {app.config["CONFLICT_MODE"]!r}')
+        app.extensions['conflict_index'] = self
+        self.invalidate()  # built from this app's database on first use
+
+    def build(self):
+        duration = timedelta(seconds=current_app.config['CALENDAR_EVENT_DURATION'])
+        calendars = _Calendars(duration, datetime.now() - duration)
+        # Watermarks first: rows committed while loading are replayed later, and replaying is idempotent
+        calendars.last_log_id = db.session.scalar(select(func.max(AttendanceLog.id))) or 0
+        calendars.last_event_id = db.session.scalar(select(func.max(Event.id))) or 0
+        calendars.last_updated_at = db.session.scalar(select(func.max(Event.updated_at))) or datetime.min
+
+        organizers, locations = defaultdict(list), defaultdict(list)
+        upcoming = select(Event.id, Event.starts_at, Event.organizer, Event.location).where(
+            Event.starts_at >= calendars.horizon
+        )
+        for event_id, starts_at, organizer, location in db.session.execute(upcoming):
+            end = starts_at + duration
+            key = location_key(location)
+            calendars.events[event_id] = (starts_at, end, organizer, key)
+            if organizer:
+                organizers[organizer].append((starts_at, end, event_id))
+            if key:
+                locations[key].append((starts_at, end, event_id))
+        accounts = defaultdict(list)
+        seats = (
+            select(EventAttendance.account_id, EventAttendance.event_id)
+            .join(Event, Event.id == EventAttendance.event_id)
+            .where(Event.starts_at >= calendars.horizon)
+        )
+        for account_id, event_id in db.session.execute(seats):
+            interval = calendars.events.get(event_id)
+            if interval is not None:  # else created meanwhile; its signups are replayed from the log
+                accounts[account_id].append((interval[0], interval[1], event_id))
+
+        # Sorted once each, rather than one insort per entry
+        for target, source in ((calendars.organizers, organizers), (calendars.locations, locations),
+                               (calendars.accounts, accounts)):
+            target.update((key, Calendar(entries)) for key, entries in source.items())
+        with self._lock:
+            self._calendars = calendars
+        return calendars
+
+    def invalidate(self):
+        with self._lock:
+            self._calendars = None
+
+    def signup_conflicts(self, account_id, event_id):
+        """Events ``account_id`` attends that overlap ``event_id``, as (id, event_name, starts_at) rows."""
+        if current_app.config['CONFLICT_MODE'] == 'off':
+            return []
+        calendars = self._current()
+        with self._lock:
+            interval = calendars.events.get(event_id)
+            calendar = calendars.accounts.get(account_id)
+            if interval is None or calendar is None:
+                return []
+            overlapping = [other for _, _, other in calendar.overlapping(interval[0], interval[1]) if other != event_id]
+        return _describe(overlapping)
+
+    def booking_conflicts(self, organizer, location, starts_at):
+        """Upcoming events a new event would overlap: ``{'organizer': rows, 'location': rows}``.
+
+        ``organizer`` rows are the organizer's own events, ``location`` rows other events at
+        the same location; both as (id, event_name, starts_at).
+        """
+        conflicts = {ORGANIZER: [], LOCATION: []}
+        if current_app.config['CONFLICT_MODE'] == 'off' or starts_at is None:
+            return conflicts
+        calendars = self._current()
+        end = starts_at + calendars.duration
+        with self._lock:
+            own = calendars.organizers.get(organizer)
+            if own is not None:
+                conflicts[ORGANIZER] = [event_id for _, _, event_id in own.overlapping(starts_at, end)]
+            shared = calendars.locations.get(location_key(location))
+            if shared is not None:
+                conflicts[LOCATION] = [event_id for _, _, event_id in shared.overlapping(starts_at, end)
+                                       if event_id not in conflicts[ORGANIZER]]
+        return {kind: _describe(event_ids) for kind, event_ids in conflicts.items()}
+
+    def report(self, organizer):
+        """Every overlap among ``organizer``'s upcoming events and with other events at their locations."""
+        calendars = self._current()
+        with self._lock:
+            own = calendars.organizers.get(organizer)
+            if own is None:
+                return []
+            keys = {calendars.events[event_id][3] for _, _, event_id in own.entries}
+            merged = list(heapq.merge(own.entries, *(calendars.locations[key].entries for key in keys
+                                                     if key in calendars.locations)))
+            events = {event_id: calendars.events[event_id] for _, _, event_id in merged}
+
+        pairs = []
+        running = []  # (end, event_id) of events not yet over, earliest end first
+        seen = set()
+        for start, end, event_id in merged:
+            if event_id in seen:  # an organizer's event is also in its location's calendar
+                continue
+            seen.add(event_id)
+            while running and running[0][0] <= start:
+                heapq.heappop(running)
+            _, _, event_organizer, key = events[event_id]
+            for _, other in running:
+                _, _, other_organizer, other_key = events[other]
+                if event_organizer == organizer and other_organizer == organizer:
+                    pairs.append((ORGANIZER, other, event_id))
+                elif key is not None and key == other_key and organizer in (event_organizer, other_organizer):
+                    pairs.append((LOCATION, other, event_id))
+            heapq.heappush(running, (end, event_id))
+
+        described = {row.id: row for row in _describe({event_id for pair in pairs for event_id in pair[1:]})}
+        return [
+            {'kind': kind, 'first': _event_dict(described[first]), 'second': _event_dict(described[second])}
+            for kind, first, second in pairs if first in described and second in described
+        ]
+
+    def _current(self):
+        calendars = self._calendars
+        if calendars is None:
+            calendars = self.build()
+        else:
+            max_age = current_app.config['CONFLICT_INDEX_MAX_AGE']
+            if max_age is not None and time.monotonic() - calendars.built_at >= max_age:
+                self._rebuild_in_background()
+        self._catch_up(calendars)
+        return calendars
+
+    def _catch_up(self, calendars):
+        # One probe of both primary keys and of updated_at; usually nothing is new
+        last_log_id, last_event_id, last_updated_at = db.session.execute(
+            select(select(func.max(AttendanceLog.id)).scalar_subquery(), select(func.max(Event.id)).scalar_subquery(),
+                   select(func.max(Event.updated_at)).scalar_subquery())
+        ).one()
+        if ((last_log_id or 0) <= calendars.last_log_id and (last_event_id or 0) <= calendars.last_event_id
+                and (last_updated_at or datetime.min) <= calendars.last_updated_at):
+            return
+        # The log first: any event a log row points at was committed before it, so the
+        # event query below sees it
+        log = db.session.execute(
+            select(AttendanceLog.id, AttendanceLog.account_id, AttendanceLog.event_id, AttendanceLog.action)
+            .where(AttendanceLog.id > calendars.last_log_id)
+            .order_by(AttendanceLog.id)
+        ).all()
+        events = db.session.execute(
+            select(Event.id, Event.starts_at, Event.organizer, Event.location)
+            .where(Event.id > calendars.last_event_id)
+            .order_by(Event.id)
+        ).all()
+        # Edited events (new ones too, since they count as changed when created) and their attendees
+        edited = db.session.execute(
+            select(Event.id, Event.starts_at, Event.organizer, Event.location, Event.updated_at)
+            .where(Event.updated_at > calendars.last_updated_at)
+        ).all()
+        attendees = defaultdict(list)
+        if edited:
+            for account_id, event_id in db.session.execute(
+                select(EventAttendance.account_id, EventAttendance.event_id)
+                .where(EventAttendance.event_id.in_([row.id for row in edited]))
+            ):
+                attendees[event_id].append(account_id)
+        if not log and not events and not edited:
+            return
+        with self._lock:
+            # Another thread may have applied some of these rows already
+            for event_id, starts_at, organizer, location in events:
+                if event_id > calendars.last_event_id:
+                    calendars.add_event(event_id, starts_at, organizer, location)
+                    calendars.last_event_id = event_id
+            for log_id, account_id, event_id, action in log:
+                if log_id > calendars.last_log_id:
+                    if action in SEATED or action in UNSEATED:
+                        calendars.set_attending(account_id, event_id, action in SEATED)
+                    calendars.last_log_id = log_id
+            # After the log, so a decline replayed above still finds the event where it was
+            for event_id, starts_at, organizer, location, updated_at in edited:
+                if updated_at > calendars.last_updated_at:
+                    calendars.move_event(event_id, starts_at, organizer, location, attendees[event_id])
+            calendars.last_updated_at = max([calendars.last_updated_at, *(row.updated_at for row in edited)])
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        # Keep answering from the current copy while a fresh one is loaded
+        threading.Thread(target=self._rebuild, args=(current_app._get_current_object(),), daemon=True).start()
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                self.build()
+        finally:
+            self._rebuilding = False
+
+
+def _describe(event_ids):
+    if not event_ids:
+        return []
+    return db.session.execute(
+        select(Event.id, Event.event_name, Event.starts_at, Event.organizer, Event.location)
+        .where(Event.id.in_(list(event_ids)))
+        .order_by(Event.starts_at, Event.id)
+    ).all()
+
+
+def _event_dict(row):
+    return {
+        'id': row.id,
+        'event_name': row.event_name,
+        'starts_at': row.starts_at.isoformat(timespec='minutes'),
+        'organizer': row.organizer,
+        'location': row.location,
+    }
+
+
+conflict_index = ConflictIndex()
@@ -0,0 +1,91 @@
+"""Engine tuning and read/write routing.
+
+``init_app`` applies ``SQLITE_PRAGMAS`` to each new SQLite connection, for
+example WAL journaling so readers no longer block behind a writer. When
+``SQLALCHEMY_READ_DATABASE_URI`` is set it also creates a second engine for
+reads. ``"sqlite-readonly"`` selects a read-only connection to the primary
+SQLite file.
+
+Views wrapped in ``@read_only`` send their queries to that read engine.
+Flushes and views without the decorator always use the primary engine, so a
+read-only view must not write.
+"""
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
+READ_ENGINE_KEY = 'read_engine'
+
+# PRAGMAs that only make sense on a connection that can write
+WRITE_ONLY_PRAGMAS = ('journal_mode',)
+
+
+class RoutingSession(Session):
+    """Session that uses the read engine inside ``@read_only`` views."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('_read_only'):
+            engine = current_app.extensions.get(READ_ENGINE_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Route the view's queries to the read engine, when one is configured."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._read_only = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g._read_only = False
+    return wrapper
+
+
+def init_app(app, db):
+    app.config.setdefault('SQLITE_PRAGMAS', {})
+    app.config.setdefault('SQLALCHEMY_READ_DATABASE_URI', None)
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        _apply_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+        if 'journal_mode' in app.config['SQLITE_PRAGMAS']:
+            # Switch the file to WAL up front; read-only connections cannot do it themselves
+            with engine.connect():
+                pass
+
+    read_uri = app.config['SQLALCHEMY_READ_DATABASE_URI']
+    if not read_uri:
+        return
+    if read_uri == 'sqlite-readonly':
+        if engine.dialect.name != 'sqlite' or not engine.url.database:
+            raise ValueError("SQLALCHEMY_READ_DATABASE_URI='sqlite-readonly' needs a file-based SQLite database")
+        read_uri = f'sqlite:///file:{engine.url.database}?mode=ro&uri=true'
+
+    options = dict(app.config.get('SQLALCHEMY_READ_ENGINE_OPTIONS') or app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    read_engine = create_engine(read_uri, **options)
+    if read_engine.dialect.name == 'sqlite':
+        pragmas = {
+            name: value for name, value in app.config['SQLITE_PRAGMAS'].items()
+            if name not in WRITE_ONLY_PRAGMAS
+        }
+        _apply_pragmas(read_engine, pragmas)
+    app.extensions[READ_ENGINE_KEY] = read_engine
+
+
+def _apply_pragmas(engine, pragmas):
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
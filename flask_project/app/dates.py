@@ -0,0 +1,41 @@
+"""Parsing of the free-text ``Event.date``/``Event.time`` strings.
+
+Forms post ISO dates (``2024-12-15``) and 24h times (``10:00``), but older
+rows were entered by hand as ``12/15/2024`` and ``10:30am``. ``starts_at``
+is derived from both so the database can sort and range-scan real datetimes.
+"""
+from datetime import datetime, time as dt_time
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d', '%m-%d-%Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M%p', '%I:%M %p', '%I%p', '%I %p')
+
+
+def parse_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_time(value):
+    value = (value or '').strip().upper().replace('.', '')
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_starts_at(date, time):
+    """Combine an event's date and time strings, or ``None`` if the date is unreadable.
+
+    Events without a readable time start at midnight.
+    """
+    day = parse_date(date)
+    if day is None:
+        return None
+    return datetime.combine(day, parse_time(time) or dt_time.min)
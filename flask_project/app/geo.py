@@ -0,0 +1,244 @@
+"""Event coordinates from a local gazetteer, and nearby-event queries on a grid index.
+
+``Event.location`` is free text. An event whose location names a place in
+the ``venue`` table gets that place's latitude and longitude. Places are
+matched by ``location_key``, so case and spacing do not matter. Other events
+("Online", unknown places) have no coordinates. No geocoding service is
+called. When the table is created, by the migration or by ``create_all``,
+it is filled with the campus buildings and Pittsburgh neighbourhoods in
+``PLACES``. ``flask geo import-venues`` adds more, and
+``flask geo backfill`` geocodes the existing events again.
+
+Each geocoded event also stores ``geo_cell``: the number of its
+``CELL_DEGREES`` square in a row-major grid, in an indexed column. One grid
+row of a bounding box is a contiguous range of cell numbers. A radius or box
+query is therefore one index range per grid row, and exact distances are
+computed only for the events in those cells.
+"""
+import math
+
+from flask import current_app
+from sqlalchemy import bindparam, event, inspect, or_, select, update
+from sqlalchemy.orm import load_only
+
+from . import db
+from .models import Event, Venue
+from .pagination import LISTING_COLUMNS
+
+# Grid cell size; about 1.1 km north-south. Stored in geo_cell, so changing it needs `flask geo backfill`
+CELL_DEGREES = 0.01
+GRID_COLUMNS = round(360 / CELL_DEGREES)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Built-in gazetteer: name, latitude, longitude. Alternative names are listed as places of their own.
+PLACES = (
+    ('Cathedral of Learning', 40.4443, -79.9532),
+    ('Cathy', 40.4443, -79.9532),
+    ('William Pitt Union', 40.4433, -79.9546),
+    ('WPU', 40.4433, -79.9546),
+    ('Hillman Library', 40.4425, -79.9540),
+    ('Posvar Hall', 40.4416, -79.9537),
+    ('Wesley W. Posvar Hall', 40.4416, -79.9537),
+    ('Petersen Events Center', 40.4439, -79.9622),
+    ('The Pete', 40.4439, -79.9622),
+    ('Heinz Memorial Chapel', 40.4447, -79.9513),
+    ('Soldiers and Sailors Memorial Hall', 40.4451, -79.9563),
+    ('Alumni Hall', 40.4454, -79.9540),
+    ('Sennott Square', 40.4415, -79.9562),
+    ('Benedum Hall', 40.4437, -79.9585),
+    ('Frick Fine Arts Building', 40.4419, -79.9512),
+    ('Litchfield Towers', 40.4424, -79.9568),
+    ('Trees Hall', 40.4450, -79.9650),
+    ('Schenley Plaza', 40.4424, -79.9529),
+    ('Schenley Park', 40.4340, -79.9420),
+    ('Phipps Conservatory', 40.4390, -79.9475),
+    ('Carnegie Museum of Natural History', 40.4433, -79.9498),
+    ('Carnegie Mellon University', 40.4433, -79.9436),
+    ('Oakland', 40.4418, -79.9561),
+    ('Shadyside', 40.4560, -79.9330),
+    ('Squirrel Hill', 40.4380, -79.9230),
+    ('Lawrenceville', 40.4670, -79.9610),
+    ('Strip District', 40.4510, -79.9830),
+    ('South Side', 40.4286, -79.9750),
+    ('Station Square', 40.4340, -80.0050),
+    ('Mount Washington', 40.4320, -80.0090),
+    ('Downtown', 40.4413, -79.9986),
+    ('Point State Park', 40.4416, -80.0127),
+    ('PPG Paints Arena', 40.4395, -79.9892),
+    ('PNC Park', 40.4469, -80.0057),
+    ('Acrisure Stadium', 40.4468, -80.0158),
+    ('Pittsburgh', 40.4406, -79.9959),
+)
+
+
+def init_app(app):
+    app.config.setdefault('GEO_DEFAULT_RADIUS_KM', 2.0)
+    app.config.setdefault('GEO_MAX_RADIUS_KM', 50.0)  # also bounds a box query's size
+
+
+def location_key(location):
+    """Case- and whitespace-insensitive form of a location, or ``None`` when blank."""
+    if not location:
+        return None
+    return ' '.join(location.casefold().split()) or None
+
+
+def cell(latitude, longitude):
+    row = math.floor((latitude + 90) / CELL_DEGREES)
+    column = math.floor((longitude + 180) / CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def coordinates(latitude, longitude):
+    """``latitude``, ``longitude`` and ``geo_cell`` values for an event (all ``None`` without a place)."""
+    if latitude is None or longitude is None:
+        return {'latitude': None, 'longitude': None, 'geo_cell': None}
+    return {'latitude': latitude, 'longitude': longitude, 'geo_cell': cell(latitude, longitude)}
+
+
+def geocode(locations, connection=None):
+    """``{location: (latitude, longitude)}`` for the given locations found in the gazetteer."""
+    keys = {}
+    for location in locations:
+        key = location_key(location)
+        if key:
+            keys.setdefault(key, []).append(location)
+    if not keys:
+        return {}
+    rows = (connection or db.session).execute(
+        select(Venue.key, Venue.latitude, Venue.longitude).where(Venue.key.in_(list(keys)))
+    )
+    return {location: (latitude, longitude) for key, latitude, longitude in rows for location in keys[key]}
+
+
+def fill_coordinates(rows, connection=None):
+    """Add geocoded ``latitude``/``longitude``/``geo_cell`` to event value dicts (bulk imports)."""
+    found = geocode({row['location'] for row in rows}, connection)
+    for row in rows:
+        row.update(coordinates(*found.get(row['location'], (None, None))))
+
+
+# Geocode on insert and whenever the location changes (the ORM path; bulk imports call fill_coordinates)
+@event.listens_for(Event, 'before_insert')
+@event.listens_for(Event, 'before_update')
+def set_coordinates(mapper, connection, target):
+    state = inspect(target)
+    if state.pending or state.attrs.location.history.has_changes():
+        found = geocode([target.location], connection)
+        for name, value in coordinates(*found.get(target.location, (None, None))).items():
+            setattr(target, name, value)
+
+
+# Seed the gazetteer wherever the table is created (the migration inserts the same rows)
+@event.listens_for(Venue.__table__, 'after_create')
+def seed_venues(target, connection, **kw):
+    connection.execute(target.insert(), [
+        {'key': location_key(name), 'name': name, 'latitude': latitude, 'longitude': longitude}
+        for name, latitude, longitude in PLACES
+    ])
+
+
+def import_venues(rows):
+    """Insert or replace ``(name, latitude, longitude)`` places; returns how many were stored."""
+    stored = 0
+    for name, latitude, longitude in rows:
+        key = location_key(name)
+        if key is None:
+            continue
+        latitude, longitude = float(latitude), float(longitude)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f'{name!r}: coordinates out of range')
+        db.session.merge(Venue(key=key, name=name.strip(), latitude=latitude, longitude=longitude))
+        stored += 1
+    db.session.commit()
+    return stored
+
+
+def backfill(batch_size=1000):
+    """Geocode every event again from the current gazetteer; returns the events with coordinates."""
+    located, last_id = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(Event.id, Event.location).where(Event.id > last_id).order_by(Event.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return located
+        found = geocode({row.location for row in rows})
+        updates = [
+            {'event_id': row.id, **{f'new_{name}': value for name, value in
+                                    coordinates(*found.get(row.location, (None, None))).items()}}
+            for row in rows
+        ]
+        table = Event.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam('event_id'))
+            .values({name: bindparam(f'new_{name}') for name in ('latitude', 'longitude', 'geo_cell')}),
+            updates,
+        )
+        db.session.commit()
+        located += sum(1 for values in updates if values['new_geo_cell'] is not None)
+        last_id = rows[-1].id
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """Great-circle (haversine) distance."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    half_chord = (math.sin((other_phi - phi) / 2) ** 2
+                  + math.cos(phi) * math.cos(other_phi) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(half_chord)))
+
+
+def radius_box(latitude, longitude, radius_km):
+    """``(south, west, north, east)`` around a point; longitudes narrow towards the poles."""
+    radius_km = min(radius_km, current_app.config['GEO_MAX_RADIUS_KM'])
+    latitude_span = radius_km / KM_PER_DEGREE
+    longitude_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (max(latitude - latitude_span, -90.0), max(longitude - longitude_span, -180.0),
+            min(latitude + latitude_span, 90.0), min(longitude + longitude_span, 180.0 - 1e-9))
+
+
+def box_clause(south, west, north, east):
+    """SQL criterion for events in the grid cells covering a box: one ``geo_cell`` range per grid row."""
+    first, last = cell(south, west), cell(north, east)
+    first_column, last_column = first % GRID_COLUMNS, last % GRID_COLUMNS
+    return or_(*(
+        Event.geo_cell.between(row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+        for row in range(first // GRID_COLUMNS, last // GRID_COLUMNS + 1)
+    ))
+
+
+def nearby(query, latitude, longitude, radius_km, limit):
+    """The ``limit`` events of ``query`` closest to a point within ``radius_km``, as (event, km) pairs."""
+    radius_km = min(radius_km, current_app.config['GEO_MAX_RADIUS_KM'])
+    candidates = query.filter(box_clause(*radius_box(latitude, longitude, radius_km)))
+    candidates = candidates.options(load_only(*LISTING_COLUMNS, Event.latitude, Event.longitude))
+    found = []
+    for candidate in candidates:
+        km = distance_km(latitude, longitude, candidate.latitude, candidate.longitude)
+        if km <= radius_km:
+            found.append((candidate, km))
+    found.sort(key=lambda pair: (pair[1], pair[0].starts_at is not None, pair[0].starts_at or 0, pair[0].id))
+    return found[:limit]
+
+
+def in_box(query, south, west, north, east, limit):
+    """Events of ``query`` inside a box, in date order.
+
+    Raises ``ValueError`` for a box wider or taller than ``2 * GEO_MAX_RADIUS_KM``, which would
+    read too many cells.
+    """
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError('expected south <= north and west <= east, in degrees')
+    span_km = 2 * current_app.config['GEO_MAX_RADIUS_KM']
+    middle = math.radians((south + north) / 2)
+    if (north - south) * KM_PER_DEGREE > span_km or (east - west) * KM_PER_DEGREE * math.cos(middle) > span_km:
+        raise ValueError(f'the box may span at most {span_km:g} km each way')
+    candidates = query.filter(box_clause(south, west, north, east),
+                              Event.latitude.between(south, north), Event.longitude.between(west, east))
+    candidates = candidates.options(load_only(*LISTING_COLUMNS, Event.latitude, Event.longitude))
+    # Sorted here: given ORDER BY ... LIMIT, SQLite walks the whole starts_at index instead of the cells
+    found = sorted(candidates, key=lambda event: (event.starts_at is not None, event.starts_at or 0, event.id))
+    return found[:limit]
@@ -0,0 +1,198 @@
+"""iCalendar (.ics) feeds of the events an account attends or organizes.
+
+Calendar apps cannot log in, so a feed URL carries a signed token naming
+its account or organizer. Feeds are streamed: VEVENTs are read and written
+``CHUNK_EVENTS`` at a time in ``(starts_at, id)`` keyset order, so memory
+stays flat however many events a feed has.
+
+Calendar apps poll often. Each feed therefore has an ETag built from one
+aggregate query: max ``updated_at`` and a hash of the event ids. An
+unchanged feed answers 304 without loading any event.
+Joining or leaving any event changes the id list. Editing an event changes
+``updated_at`` (see ``touch_updated_at`` in app/models.py).
+
+Event times are written as floating local times (no time zone), like the
+date/time strings they come from. Events without a parsable start are left
+out.
+"""
+import hashlib
+from datetime import timedelta, timezone
+
+from flask import current_app, g, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import func, select, tuple_
+
+from . import db
+from .models import Event, EventAttendance
+
+ATTENDING, ORGANIZING = 'attending', 'organizing'
+
+# Columns a VEVENT needs
+FEED_COLUMNS = (
+    Event.id,
+    Event.event_name,
+    Event.event_type,
+    Event.location,
+    Event.desc,
+    Event.starts_at,
+    Event.updated_at,
+)
+
+# Events rendered per chunk written to the response
+CHUNK_EVENTS = 200
+
+# Longest line in octets before folding (RFC 5545, 3.1)
+LINE_OCTETS = 75
+
+
+class InvalidFeedToken(ValueError):
+    pass
+
+
+def init_app(app):
+    app.config.setdefault('CALENDAR_EVENT_DURATION', 3600)  # seconds; events have no end time yet
+    app.config.setdefault('CALENDAR_UID_DOMAIN', 'pitt-event-manager')
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendar-feed')
+
+
+def feed_token(kind, subject):
+    """Token for one feed: ``(ATTENDING, account_id)`` or ``(ORGANIZING, username)``."""
+    return _serializer().dumps([kind, subject])
+
+
+def load_feed_token(token, kind):
+    try:
+        token_kind, subject = _serializer().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        raise InvalidFeedToken(token)
+    if token_kind != kind:
+        raise InvalidFeedToken(token)
+    return subject
+
+
+def feed_filter(kind, subject):
+    """Select the events a feed shows; both use an index (event_attendance's key, or organizer/starts_at)."""
+    statement = select(*FEED_COLUMNS).where(Event.starts_at.isnot(None))
+    if kind == ATTENDING:
+        return statement.join(EventAttendance, EventAttendance.event_id == Event.id).where(
+            EventAttendance.account_id == subject
+        )
+    return statement.where(Event.organizer == subject)
+
+
+def feed_etag(statement):
+    """Validator from one aggregate over the feed's rows; it changes when any row comes, goes or is edited.
+
+    The ids are hashed rather than summed: a sum stays the same when leaving
+    events 2 and 4 and joining 1 and 5.
+    """
+    rows = statement.subquery()
+    updated, ids = db.session.execute(
+        select(func.max(rows.c.updated_at), func.group_concat(rows.c.id))
+    ).one()
+    # group_concat's order is unspecified, so sort before hashing
+    ids = sorted(map(int, ids.split(','))) if ids else []
+    digest = hashlib.sha1(','.join(map(str, ids)).encode()).hexdigest()[:20]
+    return f'{len(ids)}-{updated.timestamp() if updated else 0:.6f}-{digest}'
+
+
+def stream_feed(statement, name):
+    """Return a generator of the calendar, one keyset page of ``CHUNK_EVENTS`` VEVENTs at a time.
+
+    Each page is its own short query, so no cursor (and, on SQLite without
+    WAL, no read lock) is held while a slow client reads the response.
+    """
+    duration = timedelta(seconds=current_app.config['CALENDAR_EVENT_DURATION'])
+    domain = current_app.config['CALENDAR_UID_DOMAIN']
+    # The @read_only wrapper has returned by the time the pages are read; keep its routing
+    routed = g.get('_read_only', False)
+    # url_for once, not per event: split the URL of event 0 around its id
+    url_prefix, url_suffix = url_for('main.event_details', event_id=0, _external=True).rsplit('0', 1)
+
+    def page(after):
+        query = statement
+        if after is not None:
+            query = query.where(tuple_(Event.starts_at, Event.id) > after)
+        g._read_only = routed
+        try:
+            return db.session.execute(query.order_by(Event.starts_at, Event.id).limit(CHUNK_EVENTS)).all()
+        finally:
+            g._read_only = False
+
+    def generate():
+        yield _lines((
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//Pitt Event Manager//Events//EN',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f'X-WR-CALNAME:{_escape(name)}',
+        ))
+        rows = page(None)
+        while rows:
+            yield ''.join(_vevent(row, duration, domain, url_prefix, url_suffix) for row in rows)
+            if len(rows) < CHUNK_EVENTS:
+                break
+            rows = page((rows[-1].starts_at, rows[-1].id))
+        yield _lines(('END:VCALENDAR',))
+
+    return generate()
+
+
+def _vevent(row, duration, domain, url_prefix, url_suffix):
+    stamp = _utc(row.updated_at)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{row.id}@{domain}',
+        f'DTSTAMP:{stamp}',
+        f'LAST-MODIFIED:{stamp}',
+        f'DTSTART:{_local(row.starts_at)}',
+        f'DTEND:{_local(row.starts_at + duration)}',
+        f'SUMMARY:{_escape(row.event_name)}',
+        f'URL:{url_prefix}{row.id}{url_suffix}',
+    ]
+    if row.location:
+        lines.append(f'LOCATION:{_escape(row.location)}')
+    if row.desc:
+        lines.append(f'DESCRIPTION:{_escape(row.desc)}')
+    if row.event_type:
+        lines.append(f'CATEGORIES:{_escape(row.event_type)}')
+    lines.append('END:VEVENT')
+    return _lines(lines)
+
+
+def _lines(lines):
+    return ''.join(_fold(line) + '\r\n' for line in lines)
+
+
+def _fold(line):
+    if len(line) <= LINE_OCTETS and line.isascii():
+        return line
+    # Split on character boundaries once a line would pass 75 octets; continuations start with a space
+    parts, current, size = [], [], 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > LINE_OCTETS:
+            parts.append(''.join(current))
+            current, size = [' '], 1
+        current.append(char)
+        size += width
+    parts.append(''.join(current))
+    return '\r\n'.join(parts)
+
+
+def _escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _local(moment):
+    return moment.strftime('%Y%m%dT%H%M%S')
+
+
+def _utc(moment):
+    # Stored times are naive local time
+    return moment.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
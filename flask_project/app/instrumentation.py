@@ -0,0 +1,315 @@
+"""Opt-in per-request SQL and timing instrumentation.
+
+With ``INSTRUMENTATION_ENABLED`` set, a sampled fraction of requests
+(``INSTRUMENTATION_SAMPLE_RATE``) is measured. For each one it records the
+wall-clock time, the number and total time of SQL statements (from
+SQLAlchemy's ``before/after_cursor_execute`` on every engine), and the time
+spent in ``render_template``.
+
+A statement text that runs ``INSTRUMENTATION_N_PLUS_ONE_THRESHOLD`` or more
+times in a single request is flagged as a likely N+1 pattern, such as a
+relationship lazy-loading inside a template loop. It is logged once per
+endpoint and statement.
+
+Sampled requests get a ``Server-Timing`` header. Per-endpoint totals, the
+password hashing pool's stats, job queue counts and rate-limit outcomes are
+served in Prometheus text format at ``INSTRUMENTATION_METRICS_PATH``, to
+scrapers presenting ``INSTRUMENTATION_METRICS_TOKEN`` as a bearer token.
+Without a token the path answers 404, unless
+``INSTRUMENTATION_METRICS_LOOPBACK`` opts in to loopback clients. That is
+only safe with no reverse proxy on the same host, since a local proxy makes
+every client look like loopback. A
+request that is not sampled costs one random() call plus a context-variable
+read per SQL statement.
+"""
+import hmac
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from flask import (Response, abort, before_render_template, current_app, request, request_finished, request_started,
+                   request_tearing_down, template_rendered)
+from sqlalchemy import event
+
+from . import db
+from .jobs import job_queue
+from .passwords import password_hasher
+from .ratelimit import rate_limiter
+
+# Upper bounds, in seconds, of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Clients allowed to read the metrics without a token when INSTRUMENTATION_METRICS_LOOPBACK is on
+LOOPBACK = ('127.0.0.1', '::1')
+
+# Longest statement text kept in a log line
+STATEMENT_PREVIEW = 200
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'template_time', 'statements', '_query_started',
+                 '_render_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+        self._query_started = []
+        self._render_started = []
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'statuses', 'wall_time', 'db_time', 'template_time', 'queries', 'n_plus_one',
+                 'buckets')
+
+    def __init__(self):
+        self.requests = 0
+        self.statuses = Counter()
+        self.wall_time = 0.0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.queries = 0
+        self.n_plus_one = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+def require_metrics_access():
+    """Abort the request unless it may read operational stats (the metrics, the hashing pool status)."""
+    token = current_app.config['INSTRUMENTATION_METRICS_TOKEN']
+    if token:
+        scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(presented.encode(), token.encode()):
+            abort(Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain'))
+    elif not (current_app.config['INSTRUMENTATION_METRICS_LOOPBACK'] and request.remote_addr in LOOPBACK):
+        abort(404)
+
+
+class Instrumentation:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(EndpointStats)
+        self._flagged = set()  # (endpoint, statement) pairs already logged
+        self._engines = set()
+        self.sample_rate = 1.0
+        self.threshold = 5
+        self.server_timing = True
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION_ENABLED', False)
+        app.config.setdefault('INSTRUMENTATION_SAMPLE_RATE', 1.0)  # fraction of requests measured
+        app.config.setdefault('INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('INSTRUMENTATION_SERVER_TIMING', True)
+        app.config.setdefault('INSTRUMENTATION_METRICS_PATH', '/metrics')
+        app.config.setdefault('INSTRUMENTATION_METRICS_TOKEN', None)  # None: 404 unless loopback is allowed
+        app.config.setdefault('INSTRUMENTATION_METRICS_LOOPBACK', False)
+        app.extensions['instrumentation'] = self
+        if not app.config['INSTRUMENTATION_ENABLED']:
+            return
+
+        self.sample_rate = app.config['INSTRUMENTATION_SAMPLE_RATE']
+        self.threshold = app.config['INSTRUMENTATION_N_PLUS_ONE_THRESHOLD']
+        self.server_timing = app.config['INSTRUMENTATION_SERVER_TIMING']
+
+        with app.app_context():
+            engines = [db.engine, app.extensions.get('read_engine')]
+        for engine in filter(None, engines):
+            self._listen(engine)
+
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        request_tearing_down.connect(self._request_tearing_down, app)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        app.add_url_rule(app.config['INSTRUMENTATION_METRICS_PATH'], 'metrics', self.metrics_view)
+
+    def snapshot(self):
+        """Return ``{endpoint: EndpointStats}`` copied under the lock."""
+        with self._lock:
+            copies = {}
+            for endpoint, stats in self._endpoints.items():
+                copy = EndpointStats()
+                for name in EndpointStats.__slots__:
+                    value = getattr(stats, name)
+                    setattr(copy, name, value.copy() if isinstance(value, (Counter, list)) else value)
+                copies[endpoint] = copy
+            return copies
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._flagged.clear()
+
+    def metrics_view(self):
+        require_metrics_access()
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    def render_metrics(self):
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def sample(name, value, **labels):
+            label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        endpoints = sorted(self.snapshot().items())
+        header('app_instrumentation_sample_rate', 'gauge', 'Fraction of requests measured.')
+        sample('app_instrumentation_sample_rate', self.sample_rate)
+
+        header('app_requests_total', 'counter', 'Sampled requests by endpoint and status.')
+        for endpoint, stats in endpoints:
+            for status, count in sorted(stats.statuses.items()):
+                sample('app_requests_total', count, endpoint=endpoint, status=status)
+
+        header('app_request_duration_seconds', 'histogram', 'Wall-clock time of sampled requests.')
+        for endpoint, stats in endpoints:
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                cumulative += count
+                sample('app_request_duration_seconds_bucket', cumulative, endpoint=endpoint, le=bound)
+            sample('app_request_duration_seconds_bucket', stats.requests, endpoint=endpoint, le='+Inf')
+            sample('app_request_duration_seconds_sum', f'{stats.wall_time:.6f}', endpoint=endpoint)
+            sample('app_request_duration_seconds_count', stats.requests, endpoint=endpoint)
+
+        for name, attribute, help_text in (
+            ('app_db_queries_total', 'queries', 'SQL statements run by sampled requests.'),
+            ('app_db_duration_seconds_total', 'db_time', 'Time spent in SQL by sampled requests.'),
+            ('app_template_duration_seconds_total', 'template_time', 'Time spent in render_template.'),
+            ('app_n_plus_one_total', 'n_plus_one',
+             f'Sampled requests that ran one statement {self.threshold}+ times.'),
+        ):
+            header(name, 'counter', help_text)
+            for endpoint, stats in endpoints:
+                value = getattr(stats, attribute)
+                sample(name, f'{value:.6f}' if isinstance(value, float) else value, endpoint=endpoint)
+
+        hashing = password_hasher.stats()
+        header('app_password_hash_queue_depth', 'gauge', 'Hashes queued or running.')
+        sample('app_password_hash_queue_depth', hashing['queue_depth'])
+        header('app_password_hash_completed_total', 'counter', 'Hashes finished.')
+        sample('app_password_hash_completed_total', hashing['completed'])
+        header('app_password_hash_failed_total', 'counter', 'Hashes that raised or were cancelled.')
+        sample('app_password_hash_failed_total', hashing['failed'])
+        header('app_password_hash_rejected_total', 'counter', 'Hashes refused because the pool was busy.')
+        sample('app_password_hash_rejected_total', hashing['rejected'])
+        header('app_password_hash_latency_seconds', 'gauge', 'Recent hashing latency percentiles.')
+        for quantile, key in (('0.5', 'latency_p50'), ('0.95', 'latency_p95'), ('1', 'latency_max')):
+            if hashing[key] is not None:
+                sample('app_password_hash_latency_seconds', f'{hashing[key]:.6f}', quantile=quantile)
+
+        jobs = job_queue.stats()
+        header('app_jobs', 'gauge', 'Background jobs in the job table by status.')
+        for status in ('queued', 'running', 'done', 'failed'):
+            sample('app_jobs', jobs[status], status=status)
+        header('app_jobs_completed_total', 'counter', 'Jobs this process ran successfully.')
+        sample('app_jobs_completed_total', jobs['worker_completed'])
+        header('app_jobs_failed_total', 'counter', 'Jobs this process gave up on after their last attempt.')
+        sample('app_jobs_failed_total', jobs['worker_failed'])
+
+        limits = rate_limiter.stats()
+        header('app_rate_limit_requests_total', 'counter', 'Rate-limited endpoint requests by outcome.')
+        for outcome in ('allowed', 'limited'):
+            for scope, count in sorted(limits[outcome].items()):
+                sample('app_rate_limit_requests_total', count, scope=scope, outcome=outcome)
+        return '\n'.join(lines) + '\n'
+
+    def _listen(self, engine):
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # SQLAlchemy hooks
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is not None:
+            stats._query_started.append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        if stats is not None and stats._query_started:
+            stats.db_time += time.perf_counter() - stats._query_started.pop()
+            stats.queries += 1
+            stats.statements[statement] += 1
+
+    # Flask signals
+
+    def _request_started(self, sender, **extra):
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            _current.set(RequestStats())
+        else:
+            _current.set(None)
+
+    def _request_tearing_down(self, sender, **extra):
+        # Requests that raised past Flask never reach request_finished
+        _current.set(None)
+
+    def _render_started(self, sender, template, context, **extra):
+        stats = _current.get()
+        if stats is not None:
+            stats._render_started.append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        stats = _current.get()
+        if stats is not None and stats._render_started:
+            elapsed = time.perf_counter() - stats._render_started.pop()
+            # Only the outermost render counts, so nested renders are not added twice
+            if not stats._render_started:
+                stats.template_time += elapsed
+
+    def _request_finished(self, sender, response, **extra):
+        stats = _current.get()
+        if stats is None:
+            return
+        _current.set(None)
+        wall_time = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+
+        repeated = [(statement, count) for statement, count in stats.statements.items() if count >= self.threshold]
+        with self._lock:
+            totals = self._endpoints[endpoint]
+            totals.requests += 1
+            totals.statuses[response.status_code] += 1
+            totals.wall_time += wall_time
+            totals.db_time += stats.db_time
+            totals.template_time += stats.template_time
+            totals.queries += stats.queries
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if wall_time <= bound:
+                    totals.buckets[index] += 1
+                    break
+            if repeated:
+                totals.n_plus_one += 1
+            new_flags = [(statement, count) for statement, count in repeated
+                         if (endpoint, statement) not in self._flagged]
+            self._flagged.update((endpoint, statement) for statement, _ in new_flags)
+
+        for statement, count in new_flags:
+            sender.logger.warning(
+                'Possible N+1 in %s: statement ran %d times in one request: %s',
+                endpoint, count, ' '.join(statement.split())[:STATEMENT_PREVIEW],
+            )
+
+        if self.server_timing:
+            response.headers.add('Server-Timing', ', '.join((
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'tpl;dur={stats.template_time * 1000:.1f}',
+                f'total;dur={wall_time * 1000:.1f}',
+            )))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+instrumentation = Instrumentation()
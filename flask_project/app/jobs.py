@@ -0,0 +1,391 @@
+"""In-process background jobs backed by the ``job`` table.
+
+``job_queue.enqueue(name, payload)`` inserts a row in the caller's
+transaction. The job therefore exists only if that transaction commits,
+and the commit wakes the worker. Notifications are enqueued in the same
+transaction as the change they announce (app/attendance.py), so a crash
+cannot commit one without the other. The click never waits for delivery.
+
+The worker starts on the first request (``JOB_WORKER_ENABLED``), or runs on
+its own with ``flask jobs work``. A dispatcher thread checks for due jobs
+with a plain ``SELECT``, so an idle queue never takes SQLite's write lock,
+and claims them with a single ``UPDATE ... RETURNING`` that flips them to
+``running`` with a lease. Several processes can therefore share the table
+without running a job twice. Claimed jobs run on a pool of ``JOB_WORKERS``
+threads. Their outcomes are written in the same commit as the next claim,
+so a burst of short jobs costs a few commits, not one per job. A job that
+raises is retried with exponential backoff and jitter, up to its
+``max_attempts``. A job whose lease expires (for example because the
+process died) is claimed again.
+
+Tasks registered with ``dedicated=True`` are heavy batch work (the
+recommendation jobs). With ``JOB_DEDICATED_WORKER`` set, a ``flask jobs
+work`` process is deployed for them: only it claims them, and the job thread
+inside web processes leaves them queued, so a web worker never loads their
+dependencies or holds the GIL against request threads for them. Without it
+(the default) every worker runs them, so nothing waits on a process that
+was never started.
+
+Tasks registered with ``coalesce=True`` are enqueued with a dedupe key that
+only holds while the job is queued. Claiming the job clears the key, so
+repeated triggers share one queued run and a trigger after the claim queues
+the next one.
+
+Functions registered with ``@job_queue.every(config_key)`` run from the
+dispatcher every ``app.config[config_key]`` seconds. The reminder scheduler
+in app/notifications.py is one of them.
+"""
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, delete, event, func, insert, or_, select, update
+
+from . import db
+from .models import Job
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# Jobs claimed ahead per worker thread, so one claim and one commit cover several jobs
+CLAIM_PER_WORKER = 4
+
+# Seconds between sweeps that delete finished jobs older than JOB_RETENTION
+PURGE_INTERVAL = 600
+
+
+class JobQueue:
+    def __init__(self):
+        self._tasks = {}  # name -> (function, max_attempts)
+        self._dedicated_tasks = set()  # names only a `flask jobs work` process claims (JOB_DEDICATED_WORKER)
+        self._coalesced_tasks = set()  # names whose dedupe key is cleared when claimed
+        self._dedicated = False  # whether this process's worker claims them
+        self._periodic = []  # [config_key, function, last_run]
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._listening = False
+        self._started_pid = None
+        self._dispatcher = None
+        self._executor = None
+        self._app = None
+        self._outstanding = 0  # claimed and not yet recorded
+        self._claimed = {}  # job id -> claimed job not yet started on the pool
+        self._results = []  # (job, error or None) waiting to be recorded
+        self._next_retry = None  # monotonic time of the earliest retry scheduled here
+        self._completed = 0
+        self._failed = 0
+        self._last_purge = 0.0
+        self._atexit_registered = False
+
+    def init_app(self, app):
+        app.config.setdefault('JOB_WORKER_ENABLED', True)  # start the worker on the first request
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_POLL_INTERVAL', 1.0)  # seconds; commits that enqueue wake it sooner
+        app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOB_BACKOFF_BASE', 2.0)  # seconds before the first retry, doubling after
+        app.config.setdefault('JOB_BACKOFF_MAX', 3600)
+        app.config.setdefault('JOB_LEASE', 300)  # seconds a claimed job may run before it is retried
+        app.config.setdefault('JOB_RETENTION', 7 * 86400)  # seconds finished jobs are kept
+        app.config.setdefault('JOB_DEDICATED_WORKER', False)  # a `flask jobs work` process runs dedicated tasks
+        app.extensions['job_queue'] = self
+
+        if app.config['JOB_WORKER_ENABLED']:
+            @app.before_request
+            def start_job_worker():
+                if self._started_pid != os.getpid():
+                    self.start(app)
+
+        if not self._listening:
+            self._listening = True
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+
+    # Registration
+
+    def task(self, name=None, max_attempts=None, dedicated=False, coalesce=False):
+        """Register a job function; it is called with the payload as keyword arguments.
+
+        With ``dedicated`` and ``JOB_DEDICATED_WORKER`` set, only a worker started with
+        ``dedicated=True`` (``flask jobs work``) runs it. With ``coalesce`` its dedupe key is
+        cleared when the job is claimed.
+        """
+        def register(function):
+            self._tasks[name or function.__name__] = (function, max_attempts)
+            if dedicated:
+                self._dedicated_tasks.add(name or function.__name__)
+            if coalesce:
+                self._coalesced_tasks.add(name or function.__name__)
+            return function
+        return register
+
+    def every(self, config_key):
+        """Run a function from the dispatcher every ``app.config[config_key]`` seconds."""
+        def register(function):
+            self._periodic.append([config_key, function, 0.0])
+            return function
+        return register
+
+    # Enqueueing
+
+    def enqueue(self, name, payload=None, run_at=None, dedupe_key=None, max_attempts=None):
+        """Queue a job in the current transaction; it runs after the caller commits.
+
+        With ``dedupe_key`` the job is skipped if one with the same key exists.
+        """
+        if name not in self._tasks:
+            raise KeyError(f'no job registered as {name!r}')
+        from flask import current_app
+        statement = insert(Job).values(
+            name=name,
+            payload=json.dumps(payload or {}),
+            status=QUEUED,
+            attempts=0,
+            max_attempts=max_attempts or self._tasks[name][1] or current_app.config['JOB_MAX_ATTEMPTS'],
+            run_at=run_at or datetime.now(),
+            dedupe_key=dedupe_key,
+        )
+        if dedupe_key is not None:
+            statement = statement.prefix_with('OR IGNORE', dialect='sqlite')
+        db.session.execute(statement)
+        db.session.info['jobs_enqueued'] = True
+
+    def _after_commit(self, session):
+        if session.info.pop('jobs_enqueued', False):
+            self._wake.set()
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('jobs_enqueued', None)
+
+    # Worker
+
+    def start(self, app, dedicated=False):
+        """Start the dispatcher thread and worker pool in this process (idempotent).
+
+        Only a ``dedicated`` worker claims the tasks registered with ``dedicated=True``.
+        """
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._dedicated = dedicated
+            self._app = app
+            self._stop.clear()
+            self._outstanding = 0
+            self._results = []
+            self._claimed = {}
+            self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, args=(app,), name='job-dispatcher', daemon=True,
+            )
+            self._dispatcher.start()
+            if not self._atexit_registered:
+                # The dispatcher is a daemon thread; without this, jobs it claimed stay running until
+                # their lease expires when the process exits
+                self._atexit_registered = True
+                atexit.register(self.stop, wait=False)
+
+    def stop(self, wait=True):
+        """Stop claiming jobs; with ``wait``, finish the claimed ones and record their outcome.
+
+        Without ``wait``, claimed jobs that have not started go back to the queue and the outcomes
+        known so far are recorded; a job still running is retried once its lease expires.
+        """
+        with self._lock:
+            if self._started_pid != os.getpid():
+                return
+            self._started_pid = None
+            dispatcher, executor = self._dispatcher, self._executor
+        self._stop.set()
+        self._wake.set()
+        if wait:
+            dispatcher.join()
+            executor.shutdown(wait=True)
+        else:
+            dispatcher.join(timeout=self._app.config['JOB_POLL_INTERVAL'])
+            executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            results, self._results = self._results, []
+            unstarted, self._claimed = list(self._claimed.values()), {}
+        with self._app.app_context():
+            self._record(self._app, results)
+            self._release(unstarted)
+            db.session.commit()
+            db.session.remove()
+
+    def stats(self):
+        counts = dict(db.session.query(Job.status, func.count()).group_by(Job.status).all())
+        with self._lock:
+            return {
+                'queued': counts.get(QUEUED, 0),
+                'running': counts.get(RUNNING, 0),
+                'done': counts.get(DONE, 0),
+                'failed': counts.get(FAILED, 0),
+                'worker_outstanding': self._outstanding,
+                'worker_completed': self._completed,
+                'worker_failed': self._failed,
+            }
+
+    def _dispatch(self, app):
+        capacity = app.config['JOB_WORKERS'] * CLAIM_PER_WORKER
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._lock:
+                results, self._results = self._results, []
+                free = capacity - self._outstanding + len(results)
+            claimed = []
+            with app.app_context():
+                try:
+                    self._run_periodic(app)
+                    # Outcomes of finished jobs and the next claim share one commit
+                    self._record(app, results)
+                    if free:
+                        claimed = self._claim(app, free)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Job dispatcher failed; retrying')
+                    with self._lock:
+                        self._results[:0] = results
+                    results, claimed = [], []
+                    self._stop.wait(app.config['JOB_POLL_INTERVAL'])
+                finally:
+                    db.session.remove()
+
+            with self._lock:
+                self._outstanding += len(claimed) - len(results)
+                self._claimed.update((job.id, job) for job in claimed)
+            for job in claimed:
+                try:
+                    self._executor.submit(self._execute, app, job)
+                except RuntimeError:
+                    # The pool has shut down (interpreter exit); stop() puts the rest back in the queue
+                    self._stop.set()
+                    return
+            if len(claimed) < free or not free:
+                # Nothing more is due, or the pool is full; commits and finished jobs wake us,
+                # and so does the earliest retry this process scheduled
+                timeout = app.config['JOB_POLL_INTERVAL']
+                with self._lock:
+                    if self._next_retry is not None:
+                        timeout = max(0.0, min(timeout, self._next_retry - time.monotonic()))
+                        self._next_retry = None
+                self._wake.wait(timeout)
+
+    def _claim(self, app, limit):
+        now = datetime.now()
+        is_due = or_(
+            and_(Job.status == QUEUED, Job.run_at <= now),
+            and_(Job.status == RUNNING, Job.locked_until < now),
+        )
+        if not self._dedicated and self._dedicated_tasks and app.config['JOB_DEDICATED_WORKER']:
+            is_due = and_(is_due, Job.name.not_in(self._dedicated_tasks))
+        # Read first: the UPDATE takes the write lock even when it matches nothing
+        if db.session.scalar(select(Job.id).where(is_due).limit(1)) is None:
+            return []
+        values = {'status': RUNNING, 'attempts': Job.attempts + 1,
+                  'locked_until': now + timedelta(seconds=app.config['JOB_LEASE'])}
+        if self._coalesced_tasks:
+            # A trigger after this point queues a new run instead of being dropped
+            values['dedupe_key'] = case((Job.name.in_(self._coalesced_tasks), None), else_=Job.dedupe_key)
+        due = (
+            select(Job.id)
+            .where(is_due)
+            .order_by(Job.run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return db.session.execute(
+            update(Job)
+            .where(Job.id.in_(due.scalar_subquery()))
+            .values(**values)
+            .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    def _execute(self, app, job):
+        with self._lock:
+            self._claimed.pop(job.id, None)
+        function, _ = self._tasks.get(job.name, (None, None))
+        error = None
+        with app.app_context():
+            try:
+                if function is None:
+                    raise LookupError(f'no job registered as {job.name!r}')
+                function(**json.loads(job.payload))
+            except Exception as e:
+                db.session.rollback()
+                error = e
+            finally:
+                db.session.remove()
+        with self._lock:
+            self._results.append((job, error))
+        self._wake.set()
+
+    def _record(self, app, results):
+        """Write the outcome of finished jobs; the caller commits."""
+        now = datetime.now()
+        done = [job.id for job, error in results if error is None]
+        if done:
+            db.session.execute(
+                update(Job).where(Job.id.in_(done)).values(
+                    status=DONE, finished_at=now, locked_until=None, last_error=None,
+                )
+            )
+        failed = 0
+        for job, error in results:
+            if error is None:
+                continue
+            message = f'{type(error).__name__}: {error}'
+            if job.attempts >= job.max_attempts:
+                app.logger.error('Job %s (%s) failed after %d attempts: %s', job.id, job.name, job.attempts, message)
+                values = {'status': FAILED, 'finished_at': now}
+                failed += 1
+            else:
+                delay = min(app.config['JOB_BACKOFF_MAX'], app.config['JOB_BACKOFF_BASE'] * 2 ** (job.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)  # jitter, so a burst of failures does not retry in lockstep
+                app.logger.warning('Job %s (%s) failed, retrying in %.1fs: %s', job.id, job.name, delay, message)
+                values = {'status': QUEUED, 'run_at': now + timedelta(seconds=delay)}
+                retry_at = time.monotonic() + delay
+                with self._lock:
+                    self._next_retry = min(self._next_retry or retry_at, retry_at)
+            db.session.execute(
+                update(Job).where(Job.id == job.id).values(locked_until=None, last_error=message, **values)
+            )
+        with self._lock:
+            self._completed += len(done)
+            self._failed += failed
+
+    def _release(self, jobs):
+        """Put claimed jobs that never started back in the queue; the caller commits."""
+        if jobs:
+            db.session.execute(
+                update(Job).where(Job.id.in_([job.id for job in jobs]), Job.status == RUNNING)
+                .values(status=QUEUED, attempts=Job.attempts - 1, locked_until=None)
+            )
+
+    def _run_periodic(self, app):
+        now = time.monotonic()
+        for entry in self._periodic:
+            config_key, function, last_run = entry
+            if now - last_run >= app.config[config_key]:
+                entry[2] = now
+                try:
+                    function()
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Periodic job %s failed', function.__name__)
+
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = now
+            cutoff = datetime.now() - timedelta(seconds=app.config['JOB_RETENTION'])
+            db.session.execute(delete(Job).where(Job.status.in_((DONE, FAILED)), Job.finished_at < cutoff))
+            db.session.commit()
+
+
+job_queue = JobQueue()
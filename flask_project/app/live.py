@@ -0,0 +1,207 @@
+"""Live attendee counts on event pages, over Server-Sent Events.
+
+``GET /event/<id>/live`` streams an event's attendee count and capacity
+each time they change. Streams never query the database. ``broadcaster``
+keeps one channel per event watched in this worker, and a single poller
+thread keeps the channels current:
+
+* signups and declines committed in this worker wake the poller at once
+  (app/attendance.py marks the session; the commit hook does the rest);
+* every ``LIVE_POLL_INTERVAL`` seconds it probes the highest
+  ``attendance_log`` id anyway, which catches changes committed by other
+  worker processes.
+
+When the log has moved, one query reads the counts of the watched events
+that have new log rows, and only channels whose state changed wake their
+streams. A page open in a thousand tabs costs a worker the same as a page
+open in one: a probe per interval and a query per change.
+
+Each open stream holds a worker thread while it waits (run gunicorn with
+gthread or gevent workers), so a stream ends after ``LIVE_STREAM_SECONDS``.
+The browser reconnects by itself and sends ``Last-Event-ID``, the log id of
+the state it has, so an unchanged count is not sent again.
+"""
+import json
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, func, or_, select
+
+from . import db
+from .models import AttendanceLog, Event
+
+# Milliseconds the browser waits before reconnecting a closed stream
+RETRY_MS = 3000
+
+
+class _Channel:
+    """Latest state of one watched event; streams wait on ``changed``."""
+
+    def __init__(self):
+        self.changed = threading.Condition()
+        self.version = -1  # attendance_log id the state was read at; -1 until first read
+        self.state = None  # None once read means the event does not exist
+        self.subscribers = 0
+
+
+class Broadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}  # event_id -> _Channel
+        self._new = set()  # event ids whose channel has not been read yet
+        self._wake = threading.Event()
+        self._poller_pid = None
+        self._last_log_id = None
+        self._listening = False
+        self.polls = 0
+        self.queries = 0
+
+    def init_app(self, app):
+        app.config.setdefault('LIVE_UPDATES', True)
+        app.config.setdefault('LIVE_POLL_INTERVAL', 2.0)  # seconds; local commits wake the poller sooner
+        app.config.setdefault('LIVE_KEEPALIVE', 15)  # seconds between comment lines on an idle stream
+        app.config.setdefault('LIVE_STREAM_SECONDS', 300)
+        app.extensions['broadcaster'] = self
+
+        if not self._listening:
+            self._listening = True
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+
+    def changed(self, event_id):
+        """Note an attendance change in the current transaction; watchers hear of it after commit."""
+        db.session.info.setdefault('live_events', set()).add(event_id)
+
+    def stream(self, event_id, last_event_id=None):
+        """SSE messages for ``event_id``: an ``attendance`` event per state, comments to keep alive.
+
+        Subscribes right away (so call it in the request); the returned generator unsubscribes when
+        the stream ends or the client goes away.
+        """
+        keepalive = current_app.config['LIVE_KEEPALIVE']
+        lifetime = current_app.config['LIVE_STREAM_SECONDS']
+        channel = self.subscribe(event_id)
+
+        def generate():
+            try:
+                yield f'retry: {RETRY_MS}\n\n'
+                seen, deadline = last_event_id, time.monotonic() + lifetime
+                while (remaining := deadline - time.monotonic()) > 0:
+                    version, state = self.wait(channel, seen, min(keepalive, remaining))
+                    if version == seen or version < 0:
+                        yield ': keepalive\n\n'
+                    elif state is None:
+                        yield 'event: gone\ndata: {}\n\n'
+                        return
+                    else:
+                        seen = version
+                        yield f'id: {version}\nevent: attendance\ndata: {json.dumps(state)}\n\n'
+            finally:
+                self.unsubscribe(event_id, channel)
+
+        return generate()
+
+    def subscribe(self, event_id):
+        """The channel of ``event_id``, created for its first subscriber; pair with ``unsubscribe``."""
+        with self._lock:
+            channel = self._channels.get(event_id)
+            if channel is None:
+                channel = self._channels[event_id] = _Channel()
+                self._new.add(event_id)
+                self._wake.set()  # read by the poller, once for every new stream of the event
+            channel.subscribers += 1
+        self._start(current_app._get_current_object())
+        return channel
+
+    def unsubscribe(self, event_id, channel):
+        with self._lock:
+            channel.subscribers -= 1
+            if channel.subscribers == 0 and self._channels.get(event_id) is channel:
+                del self._channels[event_id]
+                self._new.discard(event_id)
+
+    def wait(self, channel, version, timeout):
+        """``(version, state)`` of ``channel`` once it differs from ``version``, or after ``timeout``."""
+        with channel.changed:
+            channel.changed.wait_for(lambda: 0 <= channel.version != version, timeout)
+            return channel.version, channel.state
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(channel.subscribers for channel in self._channels.values())
+
+    def _after_commit(self, session):
+        events = session.info.pop('live_events', None)
+        if events:
+            with self._lock:
+                watched = not events.isdisjoint(self._channels)
+            if watched:
+                self._wake.set()
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('live_events', None)
+
+    # Poller
+
+    def _start(self, app):
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+            self._last_log_id = None
+        threading.Thread(target=self._poll, args=(app,), name='live-poller', daemon=True).start()
+
+    def _poll(self, app):
+        while True:
+            self._wake.wait(app.config['LIVE_POLL_INTERVAL'])
+            self._wake.clear()
+            try:
+                with app.app_context():
+                    self._refresh()
+            except Exception:
+                app.logger.exception('Live attendance poll failed')
+
+    def _refresh(self):
+        with self._lock:
+            watched, new = set(self._channels), set(self._new)
+            self._new.clear()
+        if not watched:
+            self._last_log_id = None  # nothing to catch up on when streams come back
+            return
+        self.polls += 1
+        last_log_id = db.session.scalar(select(func.max(AttendanceLog.id))) or 0
+        if self._last_log_id is None:
+            stale = Event.id.in_(watched)
+        elif last_log_id > self._last_log_id or new:
+            changed = select(AttendanceLog.event_id).where(AttendanceLog.id > self._last_log_id)
+            stale = or_(Event.id.in_(new), Event.id.in_(changed) & Event.id.in_(watched))
+        else:
+            return
+        rows = db.session.execute(select(Event.id, Event.attendee_count, Event.capacity).where(stale)).all()
+        self.queries += 1
+        self._last_log_id = last_log_id
+
+        found = {event_id: _state(attendee_count, capacity) for event_id, attendee_count, capacity in rows}
+        found.update((event_id, None) for event_id in new - found.keys())  # deleted or never existed
+        with self._lock:
+            channels = [(self._channels.get(event_id), state) for event_id, state in found.items()]
+        for channel, state in channels:
+            if channel is None:
+                continue
+            with channel.changed:
+                if channel.version < 0 or channel.state != state:
+                    channel.version, channel.state = last_log_id, state
+                    channel.changed.notify_all()
+
+
+def _state(attendee_count, capacity):
+    return {
+        'attendee_count': attendee_count,
+        'capacity': capacity,
+        'is_full': capacity is not None and attendee_count >= capacity,
+    }
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,91 @@
+"""Relationship loading plans and the lazy-load check for templates.
+
+``Account.event_attendance`` and ``Event.user_id_attendance`` are ordinary
+lazy relationships. Touching one inside a template loop runs one query per
+row. Views instead ask for what they render with the options below: attendee
+names through one ``selectinload`` per page, and ``raiseload`` for every
+other relationship.
+
+``LAZY_LOAD_DURING_RENDER`` controls what happens when a template still
+triggers a load, either a lazy relationship or a column left out by
+``load_only``:
+
+* ``'allow'`` (the default): the load runs as usual.
+* ``'warn'``: the load runs and is logged.
+* ``'raise'``: ``LazyLoadDuringRender`` is raised. This is the default when
+  ``TESTING`` is set, so a page whose query count grows with its list
+  fails loudly.
+"""
+from contextvars import ContextVar
+
+from flask import before_render_template, current_app, has_app_context, request_started, template_rendered
+from sqlalchemy import event
+from sqlalchemy.orm import raiseload, selectinload
+
+from . import db
+from .models import Account, Event
+
+MODES = ('allow', 'warn', 'raise')
+
+_rendering = ContextVar('rendering', default=())  # names of templates being rendered
+
+
+class LazyLoadDuringRender(RuntimeError):
+    """Raised when a template triggers a query in ``'raise'`` mode."""
+
+
+def with_attendee_names():
+    """Load each event's attendees (names only) in one extra query per page."""
+    return selectinload(Event.user_id_attendance).load_only(Account.id, Account.first_name, Account.last_name)
+
+
+def no_other_relationships():
+    """Fail fast on any relationship the view did not ask for."""
+    return raiseload('*')
+
+
+class LoadingGuard:
+    def __init__(self):
+        self._listening = False
+
+    def init_app(self, app):
+        app.config.setdefault('LAZY_LOAD_DURING_RENDER', 'raise' if app.config.get('TESTING') else 'allow')
+        if app.config['LAZY_LOAD_DURING_RENDER'] not in MODES:
+            raise ValueError(f"LAZY_LOAD_DURING_RENDER must be one of {', '.join(MODES)}")
+        app.extensions['loading_guard'] = self
+
+        request_started.connect(self._request_started, app)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        if not self._listening:
+            self._listening = True
+            event.listen(db.session, 'do_orm_execute', self._check)
+
+    def _request_started(self, sender, **extra):
+        # A render that raised never sent template_rendered
+        _rendering.set(())
+
+    def _render_started(self, sender, template, context, **extra):
+        _rendering.set(_rendering.get() + (template.name or '<string>',))
+
+    def _render_finished(self, sender, template, context, **extra):
+        _rendering.set(_rendering.get()[:-1])
+
+    def _check(self, orm_execute_state):
+        templates = _rendering.get()
+        if not templates or not (orm_execute_state.is_relationship_load or orm_execute_state.is_column_load):
+            return
+        mode = current_app.config['LAZY_LOAD_DURING_RENDER'] if has_app_context() else 'allow'
+        if mode == 'allow':
+            return
+
+        loaded_from = orm_execute_state.lazy_loaded_from
+        target = type(loaded_from.obj()).__name__ if loaded_from is not None and loaded_from.obj() else 'an object'
+        kind = 'relationship' if orm_execute_state.is_relationship_load else 'unloaded column'
+        message = f'{kind} load on {target} while rendering {templates[-1]}'
+        if mode == 'raise':
+            raise LazyLoadDuringRender(message)
+        current_app.logger.warning('Lazy load during render: %s', message)
+
+
+loading_guard = LoadingGuard()
@@ -1,28 +1,40 @@
-from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
 from . import db
+from .dates import parse_starts_at
+from .passwords import password_hasher
 
 class Account(db.Model, UserMixin):  # Add UserMixin here
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), nullable=False, unique=True)
-    password = db.Column(db.String(100), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     first_name = db.Column(db.String(100), nullable=True)
     last_name = db.Column(db.String(100), nullable=True)
     desc = db.Column(db.String(255))
     hobbies = db.Column(db.String(255))
     age = db.Column(db.String(20))
     is_organizer = db.Column(db.Boolean, default=False)  # Add this line to track organizer status
-    event_attendance = db.relationship('Event', secondary='event_attendance')
+    # Lazy by default; views that render these pick a strategy from app/loading.py
+    event_attendance = db.relationship('Event', secondary='event_attendance', back_populates='user_id_attendance')
 
-    # Set the password after hashing
+    # Set the password after hashing (runs in the hashing pool, see app/passwords.py)
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
 
     # Check if the password matches the hashed password
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
+
+    # True when the stored hash was made with a different algorithm or cost than configured
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password)
     
 class Event(db.Model):
+    __table_args__ = (
+        db.Index('ix_event_organizer_starts_at', 'organizer', 'starts_at'),  # Managed events by start time
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     event_name = db.Column(db.String(100), nullable=False)
     event_type = db.Column(db.String(100), nullable=False)
@@ -31,10 +43,149 @@ class Event(db.Model):
     desc = db.Column(db.String(255))
     location = db.Column(db.String(255))
     date = db.Column(db.String(20))
-    tags = db.Column(db.String(255), nullable=True)  # New field for tags
-    user_id_attendance = db.relationship('Account', secondary='event_attendance')
-    
+    tags = db.Column(db.String(255), nullable=True)  # New field for tags (display copy; event_tag is the index, see app/tags.py)
+    starts_at = db.Column(db.DateTime, nullable=True, index=True)  # Derived from date/time, see set_starts_at
+    attendee_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained by app/attendance.py
+    capacity = db.Column(db.Integer, nullable=True)  # None means unlimited
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)  # Content changes only, see touch_updated_at
+    latitude = db.Column(db.Float, nullable=True)  # From the venue gazetteer when the location is a known place, see app/geo.py
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.Integer, nullable=True, index=True)  # Grid cell of latitude/longitude for nearby queries
+    user_id_attendance = db.relationship('Account', secondary='event_attendance', back_populates='event_attendance')
+
+    # Events that have not started yet; an index range scan on starts_at
+    @classmethod
+    def upcoming(cls, now=None):
+        return cls.query.filter(cls.starts_at >= (now or datetime.now()))
+
+# Keep starts_at in step with the date/time strings the forms write
+@event.listens_for(Event, 'before_insert')
+@event.listens_for(Event, 'before_update')
+def set_starts_at(mapper, connection, target):
+    state = inspect(target)
+    if state.pending or state.attrs.date.history.has_changes() or state.attrs.time.history.has_changes():
+        target.starts_at = parse_starts_at(target.date, target.time)
+
+# Columns whose changes count as an edit for updated_at (and so for calendar feed ETags);
+# attendee_count changes on every signup and is left out on purpose
+CONTENT_COLUMNS = ('event_name', 'event_type', 'organizer', 'time', 'desc', 'location', 'date', 'tags', 'capacity')
+
+@event.listens_for(Event, 'before_update')
+def touch_updated_at(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in CONTENT_COLUMNS):
+        target.updated_at = datetime.now()
+
+# Gazetteer of known places; events at these locations get coordinates (app/geo.py)
+class Venue(db.Model):
+    __tablename__ = 'venue'
+    key = db.Column(db.String(255), primary_key=True)  # geo.location_key() of the name
+    name = db.Column(db.String(255), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
 class EventAttendance(db.Model):
     __tablename__ = 'event_attendance'
     account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
-    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
\ No newline at end of file
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+
+# Accounts waiting for a seat at a full event, promoted in created_at order
+class EventWaitlist(db.Model):
+    __tablename__ = 'event_waitlist'
+    __table_args__ = (
+        db.Index('ix_event_waitlist_event_created', 'event_id', 'created_at'),
+    )
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+# One row per distinct tag; slug is the case-folded form used for lookups
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)  # Spelling as first entered
+    slug = db.Column(db.String(255), nullable=False, unique=True, index=True)
+
+class EventTag(db.Model):
+    __tablename__ = 'event_tag'
+    __table_args__ = (
+        db.Index('ix_event_tag_tag_event', 'tag_id', 'event_id'),  # Events with a tag, and facet counts
+    )
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+
+# Background work queued by app/jobs.py; claimed by flipping status to 'running'
+class Job(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),  # Next due jobs
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    locked_until = db.Column(db.DateTime, nullable=True)  # Lease; an expired 'running' job is retried
+    dedupe_key = db.Column(db.String(255), nullable=True, unique=True)  # e.g. one reminder per event start
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+# Precomputed top events per account, written in batch by app/recommendations.py
+class Recommendation(db.Model):
+    __table_args__ = (
+        db.Index('ix_recommendation_account_rank', 'account_id', 'rank'),  # An account's list, best first
+    )
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+    rank = db.Column(db.Integer, nullable=False)  # 1 is the best match
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+# Append-only record of attendance changes, written in the same transaction as the change
+# (app/attendance.py); app/analytics.py folds it into the rollup tables below
+class AttendanceLog(db.Model):
+    __tablename__ = 'attendance_log'
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    action = db.Column(db.String(20), nullable=False)  # signed_up, waitlisted, promoted, declined, left_waitlist
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+# Rollups of attendance_log: per organizer and day, per event, and per organizer and tag
+class AttendanceDaily(db.Model):
+    __tablename__ = 'attendance_daily'
+    organizer = db.Column(db.String(100), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    signed_up = db.Column(db.Integer, nullable=False, default=0)
+    waitlisted = db.Column(db.Integer, nullable=False, default=0)
+    promoted = db.Column(db.Integer, nullable=False, default=0)
+    declined = db.Column(db.Integer, nullable=False, default=0)
+    left_waitlist = db.Column(db.Integer, nullable=False, default=0)
+
+class EventAttendanceStats(db.Model):
+    __tablename__ = 'event_attendance_stats'
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), primary_key=True)
+    organizer = db.Column(db.String(100), nullable=False, index=True)
+    signed_up = db.Column(db.Integer, nullable=False, default=0)
+    waitlisted = db.Column(db.Integer, nullable=False, default=0)
+    promoted = db.Column(db.Integer, nullable=False, default=0)
+    declined = db.Column(db.Integer, nullable=False, default=0)
+    left_waitlist = db.Column(db.Integer, nullable=False, default=0)
+
+class TagAttendanceStats(db.Model):
+    __tablename__ = 'tag_attendance_stats'
+    organizer = db.Column(db.String(100), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    signed_up = db.Column(db.Integer, nullable=False, default=0)
+    waitlisted = db.Column(db.Integer, nullable=False, default=0)
+    promoted = db.Column(db.Integer, nullable=False, default=0)
+    declined = db.Column(db.Integer, nullable=False, default=0)
+    left_waitlist = db.Column(db.Integer, nullable=False, default=0)
+
+# How far each rollup has read its log (the last attendance_log id folded in)
+class RollupState(db.Model):
+    __tablename__ = 'rollup_state'
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
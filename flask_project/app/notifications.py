@@ -0,0 +1,155 @@
+"""Notification jobs and the event reminder scheduler.
+
+Delivery is a stand-in for email. Each message is appended as one JSON line
+to ``NOTIFICATION_OUTBOX`` (default ``instance/outbox.jsonl``), where a real
+mailer or a developer can pick it up.
+
+Every ``REMINDER_SCAN_INTERVAL`` seconds the scheduler looks for events
+starting within ``REMINDER_LEAD`` seconds plus one more scan interval. For
+each one it queues a reminder job due ``REMINDER_LEAD`` before the start.
+The job's dedupe key includes the start time, so each start gets one
+reminder. If an event is moved, the reminder for the old time does
+nothing, and the next scan queues one for the new time.
+
+The reminder job itself sends nothing. It splits the attendees into ranges
+of ``REMINDER_CHUNK`` account ids and queues one ``event_reminder_chunk``
+job per range, all in one commit. Each chunk is delivered and retried on
+its own, so a failure part-way through a large event resends one chunk,
+not the chunks that already went out.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .jobs import job_queue
+from .models import Account, Event, EventAttendance, Job
+
+# Attendees per reminder chunk job: loaded, written to the outbox and retried together
+REMINDER_CHUNK = 500
+
+_outbox_lock = threading.Lock()
+
+
+def init_app(app):
+    app.config.setdefault('NOTIFICATION_OUTBOX', os.path.join(app.instance_path, 'outbox.jsonl'))
+    app.config.setdefault('REMINDER_LEAD', 86400)  # seconds before the start a reminder is sent
+    app.config.setdefault('REMINDER_SCAN_INTERVAL', 300)
+
+
+def deliver(messages):
+    """Append messages (dicts with ``to``, ``subject`` and ``body``) to the outbox."""
+    if not messages:
+        return
+    sent_at = datetime.now().isoformat(timespec='seconds')
+    lines = ''.join(json.dumps({**message, 'sent_at': sent_at}) + '\n' for message in messages)
+    path = current_app.config['NOTIFICATION_OUTBOX']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with _outbox_lock, open(path, 'a', encoding='utf-8') as f:
+        f.write(lines)
+
+
+def _message(account, subject, body):
+    return {'to': account.username, 'subject': subject, 'body': f'Hi {account.first_name or account.username},\n\n{body}'}
+
+
+@job_queue.task()
+def attendance_confirmation(account_id, event_id, status):
+    account = db.session.get(Account, account_id)
+    event = db.session.get(Event, event_id)
+    if account is None or event is None:
+        return
+    subject, body = {
+        'signed_up': ('You are going to {name}', 'You are signed up for {name} on {date} at {time}, {location}.'),
+        'waitlisted': ('You are on the waitlist for {name}',
+                       '{name} is full. We will let you know if a seat opens up.'),
+        'promoted': ('A seat opened up at {name}',
+                     'You have moved off the waitlist and are signed up for {name} on {date} at {time}.'),
+        'declined': ('You are no longer going to {name}', 'You have declined {name}.'),
+        'left_waitlist': ('You left the waitlist for {name}', 'You are no longer on the waitlist for {name}.'),
+    }[status]
+    fields = {'name': event.event_name, 'date': event.date, 'time': event.time, 'location': event.location}
+    deliver([_message(account, subject.format(**fields), body.format(**fields))])
+
+
+@job_queue.task()
+def event_created(event_id):
+    event = db.session.get(Event, event_id)
+    organizer = event and db.session.scalar(select(Account).filter_by(username=event.organizer))
+    if organizer is None:
+        return
+    deliver([_message(organizer, f'{event.event_name} is published',
+                      f'Your event {event.event_name} on {event.date} at {event.time} is now listed.')])
+
+
+@job_queue.task()
+def event_reminder(event_id, starts_at):
+    if not _still_starts_at(event_id, starts_at):
+        return  # Deleted or moved; the scheduler queues a reminder for the new time
+    if db.session.scalar(select(Job.id).filter_by(dedupe_key=_chunk_key(event_id, starts_at, 0))) is not None:
+        return  # Already split by an earlier attempt whose outcome was not recorded
+
+    # Page through attendee ids only; each chunk job loads its own accounts
+    after_id = 0
+    while True:
+        ids = db.session.scalars(
+            select(EventAttendance.account_id)
+            .where(EventAttendance.event_id == event_id, EventAttendance.account_id > after_id)
+            .order_by(EventAttendance.account_id)
+            .limit(REMINDER_CHUNK)
+        ).all()
+        if not ids:
+            break
+        job_queue.enqueue(
+            'event_reminder_chunk',
+            {'event_id': event_id, 'starts_at': starts_at, 'after_id': after_id, 'through_id': ids[-1]},
+            dedupe_key=_chunk_key(event_id, starts_at, after_id),
+        )
+        after_id = ids[-1]
+    db.session.commit()
+
+
+@job_queue.task()
+def event_reminder_chunk(event_id, starts_at, after_id, through_id):
+    if not _still_starts_at(event_id, starts_at):
+        return
+    event = db.session.get(Event, event_id)
+    subject = f'Reminder: {event.event_name} is coming up'
+    body = f'{event.event_name} starts on {event.date} at {event.time}, {event.location}.'
+    attendees = db.session.execute(
+        select(Account.id, Account.username, Account.first_name)
+        .join(EventAttendance, EventAttendance.account_id == Account.id)
+        .where(EventAttendance.event_id == event_id, Account.id > after_id, Account.id <= through_id)
+    ).all()
+    deliver([_message(account, subject, body) for account in attendees])
+
+
+def _still_starts_at(event_id, starts_at):
+    event = db.session.get(Event, event_id)
+    return event is not None and event.starts_at is not None and event.starts_at.isoformat() == starts_at
+
+
+def _chunk_key(event_id, starts_at, after_id):
+    return f'event_reminder_chunk:{event_id}:{starts_at}:{after_id}'
+
+
+@job_queue.every('REMINDER_SCAN_INTERVAL')
+def schedule_reminders():
+    """Queue one reminder per upcoming event start; runs from the job dispatcher."""
+    lead = timedelta(seconds=current_app.config['REMINDER_LEAD'])
+    now = datetime.now()
+    horizon = now + lead + timedelta(seconds=current_app.config['REMINDER_SCAN_INTERVAL'])
+    upcoming = db.session.execute(
+        select(Event.id, Event.starts_at).where(Event.starts_at > now, Event.starts_at <= horizon)
+    ).all()
+    for event_id, starts_at in upcoming:
+        job_queue.enqueue(
+            'event_reminder',
+            {'event_id': event_id, 'starts_at': starts_at.isoformat()},
+            run_at=max(now, starts_at - lead),
+            dedupe_key=f'event_reminder:{event_id}:{starts_at.isoformat()}',
+        )
@@ -0,0 +1,120 @@
+"""Keyset (cursor) pagination for event listings.
+
+Pages are ordered by ``(Event.starts_at, Event.id)`` and each page starts
+right after the last row of the previous one. The database seeks straight to
+that position in ``ix_event_starts_at`` (or ``ix_event_organizer_starts_at``
+for one organizer's events), so page 500 costs the same as page 1.
+Cursors are signed so clients cannot forge them; they stay opaque.
+"""
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import load_only
+
+from .models import Event
+
+# Columns the listing templates and the JSON API actually render
+LISTING_COLUMNS = (
+    Event.id,
+    Event.event_name,
+    Event.event_type,
+    Event.organizer,
+    Event.date,
+    Event.time,
+    Event.location,
+    Event.desc,
+    Event.tags,
+    Event.starts_at,
+    Event.attendee_count,
+    Event.capacity,
+)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Page:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='event-cursor')
+
+
+def encode_cursor(event):
+    starts_at = event.starts_at.isoformat() if event.starts_at else None
+    return _serializer().dumps([starts_at, event.id])
+
+
+def decode_cursor(cursor):
+    try:
+        starts_at, event_id = _serializer().loads(cursor)
+        if starts_at is not None:
+            starts_at = datetime.fromisoformat(starts_at)
+    except (BadSignature, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+    return starts_at, event_id
+
+
+def page_size(value):
+    if not value or value < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(value, MAX_PAGE_SIZE)
+
+
+def paginate_events(query, cursor=None, limit=None):
+    """Return one ``Page`` of ``query`` ordered by ``(starts_at, id)``.
+
+    ``query`` is an ``Event`` query with any filters already applied.
+    Raises ``InvalidCursor`` when ``cursor`` was not issued by this app.
+    """
+    limit = page_size(limit)
+    query = query.options(load_only(*LISTING_COLUMNS))
+
+    if cursor:
+        starts_at, event_id = decode_cursor(cursor)
+        if starts_at is None:
+            # Undated events sort first; continue through them, then everything dated
+            query = query.filter(or_(and_(Event.starts_at.is_(None), Event.id > event_id), Event.starts_at.isnot(None)))
+        else:
+            query = query.filter(tuple_(Event.starts_at, Event.id) > tuple_(starts_at, event_id))
+
+    rows = query.order_by(Event.starts_at.asc().nulls_first(), Event.id.asc()).limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return Page(items, next_cursor)
+
+
+def serialize_event(event):
+    return {
+        'id': event.id,
+        'event_name': event.event_name,
+        'event_type': event.event_type,
+        'organizer': event.organizer,
+        'date': event.date,
+        'time': event.time,
+        'location': event.location,
+        'desc': event.desc,
+        'tags': event.tags,
+        'starts_at': event.starts_at.isoformat() if event.starts_at else None,
+        'attendee_count': event.attendee_count,
+        'capacity': event.capacity,
+    }
@@ -0,0 +1,200 @@
+"""Password hashing in a bounded process pool.
+
+Hashing is deliberately slow CPU work. Done inline, a burst of logins ties
+up every request thread and ordinary page views queue behind them. Here the
+work runs in a small process pool instead, separate from request handling.
+At most ``PASSWORD_HASH_MAX_PENDING`` hashes may be queued or running at
+once. Beyond that a caller waits up to ``PASSWORD_HASH_TIMEOUT`` seconds
+and then gets ``HashingBusy``, rather than piling more work on the pool.
+
+The algorithm and cost come from config. ``needs_rehash()`` reports stored
+hashes made with other parameters, so ``login()`` can upgrade them
+transparently.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+
+METHODS = ('pbkdf2:sha256', 'pbkdf2:sha512', 'scrypt', 'bcrypt')
+
+# Latencies kept for the percentiles reported by stats()
+LATENCY_WINDOW = 1024
+
+
+class HashingBusy(RuntimeError):
+    """Raised when the hashing pool is saturated."""
+
+
+def _hash(password, method, cost):
+    if method == 'bcrypt':
+        # bcrypt only reads the first 72 bytes
+        return bcrypt.hashpw(password.encode('utf-8')[:72], bcrypt.gensalt(rounds=cost)).decode('ascii')
+    if method == 'scrypt':
+        return generate_password_hash(password, method=f'scrypt:{cost}:8:1')
+    return generate_password_hash(password, method=f'{method}:{cost}')
+
+
+def _verify(hashed, password):
+    if hashed.startswith('$2'):
+        return bcrypt.checkpw(password.encode('utf-8')[:72], hashed.encode('ascii'))
+    return check_password_hash(hashed, password)
+
+
+def hash_parameters(hashed):
+    """Return ``(method, cost)`` for a stored hash, cost being ``None`` if unknown."""
+    if hashed.startswith('$2'):
+        return 'bcrypt', int(hashed.split('$')[2])
+    parts = hashed.split('$', 1)[0].split(':')
+    if parts[0] == 'scrypt':
+        return 'scrypt', int(parts[1]) if len(parts) > 1 else None
+    if parts[0] == 'pbkdf2' and len(parts) > 1:
+        return f'pbkdf2:{parts[1]}', int(parts[2]) if len(parts) > 2 else None
+    return parts[0], None
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = 'pbkdf2:sha256'
+        self.cost = 600000
+        self.workers = 2
+        self.timeout = 10
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(64)
+        self._stats_lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+        app.config.setdefault('PASSWORD_HASH_COST', 600000)  # iterations, bcrypt rounds or scrypt N
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)  # 0 hashes inline on the request thread
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 64)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+
+        if app.config['PASSWORD_HASH_METHOD'] not in METHODS:
+            raise ValueError(f"PASSWORD_HASH_METHOD must be one of {', '.join(METHODS)}")
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.cost = app.config['PASSWORD_HASH_COST']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_MAX_PENDING'])
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method, self.cost)
+
+    def verify(self, hashed, password):
+        if not hashed:
+            return False
+        return self._run(_verify, hashed, password)
+
+    def needs_rehash(self, hashed):
+        return hash_parameters(hashed) != (self.method, self.cost)
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            pending, completed, failed, rejected = self._pending, self._completed, self._failed, self._rejected
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+        return {
+            'method': self.method,
+            'cost': self.cost,
+            'workers': self.workers,
+            'queue_depth': pending,
+            'completed': completed,
+            'failed': failed,
+            'rejected': rejected,
+            'latency_p50': percentile(0.50),
+            'latency_p95': percentile(0.95),
+            'latency_max': latencies[-1] if latencies else None,
+        }
+
+    def shutdown(self, wait=False):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+    def _run(self, function, *args, inline=False):
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self._rejected += 1
+            raise HashingBusy('password hashing queue is full')
+
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._pending += 1
+        if inline or not self.workers:
+            failed = True
+            try:
+                result = function(*args)
+                failed = False
+                return result
+            finally:
+                self._finish(started, failed)
+
+        try:
+            future = self._pool().submit(function, *args)
+        except BrokenProcessPool:
+            self._finish(started, failed=True)
+            return self._run_after_broken_pool(function, *args)
+        # The slot is released when the hash ends, not when the caller stops waiting for it,
+        # so hashes that timed out still count against PASSWORD_HASH_MAX_PENDING
+        future.add_done_callback(
+            lambda future: self._finish(started, failed=future.cancelled() or future.exception() is not None)
+        )
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy('password hashing timed out')
+        except BrokenProcessPool:
+            return self._run_after_broken_pool(function, *args)
+
+    def _run_after_broken_pool(self, function, *args):
+        # A worker died; start a fresh pool next time and finish this one inline
+        self.shutdown()
+        return self._run(function, *args, inline=True)
+
+    def _finish(self, started, failed):
+        with self._stats_lock:
+            self._pending -= 1
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+                self._latencies.append(time.perf_counter() - started)
+        self._slots.release()
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor_pid != os.getpid():
+                # A forked child (e.g. a preloaded gunicorn worker) cannot use the parent's pool
+                self._executor = None
+            if self._executor is None:
+                # Spawned (not forked) workers, since request threads may be running
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,174 @@
+"""Per-client rate limits for endpoints that are cheap to call and costly to answer.
+
+``@rate_limiter.limit('SEARCH_RATE_LIMIT')`` gives each client a token
+bucket of ``(burst, rate)`` from that config key: up to ``burst`` requests
+at once, refilled at ``rate`` per second. A request that finds the bucket
+empty gets a 429 with ``Retry-After``. Clients are keyed by account when
+logged in, otherwise by remote address. ``/search`` and the per-keystroke
+``/suggest`` each have their own bucket (``SUGGEST_RATE_LIMIT``).
+
+A bucket is stored as the single time at which it will be full again (the
+"generic cell rate" form of a token bucket). A request costs ``1 / rate``
+seconds and is allowed while that time stays within ``burst / rate``
+seconds of now. One number per client lets the SQLite backend check and
+take a token in one ``UPSERT ... RETURNING``. Backends:
+
+* ``memory``: per-process dict, at most ``RATELIMIT_MAX_KEYS`` clients.
+* ``sqlite``: one table in ``RATELIMIT_SQLITE_PATH``, shared by every worker
+  process on the host. It is a separate file, so the limiter's writes never
+  queue behind the application's write lock.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_login import current_user
+
+# Seconds between deletions of buckets that have refilled completely
+PURGE_INTERVAL = 60
+
+
+class MemoryBackend:
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._full_at = OrderedDict()  # key -> time the bucket is full again
+
+    def consume(self, key, cost, window, now):
+        """Take one token; returns 0 when allowed, else seconds until one is available."""
+        with self._lock:
+            full_at = max(self._full_at.get(key, now), now) + cost
+            if full_at - now > window:
+                return full_at - window - now
+            self._full_at[key] = full_at
+            self._full_at.move_to_end(key)
+            if len(self._full_at) > self.max_keys:
+                self._evict(now)
+            return 0
+
+    def clear(self):
+        with self._lock:
+            self._full_at.clear()
+
+    def _evict(self, now):
+        # A full bucket is the same as no bucket; drop those before the least recently used
+        for key in [key for key, full_at in self._full_at.items() if full_at <= now]:
+            del self._full_at[key]
+        while len(self._full_at) > self.max_keys:
+            self._full_at.popitem(last=False)
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._purged_at = 0.0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        connection = self._connect()
+        connection.execute('CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, full_at REAL NOT NULL)')
+        connection.close()
+
+    def consume(self, key, cost, window, now):
+        connection = self._connection()
+        if now - self._purged_at > PURGE_INTERVAL:
+            self._purged_at = now
+            connection.execute('DELETE FROM rate_limit WHERE full_at < ?', (now,))
+        row = connection.execute(
+            'INSERT INTO rate_limit (key, full_at) VALUES (:key, :now + :cost) '
+            'ON CONFLICT (key) DO UPDATE SET full_at = MAX(full_at, :now) + :cost '
+            'WHERE MAX(full_at, :now) + :cost - :now <= :window '
+            'RETURNING full_at',
+            {'key': key, 'now': now, 'cost': cost, 'window': window},
+        ).fetchone()
+        if row is not None:
+            return 0
+        (full_at,) = connection.execute('SELECT full_at FROM rate_limit WHERE key = ?', (key,)).fetchone()
+        return max(full_at, now) + cost - window - now
+
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_limit')
+
+    def _connection(self):
+        # One autocommit connection per thread (and per process: the pid check covers forks)
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return connection
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')  # losing a bucket on a crash only resets it
+        return connection
+
+
+class RateLimiter:
+    def __init__(self):
+        self.backend = MemoryBackend(10000)
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._allowed = Counter()  # scope -> requests let through
+        self._limited = Counter()  # scope -> requests answered with 429
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE', 'memory')  # 'memory' or 'sqlite'
+        app.config.setdefault('RATELIMIT_MAX_KEYS', 10000)
+        app.config.setdefault('RATELIMIT_SQLITE_PATH', os.path.join(app.instance_path, 'ratelimit.db'))
+        app.config.setdefault('SEARCH_RATE_LIMIT', (10, 2.0))  # burst, requests per second
+        app.config.setdefault('SUGGEST_RATE_LIMIT', (20, 5.0))  # the navbar asks at most every 250 ms
+
+        storage = app.config['RATELIMIT_STORAGE']
+        if storage == 'memory':
+            self.backend = MemoryBackend(app.config['RATELIMIT_MAX_KEYS'])
+        elif storage == 'sqlite':
+            self.backend = SQLiteBackend(app.config['RATELIMIT_SQLITE_PATH'])
+        else:
+            raise ValueError(f'Unknown RATELIMIT_STORAGE {storage!r}')
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        app.extensions['rate_limiter'] = self
+
+    def limit(self, config_key, scope=None):
+        """Decorate a view so each client may call it at the rate in ``app.config[config_key]``."""
+        def decorator(view):
+            name = scope or view.__name__
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled:
+                    burst, rate = current_app.config[config_key]
+                    wait = self.hit(f'{name}:{self._client()}', burst, rate)
+                    with self._lock:
+                        (self._limited if wait else self._allowed)[name] += 1
+                    if wait:
+                        response = jsonify({'error': 'Too many requests; try again shortly.'})
+                        response.status_code = 429
+                        response.headers['Retry-After'] = str(math.ceil(wait))
+                        return response
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def hit(self, key, burst, rate):
+        """Take a token from ``key``'s bucket; returns 0 when allowed, else seconds to wait."""
+        # The slack keeps float rounding of repeated 1/rate costs from refusing the last token of a burst
+        return self.backend.consume(key, 1.0 / rate, burst / rate + 1e-9, time.time())
+
+    def stats(self):
+        with self._lock:
+            return {'allowed': dict(self._allowed), 'limited': dict(self._limited)}
+
+    @staticmethod
+    def _client():
+        if current_user.is_authenticated:
+            return f'account:{current_user.get_id()}'
+        return f'ip:{request.remote_addr}'
+
+
+rate_limiter = RateLimiter()
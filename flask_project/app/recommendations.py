@@ -0,0 +1,154 @@
+"""Event recommendations from hobbies, tags and co-attendance.
+
+Scores are computed in batch and stored in the ``recommendation`` table.
+The home page reads its top rows and never does similarity math.
+
+Each event gets a TF-IDF vector over the words of its tags, name and
+description (``FIELD_WEIGHTS``). Each account gets a content profile: the
+TF-IDF vector of its hobbies plus the mean vector of the events it
+attends. Candidates are upcoming events the account does not attend. A
+candidate's score blends two parts:
+
+* content similarity: the cosine between the profile and the event;
+* co-attendance: the mean cosine, over the columns of the attendance
+  matrix, between the candidate and the events the account attends
+  ("people who went to X also went to Y").
+
+All of it is sparse matrix algebra (SciPy) over blocks of accounts, then
+``argpartition`` for the top ``RECOMMENDATION_COUNT``; the model lives in
+app/recommender.py and is imported on the first rebuild or refresh.
+
+Refreshing:
+
+* ``rebuild_recommendations`` recomputes every account. It runs as a job
+  every ``RECOMMENDATION_REBUILD_INTERVAL`` seconds, or with
+  ``flask recommendations rebuild``.
+* ``refresh_recommendations`` recomputes one account, after it signs up,
+  declines or edits its hobbies. It reuses this process's item-side
+  matrices (vocabulary, event vectors, co-attendance). These are rebuilt once
+  they are ``RECOMMENDATION_MODEL_MAX_AGE`` seconds old, so one click costs
+  a few milliseconds.
+
+Both are dedicated jobs (see app/jobs.py). By default the job thread of
+each web process runs them. With ``JOB_DEDICATED_WORKER`` only ``flask jobs
+work`` does, so web workers neither import NumPy/SciPy nor hold the model in
+memory. Set it only where that process is actually started. Refreshes
+coalesce per account (``queue_refresh``), so a burst of clicks, or a worker
+that is down for a while, leaves one queued refresh per account.
+"""
+import math
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+
+from . import db
+from .jobs import job_queue
+from .models import Account, EventAttendance, Recommendation
+
+
+def init_app(app):
+    app.config.setdefault('RECOMMENDATION_COUNT', 20)  # stored per account
+    app.config.setdefault('RECOMMENDATION_REBUILD_INTERVAL', 3600)
+    app.config.setdefault('RECOMMENDATION_MODEL_MAX_AGE', 600)
+
+
+class _ModelCache:
+    """This process's latest Recommender, rebuilt once it is older than the max age."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model = None
+
+    def get(self, max_age):
+        with self._lock:
+            if self._model is None or time.monotonic() - self._model.built_at > max_age:
+                from .recommender import Recommender
+                self._model = Recommender.load()
+            return self._model
+
+    def replace(self, model):
+        with self._lock:
+            self._model = model
+
+
+_models = _ModelCache()
+
+
+def _account_inputs(account_ids=None):
+    accounts = select(Account.id, Account.hobbies).order_by(Account.id)
+    attendance = select(EventAttendance.account_id, EventAttendance.event_id)
+    if account_ids is not None:
+        accounts = accounts.where(Account.id.in_(account_ids))
+        attendance = attendance.where(EventAttendance.account_id.in_(account_ids))
+    attended = {}
+    for account_id, event_id in db.session.execute(attendance):
+        attended.setdefault(account_id, []).append(event_id)
+    return [(account_id, hobbies, attended.get(account_id, ())) for account_id, hobbies in db.session.execute(accounts)]
+
+
+def store(results):
+    """Replace the stored recommendations of the accounts in ``results``; the caller commits."""
+    if not results:
+        return
+    db.session.execute(delete(Recommendation).where(Recommendation.account_id.in_(list(results))))
+    now = datetime.now()
+    rows = [
+        {'account_id': account_id, 'event_id': event_id, 'rank': rank, 'score': score, 'computed_at': now}
+        for account_id, picks in results.items()
+        for rank, (event_id, score) in enumerate(picks, start=1)
+    ]
+    if rows:
+        db.session.execute(insert(Recommendation.__table__), rows)
+
+
+def rebuild(log=None):
+    """Recompute and store recommendations for every account; returns the account count."""
+    from .recommender import BLOCK_SIZE, Recommender
+
+    started = time.perf_counter()
+    model = Recommender.load()
+    _models.replace(model)
+    built = time.perf_counter()
+
+    count = current_app.config['RECOMMENDATION_COUNT']
+    accounts = _account_inputs()
+    for start in range(0, len(accounts), BLOCK_SIZE):
+        store(model.recommend(accounts[start:start + BLOCK_SIZE], count))
+        db.session.commit()
+    if log:
+        log(f'{len(model.event_ids)} events ({len(model.candidates)} upcoming), {len(model.vocabulary)} terms: '
+            f'model in {built - started:.2f}s, {len(accounts)} accounts in {time.perf_counter() - built:.2f}s')
+    return len(accounts)
+
+
+def refresh(account_ids):
+    """Recompute the given accounts against this process's cached model; the caller commits."""
+    model = _models.get(current_app.config['RECOMMENDATION_MODEL_MAX_AGE'])
+    store(model.recommend(_account_inputs(account_ids), current_app.config['RECOMMENDATION_COUNT']))
+
+
+def queue_refresh(account_id):
+    """Queue a refresh of one account in the current transaction, unless one is already queued."""
+    job_queue.enqueue('refresh_recommendations', {'account_id': account_id},
+                      dedupe_key=f'refresh_recommendations:{account_id}')
+
+
+@job_queue.task(dedicated=True, coalesce=True)
+def refresh_recommendations(account_id):
+    refresh([account_id])
+    db.session.commit()
+
+
+@job_queue.task(dedicated=True)
+def rebuild_recommendations():
+    rebuild(log=current_app.logger.info)
+
+
+@job_queue.every('RECOMMENDATION_REBUILD_INTERVAL')
+def schedule_rebuild():
+    # One rebuild per interval across all processes sharing the job table
+    interval = current_app.config['RECOMMENDATION_REBUILD_INTERVAL']
+    job_queue.enqueue('rebuild_recommendations', dedupe_key=f'rebuild_recommendations:{math.floor(time.time() / interval)}')
@@ -0,0 +1,179 @@
+"""The recommendation model: sparse TF-IDF and co-attendance matrices (NumPy, SciPy).
+
+Imported on first use by app/recommendations.py, so web workers that
+never rebuild or refresh recommendations do not load NumPy and SciPy.
+"""
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+
+from . import db
+from .models import Event, EventAttendance
+from .search import tokenize
+
+# Event fields and how much a word in each counts
+FIELD_WEIGHTS = (
+    ('tags', 3.0),
+    ('event_name', 2.0),
+    ('desc', 1.0),
+)
+
+# Blend of the two scores; hobbies vs attended events inside the content profile
+CONTENT_WEIGHT = 0.6
+COATTENDANCE_WEIGHT = 0.4
+HOBBY_WEIGHT = 1.0
+HISTORY_WEIGHT = 1.0
+
+# Accounts scored per block; a block's dense score matrix is BLOCK_SIZE x upcoming events
+BLOCK_SIZE = 512
+
+
+class Recommender:
+    """Item-side matrices for one snapshot of events and attendance."""
+
+    def __init__(self, events, attendance, now=None):
+        """``events``: rows with id, event_name, desc, tags, starts_at.
+        ``attendance``: (account_id, event_id) pairs.
+        """
+        now = now or datetime.now()
+        self.built_at = time.monotonic()
+        self.event_ids = np.array([event.id for event in events], dtype=np.int64)
+        self.event_index = {event_id: i for i, event_id in enumerate(self.event_ids.tolist())}
+        self.candidates = np.array(
+            [i for i, event in enumerate(events) if event.starts_at is not None and event.starts_at >= now],
+            dtype=np.int64,
+        )
+
+        # Vocabulary and IDF come from the events; hobbies are mapped onto it
+        documents = [self._event_terms(event) for event in events]
+        self.vocabulary = {}
+        for terms in documents:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+        counts = self._count_matrix(documents)
+        document_frequency = np.bincount(counts.indices, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + len(events)) / (1 + document_frequency)) + 1
+        self.event_vectors = _normalize(self._tf_idf(counts))  # events x terms
+        self.candidate_vectors = self.event_vectors[self.candidates].T.tocsc()  # terms x candidates
+
+        # Co-attendance: cosine between the attendance columns of every event and each candidate
+        accounts = _normalize(self._attendance_matrix(attendance).T).T.tocsr()  # accounts x events, unit columns
+        coattendance = (accounts.T @ accounts[:, self.candidates]).tocsr()  # events x candidates
+        # An event is not its own neighbour
+        diagonal = np.arange(len(self.candidates))
+        own = sparse.csr_matrix(
+            (np.ones(len(self.candidates)), (self.candidates, diagonal)), shape=coattendance.shape
+        )
+        coattendance = coattendance - coattendance.multiply(own)
+        coattendance.eliminate_zeros()
+        self.coattendance = coattendance
+
+    @classmethod
+    def load(cls):
+        events = db.session.execute(
+            select(Event.id, Event.event_name, Event.desc, Event.tags, Event.starts_at).order_by(Event.id)
+        ).all()
+        attendance = db.session.execute(select(EventAttendance.account_id, EventAttendance.event_id)).all()
+        return cls(events, attendance)
+
+    def _event_terms(self, event):
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(getattr(event, field)):
+                terms[term] += weight
+        return terms
+
+    def _count_matrix(self, documents):
+        rows, columns, values = [], [], []
+        for row, terms in enumerate(documents):
+            for term, count in terms.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append(count)
+        shape = (len(documents), len(self.vocabulary))
+        return sparse.csr_matrix((values, (rows, columns)), shape=shape, dtype=np.float64)
+
+    def _tf_idf(self, counts):
+        counts = counts.copy()
+        counts.data = 1 + np.log(counts.data)  # sublinear term frequency
+        return counts @ sparse.diags(self.idf)
+
+    def _attendance_matrix(self, attendance):
+        account_index, rows, columns = {}, [], []
+        for account_id, event_id in attendance:
+            column = self.event_index.get(event_id)
+            if column is None:
+                continue
+            rows.append(account_index.setdefault(account_id, len(account_index)))
+            columns.append(column)
+        shape = (len(account_index), len(self.event_ids))
+        return sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=shape)
+
+    def recommend(self, accounts, count):
+        """Top ``count`` (event_id, score) per account.
+
+        ``accounts`` is a list of (account_id, hobbies, attended event ids).
+        Returns ``{account_id: [(event_id, score), ...]}`` best first.
+        """
+        results = {}
+        if not len(self.candidates):
+            return {account_id: [] for account_id, _, _ in accounts}
+        for start in range(0, len(accounts), BLOCK_SIZE):
+            block = accounts[start:start + BLOCK_SIZE]
+            results.update(self._recommend_block(block, count))
+        return results
+
+    def _recommend_block(self, block, count):
+        hobbies = _normalize(self._tf_idf(self._count_matrix(
+            [Counter(tokenize(hobby_text)) for _, hobby_text, _ in block]
+        )))
+        rows, columns = [], []
+        for row, (_, _, attended) in enumerate(block):
+            for event_id in attended:
+                column = self.event_index.get(event_id)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+        attended = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, columns)), shape=(len(block), len(self.event_ids))
+        )
+
+        # Content: hobbies plus the mean of attended events, against every candidate
+        history = _normalize(attended @ self.event_vectors)
+        profiles = _normalize(HOBBY_WEIGHT * hobbies + HISTORY_WEIGHT * history)
+        content = (profiles @ self.candidate_vectors).toarray()
+
+        # Co-attendance: mean similarity of each candidate to the attended events
+        attended_counts = np.asarray(attended.sum(axis=1)).ravel()
+        coattendance = (attended @ self.coattendance).toarray()
+        coattendance /= np.maximum(attended_counts, 1)[:, None]
+
+        scores = CONTENT_WEIGHT * content + COATTENDANCE_WEIGHT * coattendance
+        # Never recommend what the account already attends
+        attended_candidates = attended[:, self.candidates].nonzero()
+        scores[attended_candidates] = -np.inf
+
+        results = {}
+        k = min(count, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for row, (account_id, _, _) in enumerate(block):
+            picked = top[row][np.argsort(-scores[row, top[row]])]
+            results[account_id] = [
+                (int(self.event_ids[self.candidates[column]]), float(scores[row, column]))
+                for column in picked if scores[row, column] > 0
+            ]
+        return results
+
+
+def _normalize(matrix):
+    """Scale each row of a sparse matrix to unit length (empty rows stay empty)."""
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
@@ -0,0 +1,266 @@
+"""
+Benchmark the main views and save the results as JSON.
+
+Seeds a fresh SQLite file with app/scripts/seed.py (or uses --database).
+Each scenario then runs in turn: --concurrency worker processes drive the
+views through the Flask test client. Each process is its own app, like a
+gunicorn worker. The report for each scenario gives throughput, p50, p95
+and p99 latency, SQL statements per request, and errors.
+
+Results are written to instance/benchmarks/<timestamp>-<commit>.json. Pass
+--compare with an earlier file to print the change per scenario.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark --accounts 5000 --events 2000 --concurrency 4
+    python -m app.scripts.benchmark --compare instance/benchmarks/<earlier>.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import Account, Event
+from app.passwords import password_hasher
+from app.scripts.seed import DEFAULT_PASSWORD, seed_database
+
+SEARCH_TERMS = ('python', 'jazz', 'workshop', 'career fair', 'chess', 'robot', 'machine learning', 'hack')
+
+# Scenarios run in this order; login is slow on purpose (password hashing)
+SCENARIOS = ('login', 'home', 'search', 'event_details', 'signup_decline', 'create_event')
+
+RESULTS_DIR = os.path.join('instance', 'benchmarks')
+
+# The search scenario sends bursts from one client; with rate limits on it would mostly time 429s
+APP_OVERRIDES = {'RATELIMIT_ENABLED': False}
+
+
+class Workload:
+    """One worker process's app, logged-in clients and SQL statement counter."""
+
+    def __init__(self, database, seed_info):
+        self.app = create_app({**APP_OVERRIDES, 'SQLALCHEMY_DATABASE_URI': database})
+        self.app.config['TESTING'] = True
+        self.info = seed_info
+        self.statements = 0
+        with self.app.app_context():
+            engines = [db.engine, self.app.extensions.get('read_engine')]
+        for engine in filter(None, engines):
+            event.listen(engine, 'before_cursor_execute', self._count)
+        self.member = self._login(random.choice(self.info['members']))
+        self.organizer = self._login(random.choice(self.info['organizers']))
+
+    def _count(self, *args):
+        self.statements += 1
+
+    def _login(self, username):
+        client = self.app.test_client()
+        response = client.post('/', data={'username': username, 'password': DEFAULT_PASSWORD, 'action': 'login'})
+        assert response.status_code == 302, f'login as {username} failed'
+        return client
+
+    def popular_event(self):
+        # Zipf-ish: most requests go to the first few (seed-ranked) events
+        ids = self.info['events']
+        return ids[min(len(ids) - 1, int(random.paretovariate(1.2)) - 1)]
+
+    # Each step returns True when the response was the expected one
+
+    def login(self):
+        client = self.app.test_client()
+        response = client.post('/', data={
+            'username': random.choice(self.info['members']), 'password': DEFAULT_PASSWORD, 'action': 'login',
+        })
+        return response.status_code == 302 and response.location.endswith('/home')
+
+    def home(self):
+        return self.member.get('/home').status_code == 200
+
+    def search(self):
+        return self.member.get('/search', query_string={'query': random.choice(SEARCH_TERMS)}).status_code == 200
+
+    def event_details(self):
+        return self.member.get(f'/event/{self.popular_event()}').status_code == 200
+
+    def signup_decline(self):
+        event_id = self.popular_event()
+        signed_up = self.member.get(f'/signup/{event_id}').status_code == 302
+        declined = self.member.get(f'/decline/{event_id}').status_code == 302
+        return signed_up and declined
+
+    def create_event(self):
+        response = self.organizer.post('/create_event', data={
+            'event_name': 'Benchmark Meetup', 'event_type': 'Meetup', 'desc': 'Created by the benchmark',
+            'date': '2031-03-01', 'time': '18:00', 'location': 'Online', 'tags': 'Tech,Networking',
+        })
+        with self.organizer.session_transaction() as session:
+            flashes = session.pop('_flashes', [])
+        return response.status_code == 302 and not any(category == 'danger' for category, _ in flashes)
+
+
+def worker(database, seed_info, scenario, requests, results):
+    random.seed()
+    workload = Workload(database, seed_info)
+    step = getattr(workload, scenario)
+    latencies, statements, errors = [], [], 0
+    loop_started = time.perf_counter()
+    try:
+        for _ in range(requests):
+            before = workload.statements
+            started = time.perf_counter()
+            try:
+                ok = step()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            statements.append(workload.statements - before)
+            errors += not ok
+    finally:
+        # Stop the hashing pool's workers now; otherwise this process waits on them at exit
+        password_hasher.shutdown(wait=True)
+    results.put((latencies, statements, errors, time.perf_counter() - loop_started))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def run_scenario(database, seed_info, scenario, concurrency, requests):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(database, seed_info, scenario, requests, results))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    latencies, statements, errors, throughput = [], [], 0, 0
+    for _ in processes:
+        worker_latencies, worker_statements, worker_errors, worker_seconds = results.get()
+        latencies += worker_latencies
+        statements += worker_statements
+        errors += worker_errors
+        throughput += len(worker_latencies) / worker_seconds if worker_seconds else 0
+    for process in processes:
+        process.join()
+    # Wall time includes app start-up in each worker; per-request latency does not
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        'requests': total,
+        'errors': errors,
+        'throughput': throughput,
+        'wall_seconds': elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries_per_request': sum(statements) / total if total else 0,
+        'max_queries': max(statements, default=0),
+    }
+
+
+def seed_info_for(database):
+    app = create_app({**APP_OVERRIDES, 'SQLALCHEMY_DATABASE_URI': database})
+    with app.app_context():
+        organizers = [name for name, in db.session.query(Account.username).filter(Account.is_organizer.is_(True))]
+        members = [name for name, in db.session.query(Account.username).filter(Account.is_organizer.isnot(True))]
+        # Rank events by attendance, so "popular" in the workload matches the seeded Zipf order
+        events = [event_id for event_id, in db.session.query(Event.id).order_by(Event.attendee_count.desc())]
+    return {'organizers': organizers[:200], 'members': members[:2000], 'events': events}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_results(results, baseline=None):
+    print(f'{"scenario":>15} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"errors":>7}')
+    for scenario, result in results.items():
+        line = (f'{scenario:>15} {result["throughput"]:8.1f} {result["p50_ms"]:8.1f} {result["p95_ms"]:8.1f} '
+                f'{result["p99_ms"]:8.1f} {result["queries_per_request"]:8.1f} {result["errors"]:7d}')
+        previous = (baseline or {}).get(scenario)
+        if previous and previous['throughput']:
+            change = (result['throughput'] - previous['throughput']) / previous['throughput'] * 100
+            line += f'   {change:+6.1f}% req/s, p95 {previous["p95_ms"]:.1f} -> {result["p95_ms"]:.1f} ms'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLAlchemy URI of an already seeded database (seed password)')
+    parser.add_argument('--accounts', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='requests per worker per scenario')
+    parser.add_argument('--login-requests', type=int, default=10, help='requests per worker for login')
+    parser.add_argument('--scenario', choices=SCENARIOS, action='append', help='repeatable; default: all')
+    parser.add_argument('--output', help=f'result file (default: {RESULTS_DIR}/<timestamp>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    args = parser.parse_args()
+
+    workdir = None
+    database = args.database
+    if database is None:
+        workdir = tempfile.mkdtemp()
+        database = f'sqlite:///{os.path.join(workdir, "benchmark.db")}'
+        app = create_app({**APP_OVERRIDES, 'SQLALCHEMY_DATABASE_URI': database})
+        with app.app_context():
+            db.create_all()
+            seed_database(args.accounts, args.events)
+
+    try:
+        seed_info = seed_info_for(database)
+        results = {}
+        for scenario in args.scenario or SCENARIOS:
+            requests = args.login_requests if scenario == 'login' else args.requests
+            results[scenario] = run_scenario(database, seed_info, scenario, args.concurrency, requests)
+            print(f'  {scenario}: {results[scenario]["requests"]} requests', flush=True)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    commit = git_commit()
+    output = args.output or os.path.join(
+        RESULTS_DIR, f'{datetime.now().strftime("%Y%m%d-%H%M%S")}-{commit}.json'
+    )
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'settings': {
+                'database': args.database or 'seeded sqlite',
+                'accounts': args.accounts if args.database is None else None,
+                'events': args.events if args.database is None else None,
+                'concurrency': args.concurrency,
+                'requests': args.requests,
+                'login_requests': args.login_requests,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f'Saved {output}')
+
+
+if __name__ == '__main__':
+    main()
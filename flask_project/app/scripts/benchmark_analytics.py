@@ -0,0 +1,128 @@
+"""
+Show that the organizer dashboard stays flat as the attendance log grows.
+
+Seeds a fresh SQLite file with accounts and events, then grows
+attendance_log in stages (--stages, cumulative row counts) with rows
+spread over the last --days days. After each stage it reports:
+
+- how long compaction takes to fold the new rows into the rollups;
+- dashboard latency (p50/p95) for one organizer, read from the rollups;
+- the same per-day counts computed live from attendance_log, for comparison.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_analytics --stages 10000,100000,1000000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app import analytics, attendance, create_app, db
+from app.models import AttendanceLog, Event
+from app.scripts.seed import seed_database
+
+# Rough mix of log actions
+ACTION_WEIGHTS = {
+    attendance.SIGNED_UP: 60,
+    attendance.WAITLISTED: 10,
+    attendance.PROMOTED: 5,
+    attendance.DECLINED: 20,
+    attendance.LEFT_WAITLIST: 5,
+}
+
+
+def grow_log(rows, account_ids, event_ids, days, batch_size=50000):
+    now = datetime.now()
+    actions, weights = list(ACTION_WEIGHTS), list(ACTION_WEIGHTS.values())
+    while rows > 0:
+        count = min(rows, batch_size)
+        db.session.execute(insert(AttendanceLog), [
+            {
+                'event_id': random.choice(event_ids),
+                'account_id': random.choice(account_ids),
+                'action': action,
+                'created_at': now - timedelta(seconds=random.randrange(days * 86400)),
+            }
+            for action in random.choices(actions, weights, k=count)
+        ])
+        db.session.commit()
+        rows -= count
+
+
+def live_daily(organizer, days):
+    """The dashboard's per-day counts computed straight from the log."""
+    start = datetime.combine(datetime.now().date() - timedelta(days=days - 1), datetime.min.time())
+    day = func.date(AttendanceLog.created_at)
+    return db.session.execute(
+        select(day, AttendanceLog.action, func.count())
+        .join(Event, Event.id == AttendanceLog.event_id)
+        .where(Event.organizer == organizer, AttendanceLog.created_at >= start)
+        .group_by(day, AttendanceLog.action)
+    ).all()
+
+
+def timed(function, samples):
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+        db.session.expunge_all()
+    timings.sort()
+    return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', default='10000,100000,1000000', help='cumulative log sizes')
+    parser.add_argument('--accounts', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=365, help='history the log rows are spread over')
+    parser.add_argument('--window', type=int, default=30, help='days shown on the dashboard')
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "analytics.db")}',
+            'JOB_WORKER_ENABLED': False,
+        })
+        with app.app_context():
+            db.create_all()
+            event_ids = seed_database(args.accounts, args.events, attendance=0, log=lambda message: None)
+            account_ids = list(range(1, args.accounts + 1))
+            organizer = db.session.scalar(
+                select(Event.organizer).group_by(Event.organizer).order_by(func.count().desc()).limit(1)
+            )
+            organizer_events = db.session.scalar(select(func.count()).where(Event.organizer == organizer))
+            print(f'{args.events} events; dashboard for {organizer} ({organizer_events} events), '
+                  f'{args.window}-day window')
+            print(f'{"log rows":>10} {"compact s":>10} {"rows/s":>9} {"dashboard p50":>14} {"p95":>7} '
+                  f'{"live p50":>9} {"p95":>7}')
+
+            logged = 0
+            for stage in (int(size) for size in args.stages.split(',')):
+                grow_log(stage - logged, account_ids, event_ids, args.days)
+                new_rows, logged = stage - logged, stage
+
+                started = time.perf_counter()
+                analytics.compact_all()
+                compact_seconds = time.perf_counter() - started
+
+                dashboard = timed(lambda: analytics.dashboard(organizer, args.window), args.samples)
+                live = timed(lambda: live_daily(organizer, args.window), max(3, args.samples // 10))
+                print(f'{logged:10} {compact_seconds:10.2f} {new_rows / compact_seconds:9.0f} '
+                      f'{dashboard[0]:11.2f} ms {dashboard[1]:7.2f} {live[0]:6.1f} ms {live[1]:7.1f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
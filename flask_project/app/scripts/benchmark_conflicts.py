@@ -0,0 +1,176 @@
+"""
+Check and time schedule-conflict detection against straightforward queries.
+
+Seeds a fresh SQLite file (events spread over --days days, ten locations),
+builds the conflict index and compares, for --samples random cases:
+
+- signup: events an account attends that overlap another event; the index
+  against a range query on the account's events;
+- booking: an organizer's events and events at a location overlapping a new
+  start time; the index against range queries;
+- report: --organizers organizers' conflicts, each in one sweep, against
+  comparing all pairs of the organizer's and same-location events.
+
+It then signs an account up for an event through app/attendance.py and
+checks the index sees it without a rebuild. Exits non-zero on any mismatch.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_conflicts --events 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import combinations
+
+from sqlalchemy import func, select
+
+from app import attendance, create_app, db
+from app.conflicts import LOCATION, ORGANIZER, conflict_index
+from app.geo import location_key
+from app.models import Event, EventAttendance
+from app.scripts.seed import seed_database
+
+
+def sql_signup(account_id, event, duration):
+    return {row.id for row in db.session.execute(
+        select(Event.id)
+        .join(EventAttendance, EventAttendance.event_id == Event.id)
+        .where(EventAttendance.account_id == account_id, Event.id != event.id,
+               Event.starts_at > event.starts_at - duration, Event.starts_at < event.starts_at + duration)
+    )}
+
+
+def sql_booking(organizer, location, starts_at, duration):
+    window = (Event.starts_at > starts_at - duration, Event.starts_at < starts_at + duration)
+    own = set(db.session.scalars(select(Event.id).where(Event.organizer == organizer, *window)))
+    shared = set(db.session.scalars(
+        select(Event.id).where(func.lower(Event.location) == location_key(location), *window)
+    )) - own
+    return {ORGANIZER: own, LOCATION: shared}
+
+
+def pairwise_report(organizer, events, duration):
+    """The report by comparing every pair of the organizer's and same-location events."""
+    own = [event for event in events if event.organizer == organizer]
+    keys = {location_key(event.location) for event in own}
+    relevant = [event for event in events if event.organizer == organizer or location_key(event.location) in keys]
+    pairs = set()
+    for a, b in combinations(relevant, 2):
+        if a.starts_at < b.starts_at + duration and b.starts_at < a.starts_at + duration:
+            if a.organizer == organizer and b.organizer == organizer:
+                pairs.add((ORGANIZER, frozenset((a.id, b.id))))
+            elif location_key(a.location) == location_key(b.location) and organizer in (a.organizer, b.organizer):
+                pairs.add((LOCATION, frozenset((a.id, b.id))))
+    return pairs
+
+
+def timed(function, cases):
+    results, timings = [], []
+    for case in cases:
+        started = time.perf_counter()
+        results.append(function(*case))
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return results, timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--samples', type=int, default=300)
+    parser.add_argument('--organizers', type=int, default=2, help='organizers whose report is compared pairwise')
+    args = parser.parse_args()
+
+    failures = []
+    workdir = tempfile.mkdtemp()
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "conflicts.db")}',
+            'JOB_WORKER_ENABLED': False,
+        })
+        with app.app_context():
+            db.create_all()
+            seed_database(args.accounts, args.events, days=args.days, log=lambda message: None)
+            duration = timedelta(seconds=app.config['CALENDAR_EVENT_DURATION'])
+
+            started = time.perf_counter()
+            conflict_index.build()
+            print(f'{args.events} events, {args.accounts} accounts: index built in {time.perf_counter() - started:.2f}s')
+
+            now = datetime.now()
+            upcoming = db.session.execute(
+                select(Event.id, Event.starts_at, Event.organizer, Event.location).where(Event.starts_at >= now)
+            ).all()
+            account_ids = list(db.session.scalars(select(EventAttendance.account_id).distinct()))
+            print(f'{"check":>8} {"index p50":>12} {"query p50":>12}  (report: index sweep vs all pairs, mean)')
+
+            cases = [(random.choice(account_ids), random.choice(upcoming)) for _ in range(args.samples)]
+            index, index_ms = timed(lambda account_id, event: {row.id for row in conflict_index.signup_conflicts(
+                account_id, event.id)}, cases)
+            query, query_ms = timed(lambda account_id, event: sql_signup(account_id, event, duration), cases)
+            print(f'{"signup":>8} {index_ms:9.3f} ms {query_ms:9.3f} ms  ({sum(map(bool, index))} with conflicts)')
+            if index != query:
+                failures.append('signup conflicts differ from the range query')
+
+            cases = [(event.organizer, event.location, event.starts_at + timedelta(minutes=random.choice((-30, 0, 30))))
+                     for event in random.sample(upcoming, min(args.samples, len(upcoming)))]
+            index, index_ms = timed(lambda *case: {kind: {row.id for row in rows} for kind, rows in
+                                                   conflict_index.booking_conflicts(*case).items()}, cases)
+            query, query_ms = timed(lambda *case: sql_booking(*case, duration), cases)
+            print(f'{"booking":>8} {index_ms:9.3f} ms {query_ms:9.3f} ms')
+            if index != query:
+                failures.append('booking conflicts differ from the range queries')
+
+            organizers = random.sample(sorted({event.organizer for event in upcoming}), args.organizers)
+            started = time.perf_counter()
+            sweep = {organizer: conflict_index.report(organizer) for organizer in organizers}
+            sweep_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            pairwise = {organizer: pairwise_report(organizer, upcoming, duration) for organizer in organizers}
+            pairwise_seconds = time.perf_counter() - started
+            print(f'{"report":>8} {sweep_seconds / len(organizers) * 1000:9.1f} ms '
+                  f'{pairwise_seconds / len(organizers) * 1000:9.1f} ms  (all pairs; '
+                  f'{sum(map(len, sweep.values())) / len(organizers):.0f} conflicts per organizer)')
+            for organizer in organizers:
+                found = {(row['kind'], frozenset((row['first']['id'], row['second']['id']))) for row in sweep[organizer]}
+                if found != pairwise[organizer]:
+                    failures.append(f'report for {organizer} differs from the pairwise comparison')
+                    break
+
+            # A signup written after the build is picked up from attendance_log
+            account_id, (first, second) = random.choice(account_ids), random.sample(upcoming, 2)
+            db.session.execute(
+                EventAttendance.__table__.delete().where(EventAttendance.account_id == account_id,
+                                                         EventAttendance.event_id.in_((first.id, second.id)))
+            )
+            db.session.commit()
+            db.session.execute(Event.__table__.update().where(Event.id == second.id)
+                               .values(starts_at=first.starts_at + duration / 2, capacity=None))
+            db.session.commit()
+            conflict_index.build()
+            attendance.sign_up(first.id, account_id)
+            if first.id not in {row.id for row in conflict_index.signup_conflicts(account_id, second.id)}:
+                failures.append('a new signup was not picked up incrementally')
+            attendance.decline(first.id, account_id)
+            if first.id in {row.id for row in conflict_index.signup_conflicts(account_id, second.id)}:
+                failures.append('a decline was not picked up incrementally')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures:
+        print(f'FAILED: {failure}', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print('index, range queries and pairwise report agree')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark the .ics calendar feeds on feeds with thousands of events.
+
+Seeds a fresh SQLite file with one organizer who runs --events events and
+one member who attends all of them. For each feed it reports:
+
+- full downloads per second and the feed size;
+- time to the first chunk;
+- the Python heap peak while streaming, next to building the whole
+  document with ''.join (the "in memory" column);
+- 304 answers per second for a client that sends the current ETag.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_feeds --events 5000 --requests 20
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import insert, select
+
+from app import bulk, create_app, db, ics
+from app.models import Account, Event, EventAttendance
+from app.scripts.seed import event_rows
+
+
+def seed(events):
+    organizer = Account(username='seed0', password='-', first_name='Feed', is_organizer=True)
+    member = Account(username='feedmember', password='-', first_name='Feed')
+    db.session.add_all([organizer, member])
+    db.session.commit()
+    bulk.import_rows(enumerate(event_rows(events, organizers=1, prefix='seed', days=365), start=1))
+    event_ids = db.session.scalars(select(Event.id)).all()
+    db.session.execute(insert(EventAttendance), [
+        {'account_id': member.id, 'event_id': event_id} for event_id in event_ids
+    ])
+    db.session.commit()
+    return {
+        ics.ATTENDING: ics.feed_token(ics.ATTENDING, member.id),
+        ics.ORGANIZING: ics.feed_token(ics.ORGANIZING, organizer.username),
+    }
+
+
+def download(client, url, in_memory=False):
+    """Fetch the feed; returns (bytes, seconds to first chunk, heap peak in bytes)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    chunks = response.iter_encoded()
+    first = next(chunks)
+    first_chunk = time.perf_counter() - started
+    if in_memory:
+        size = len(first + b''.join(chunks))
+    else:
+        size = len(first) + sum(len(chunk) for chunk in chunks)
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, first_chunk, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=20, help='full downloads per feed')
+    parser.add_argument('--conditional-requests', type=int, default=500, help='304 requests per feed')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "feeds.db")}',
+            'JOB_WORKER_ENABLED': False,
+        })
+        with app.test_request_context():
+            db.create_all()
+            started = time.perf_counter()
+            tokens = seed(args.events)
+            print(f'seeded {args.events} events in {time.perf_counter() - started:.2f}s')
+
+        client = app.test_client()
+        print(f'{"feed":>10} {"KiB":>8} {"feeds/s":>8} {"ms/feed":>8} {"first ms":>9} '
+              f'{"peak KiB":>9} {"in memory":>10} {"304/s":>8}')
+        for kind, endpoint in ((ics.ATTENDING, 'attending'), (ics.ORGANIZING, 'organizing')):
+            url = f'/calendar/{endpoint}/{tokens[kind]}.ics'
+            size, first_chunk, peak = download(client, url)
+            _, _, joined_peak = download(client, url, in_memory=True)
+
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                response = client.get(url, buffered=True)
+                assert response.status_code == 200
+            full_seconds = (time.perf_counter() - started) / args.requests
+
+            etag = response.headers['ETag']
+            started = time.perf_counter()
+            for _ in range(args.conditional_requests):
+                assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+            conditional_rate = args.conditional_requests / (time.perf_counter() - started)
+
+            print(f'{kind:>10} {size / 1024:8.0f} {1 / full_seconds:8.1f} {full_seconds * 1000:8.1f} '
+                  f'{first_chunk * 1000:9.1f} {peak / 1024:9.0f} {joined_peak / 1024:10.0f} {conditional_rate:8.0f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Check and time nearby-event search against scanning every event.
+
+Seeds a fresh SQLite file, adds --venues made-up venues scattered over about
+--spread-km around downtown Pittsburgh, moves the events to random venues
+and geocodes them with `geo.backfill`. Then, for --samples random points:
+
+- radius: `geo.nearby` (grid cells, then exact distances) against computing
+  the distance to every located event;
+- box: `geo.in_box` against the same coordinate filter without the grid
+  cells, which reads the whole table.
+
+Reports median times and how many candidate events the grid read. Exits
+non-zero when any result differs.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_geo --events 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import bindparam, select, update
+
+from app import create_app, db, geo
+from app.models import Event
+from app.pagination import MAX_PAGE_SIZE
+from app.scripts.seed import seed_database
+
+CENTER = (40.4406, -79.9959)
+
+
+def scan_nearby(located, latitude, longitude, radius_km, limit):
+    found = [(geo.distance_km(latitude, longitude, event_latitude, event_longitude), starts_at is not None,
+              starts_at or 0, event_id) for event_id, event_latitude, event_longitude, starts_at in located]
+    found = sorted(row for row in found if row[0] <= radius_km)[:limit]
+    return [(event_id, km) for km, _, _, event_id in found]
+
+
+def scan_box(south, west, north, east):
+    return set(db.session.scalars(
+        select(Event.id).where(Event.latitude.between(south, north), Event.longitude.between(west, east))
+    ))
+
+
+def timed(function, cases):
+    results, timings = [], []
+    for case in cases:
+        started = time.perf_counter()
+        results.append(function(*case))
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return results, timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=200)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--spread-km', type=float, default=30.0)
+    parser.add_argument('--radius-km', type=float, default=2.0)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    failures = []
+    workdir = tempfile.mkdtemp()
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "geo.db")}',
+            'JOB_WORKER_ENABLED': False,
+        })
+        with app.app_context():
+            db.create_all()
+            seed_database(args.accounts, args.events, log=lambda message: None)
+
+            span = args.spread_km / geo.KM_PER_DEGREE
+            venues = [(f'Venue {number}', CENTER[0] + random.uniform(-span, span),
+                       CENTER[1] + random.uniform(-span, span) * 1.3) for number in range(args.venues)]
+            geo.import_venues(venues)
+            event_ids = list(db.session.scalars(select(Event.id)))
+            table = Event.__table__
+            db.session.execute(
+                update(table).where(table.c.id == bindparam('event_id')).values(location=bindparam('new_location')),
+                [{'event_id': event_id, 'new_location': random.choice(venues)[0]} for event_id in event_ids
+                 if random.random() < 0.9],
+            )
+            db.session.commit()
+            started = time.perf_counter()
+            located_count = geo.backfill()
+            print(f'{args.events} events, {args.venues} venues: {located_count} geocoded '
+                  f'in {time.perf_counter() - started:.2f}s')
+            located = db.session.execute(
+                select(Event.id, Event.latitude, Event.longitude, Event.starts_at).where(Event.geo_cell.is_not(None))
+            ).all()
+
+            points = [(CENTER[0] + random.uniform(-span, span), CENTER[1] + random.uniform(-span, span) * 1.3)
+                      for _ in range(args.samples)]
+            print(f'{"query":>7} {"grid p50":>11} {"scan p50":>11}  candidates read (mean)')
+
+            cases = [(latitude, longitude, args.radius_km, MAX_PAGE_SIZE) for latitude, longitude in points]
+            grid, grid_ms = timed(lambda *case: [(event.id, km) for event, km in
+                                                 geo.nearby(Event.query, *case)], cases)
+            scan, scan_ms = timed(lambda *case: scan_nearby(located, *case), cases)
+            read = sum(Event.query.filter(geo.box_clause(*geo.radius_box(*case[:3]))).count()
+                       for case in cases) / len(cases)
+            print(f'{"radius":>7} {grid_ms:8.2f} ms {scan_ms:8.2f} ms  {read:.0f} of {len(located)}')
+            if [[event_id for event_id, _ in found] for found in grid] != \
+                    [[event_id for event_id, _ in found] for found in scan]:
+                failures.append('radius results differ from the full scan')
+
+            boxes = [geo.radius_box(latitude, longitude, args.radius_km) for latitude, longitude in points]
+            grid, grid_ms = timed(lambda *box: {event.id for event in geo.in_box(Event.query, *box, len(located))},
+                                  boxes)
+            scan, scan_ms = timed(lambda *box: scan_box(*box), boxes)
+            read = sum(Event.query.filter(geo.box_clause(*box)).count() for box in boxes) / len(boxes)
+            print(f'{"box":>7} {grid_ms:8.2f} ms {scan_ms:8.2f} ms  {read:.0f} of {len(located)}')
+            if grid != scan:
+                failures.append('box results differ from the full scan')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for failure in failures:
+        print(f'FAILED: {failure}', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print('grid index and full scan agree')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare event loading paths in rows/sec.
+
+  per-commit  one ORM object and one commit per event, like a create_event POST
+  per-object  ORM objects added one by one and committed once, like setup_db.py
+  bulk        app.bulk.import_events: validated rows, batched Core inserts
+
+Each path runs against a fresh SQLite file with the same generated rows. The
+export of the bulk-loaded table is timed as well.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_import --rows 20000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from app import bulk, create_app, db
+from app.models import Event
+
+TAGS = ('Python', 'Workshop', 'Career', 'Music', 'Sports', 'Hackathon', 'Research', 'Food')
+
+
+def generate_rows(count):
+    for i in range(count):
+        yield {
+            'event_name': f'Benchmark event {i}',
+            'event_type': random.choice(('Talk', 'Workshop', 'Social')),
+            'organizer': f'org{i % 50}',
+            'date': f'2030-{1 + i % 12:02d}-{1 + i % 28:02d}',
+            'time': f'{8 + i % 12}:00',
+            'location': 'Pittsburgh',
+            'desc': 'Generated by benchmark_import',
+            'tags': ','.join(random.sample(TAGS, 3)),
+            'capacity': random.choice((None, 50, 200)),
+        }
+
+
+def fresh_app(db_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'PASSWORD_HASH_WORKERS': 0})
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def load_per_commit(rows):
+    for row in rows:
+        db.session.add(Event(**row))
+        db.session.commit()
+
+
+def load_per_object(rows):
+    for row in rows:
+        db.session.add(Event(**row))
+    db.session.commit()
+
+
+def load_bulk(rows, batch_size):
+    stream = io.StringIO(''.join(json.dumps(row) + '\n' for row in rows))
+    report = bulk.import_events(stream, 'jsonl', batch_size=batch_size)
+    assert report.rejected == 0, report.errors
+
+
+def timed(label, rows, load):
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.remove(db_path)
+    try:
+        app = fresh_app(db_path)
+        with app.app_context():
+            started = time.perf_counter()
+            load(rows)
+            elapsed = time.perf_counter() - started
+            print(f'{label:>12}: {len(rows):7d} rows  {elapsed:7.2f}s  {len(rows) / elapsed:9.0f} rows/s')
+            if label == 'bulk':
+                started = time.perf_counter()
+                count = bulk.export_events(io.StringIO(), 'csv')
+                elapsed = time.perf_counter() - started
+                print(f'{"export":>12}: {count:7d} rows  {elapsed:7.2f}s  {count / elapsed:9.0f} rows/s')
+            db.session.remove()
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--per-commit-rows', type=int, default=1000,
+                        help='rows for the per-commit path, which is much slower')
+    parser.add_argument('--batch-size', type=int, default=bulk.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    random.seed(1)
+    rows = list(generate_rows(args.rows))
+    timed('per-commit', rows[:args.per_commit_rows], load_per_commit)
+    timed('per-object', rows, load_per_object)
+    timed('bulk', rows, lambda rows: load_bulk(rows, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Measure background job throughput against a fresh SQLite file.
+
+Enqueues --jobs no-op jobs in batches, starts the worker and times how long
+it takes until every one is done. A second run enqueues jobs that fail on
+their first --fail-times attempts, to check that retries with backoff end
+in 'done' and that jobs over their attempt limit end in 'failed'. Exits
+non-zero if any job ends in the wrong state, or if throughput is below
+--min-rate jobs/s.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_jobs --jobs 5000 --workers 4 --production
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import func
+
+import config
+
+from app import create_app, db
+from app.jobs import DONE, FAILED, job_queue
+from app.models import Job
+
+_attempts = Counter()
+_attempts_lock = threading.Lock()
+
+
+@job_queue.task('benchmark_noop')
+def noop(n):
+    pass
+
+
+@job_queue.task('benchmark_flaky')
+def flaky(n, fail_times):
+    with _attempts_lock:
+        _attempts[n] += 1
+        attempt = _attempts[n]
+    if attempt <= fail_times:
+        raise RuntimeError(f'attempt {attempt} of job {n} fails on purpose')
+
+
+def enqueue(name, payloads, batch_size, **options):
+    for start in range(0, len(payloads), batch_size):
+        for payload in payloads[start:start + batch_size]:
+            job_queue.enqueue(name, payload, **options)
+        db.session.commit()
+
+
+def wait_for(app, total, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            finished = db.session.scalar(
+                db.select(func.count()).select_from(Job).where(Job.status.in_((DONE, FAILED)))
+            )
+            db.session.remove()
+        if finished >= total:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=500, help='jobs enqueued per commit')
+    parser.add_argument('--flaky', type=int, default=50, help='jobs in the retry run')
+    parser.add_argument('--fail-times', type=int, default=2, help='failing attempts per flaky job')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--production', action='store_true',
+                        help="use ProductionConfig's SQLite PRAGMAs (WAL, synchronous=NORMAL)")
+    parser.add_argument('--min-rate', type=float, default=0, help='fail if jobs/s is below this')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "jobs.db")}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30, 'check_same_thread': False}},
+            'JOB_WORKER_ENABLED': False,
+            'JOB_WORKERS': args.workers,
+            'JOB_BACKOFF_BASE': 0.05,
+            'NOTIFICATION_OUTBOX': os.path.join(workdir, 'outbox.jsonl'),
+            'SQLITE_PRAGMAS': config.ProductionConfig.SQLITE_PRAGMAS if args.production else {},
+        })
+        with app.app_context():
+            db.create_all()
+
+            started = time.perf_counter()
+            enqueue('benchmark_noop', [{'n': n} for n in range(args.jobs)], args.batch_size)
+            enqueue_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        job_queue.start(app)
+        finished = wait_for(app, args.jobs, args.timeout)
+        run_seconds = time.perf_counter() - started
+        rate = args.jobs / run_seconds
+        print(f'enqueued {args.jobs} jobs in {enqueue_seconds:.2f}s ({args.jobs / enqueue_seconds:.0f}/s)')
+        print(f'ran {args.jobs} jobs on {args.workers} threads in {run_seconds:.2f}s ({rate:.0f} jobs/s)')
+
+        # Retries: half the flaky jobs succeed on their last attempt, half run out of attempts.
+        # Their failures are expected, so the queue's log lines are muted.
+        app.logger.setLevel(logging.CRITICAL)
+        with app.app_context():
+            payloads = [{'n': n, 'fail_times': args.fail_times} for n in range(args.flaky)]
+            enqueue('benchmark_flaky', payloads[:args.flaky // 2], args.batch_size, max_attempts=args.fail_times + 1)
+            enqueue('benchmark_flaky', payloads[args.flaky // 2:], args.batch_size, max_attempts=args.fail_times)
+        started = time.perf_counter()
+        finished = wait_for(app, args.jobs + args.flaky, args.timeout) and finished
+        print(f'ran {args.flaky} flaky jobs with retries in {time.perf_counter() - started:.2f}s')
+        job_queue.stop(wait=True)
+
+        with app.app_context():
+            counts = Counter({
+                (name, status): count for name, status, count in
+                db.session.query(Job.name, Job.status, func.count()).group_by(Job.name, Job.status)
+            })
+        for (name, status), count in sorted(counts.items()):
+            print(f'  {name:>16} {status:>8} {count}')
+
+        expected = {
+            ('benchmark_noop', DONE): args.jobs,
+            ('benchmark_flaky', DONE): args.flaky // 2,
+            ('benchmark_flaky', FAILED): args.flaky - args.flaky // 2,
+        }
+        ok = finished and all(counts[key] == count for key, count in expected.items())
+        if not ok:
+            print('FAILED: jobs did not finish in the expected states', file=sys.stderr)
+        if rate < args.min_rate:
+            print(f'FAILED: {rate:.0f} jobs/s is below --min-rate {args.min_rate:.0f}', file=sys.stderr)
+            ok = False
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Time the recommendation rebuild, single-account refresh and home page read.
+
+Seeds a fresh SQLite file with app/scripts/seed.py (or uses --database),
+then reports:
+
+- the full rebuild (model build plus every account's top list);
+- the refresh one signup triggers, against the cached model (p50/p95);
+- the query the home page runs to read the stored list (p50/p95).
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_recommendations --accounts 20000 --events 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import func, select
+
+from app import create_app, db, recommendations
+from app.models import Account, Recommendation
+from app.scripts.seed import seed_database
+from app.views import _recommended_events
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='SQLAlchemy URI of an already seeded database')
+    parser.add_argument('--accounts', type=int, default=20000)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--samples', type=int, default=200, help='accounts timed for refresh and reads')
+    args = parser.parse_args()
+
+    workdir = None
+    database = args.database
+    if database is None:
+        workdir = tempfile.mkdtemp()
+        database = f'sqlite:///{os.path.join(workdir, "recommendations.db")}'
+    try:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': database, 'JOB_WORKER_ENABLED': False})
+        with app.app_context():
+            if workdir:
+                db.create_all()
+                seed_database(args.accounts, args.events)
+
+            started = time.perf_counter()
+            accounts = recommendations.rebuild(log=print)
+            rows = db.session.scalar(select(func.count()).select_from(Recommendation))
+            print(f'rebuild: {accounts} accounts, {rows} rows stored in {time.perf_counter() - started:.2f}s')
+
+            account_ids = db.session.scalars(select(Account.id)).all()
+            sample = random.sample(account_ids, min(args.samples, len(account_ids)))
+            timings = []
+            for account_id in sample:
+                started = time.perf_counter()
+                recommendations.refresh([account_id])
+                db.session.commit()
+                timings.append(time.perf_counter() - started)
+            print('refresh one account: p50 %.1f ms, p95 %.1f ms' % percentiles(timings))
+
+            timings = []
+            for account_id in sample:
+                started = time.perf_counter()
+                _recommended_events(account_id)
+                timings.append(time.perf_counter() - started)
+                db.session.expunge_all()
+            print('home page read: p50 %.2f ms, p95 %.2f ms' % percentiles(timings))
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure worker cold start: import time and time to the first response.
+
+Each run is a fresh Python process, as a newly started worker would be. It
+imports the app package, calls create_app() and serves --path once, then
+once more. Modes:
+
+- eager: every extension and CLI command set up, templates compiled from source;
+- optimized, cold cache: STARTUP_OPTIMIZED with an empty JINJA_BYTECODE_CACHE_DIR;
+- optimized, precompiled: the same after `flask templates precompile`.
+
+Medians over --runs processes, in milliseconds, plus which heavy modules
+each mode ended up importing.
+
+Run from the project root:
+
+    python -m app.scripts.benchmark_startup --runs 7
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from app import create_app, db, templating
+
+# Runs in each child process; prints one JSON line of timings
+WORKER = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+instance = app.create_app(json.loads(sys.argv[1]))
+created = time.perf_counter()
+client = instance.test_client()
+status = client.get(sys.argv[2]).status_code
+first = time.perf_counter()
+client.get(sys.argv[2])
+second = time.perf_counter()
+print(json.dumps({
+    'import': imported - started, 'create_app': created - imported,
+    'first': first - created, 'second': second - first, 'total': first - started, 'status': status,
+    'loaded': [name for name in ('alembic', 'numpy', 'scipy') if name in sys.modules],
+}))
+'''
+
+COLUMNS = ('import', 'create_app', 'first', 'second', 'total')
+
+
+def run_worker(overrides, path):
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER, json.dumps(overrides), path],
+        check=True, capture_output=True, text=True, env={**os.environ, 'APP_CONFIG': 'config.Config'},
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def measure(overrides, path, runs, before_each=None):
+    samples = []
+    for _ in range(runs):
+        if before_each:
+            before_each()
+        samples.append(run_worker(overrides, path))
+    medians = {column: sorted(sample[column] for sample in samples)[runs // 2] * 1000 for column in COLUMNS}
+    return medians, samples[-1]['status'], samples[-1]['loaded']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7, help='worker processes per mode')
+    parser.add_argument('--path', default='/', help='page requested first')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        cache_dir = os.path.join(workdir, 'jinja_cache')
+        base = {
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "startup.db")}',
+            'JOB_WORKER_ENABLED': False,
+        }
+        optimized = {**base, 'STARTUP_OPTIMIZED': True, 'JINJA_BYTECODE_CACHE': True,
+                     'JINJA_BYTECODE_CACHE_DIR': cache_dir}
+        app = create_app(optimized)
+        with app.app_context():
+            db.create_all()
+
+        def empty_cache():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        modes = (
+            ('eager', lambda: measure(base, args.path, args.runs)),
+            ('optimized, cold cache', lambda: measure(optimized, args.path, args.runs, before_each=empty_cache)),
+            ('optimized, precompiled', lambda: measure(optimized, args.path, args.runs,
+                                                       before_each=lambda: templating.precompile(app))),
+        )
+        print(f'GET {args.path}, median of {args.runs} fresh processes (ms)')
+        print(f'{"mode":>23} ' + ' '.join(f'{column:>10}' for column in COLUMNS) + '  status  imported')
+        for name, run in modes:
+            medians, status, loaded = run()
+            print(f'{name:>23} ' + ' '.join(f'{medians[column]:10.1f}' for column in COLUMNS)
+                  + f'  {status:6}  {", ".join(loaded) or "-"}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
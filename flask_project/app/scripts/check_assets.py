@@ -0,0 +1,180 @@
+"""
+Check the static asset build and how the built files are served.
+
+Builds the bundles into a temporary directory. The vendored files are used
+when `flask assets vendor` has fetched them; otherwise small stand-ins with
+the same paths (including Font Awesome's ../webfonts url()s) take their place.
+It then checks that:
+
+- every bundle and referenced font exists under its content-hashed name,
+  and the stylesheet url()s point at the hashed fonts;
+- /assets/ answers br, gzip and identity requests with the matching
+  precompressed file, Content-Encoding, Vary and an immutable Cache-Control,
+  and each body decodes to the same bytes;
+- rendered pages link the built bundles and contain no CDN URLs or inline
+  search script;
+- a rebuild after a source change renames only that bundle, keeps serving
+  the previous build and deletes the one before it.
+
+It prints the bundle sizes and how long on-the-fly gzip would take per
+request. Run from the project root:
+
+    python -m app.scripts.check_assets
+
+Exits with status 1 if any check fails.
+"""
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert
+
+from app import assets, create_app, db
+from app.models import Account
+
+# Stand-ins for vendor files that have not been downloaded
+STAND_INS = {
+    'font-awesome/css/all.min.css': b'/*! stand-in */ .fa-solid{font-family:"Font Awesome 6 Free"}'
+           b'@font-face{src:url(../webfonts/fa-solid-900.woff2) format("woff2"),'
+           b'url("../webfonts/fa-solid-900.ttf?v=6") format("truetype")}'
+           b'.icon{background:url("data:image/svg+xml,%3csvg xmlns=\'http://www.w3.org/2000/svg\'/%3e")}\n'
+           b'/*# sourceMappingURL=all.min.css.map */\n',
+    'css': b'@import url(https://fonts.example/css?family=Stand+In);/*! stand-in */ .btn{color:#fff}\n',
+    'js': b'/*! stand-in */ window.vendorLoaded = (window.vendorLoaded || 0) + 1\n//# sourceMappingURL=x.min.js.map\n',
+    'woff2': os.urandom(2048),
+    'ttf': b'\0\1\0\0' + b'glyf' * 4096,
+}
+
+
+def source_tree(workdir):
+    """A copy of app/static with stand-ins for missing vendor files; returns (path, stand-in count)."""
+    root = os.path.join(workdir, 'static')
+    shutil.copytree(os.path.join(os.path.dirname(assets.__file__), 'static'), root, ignore=shutil.ignore_patterns('dist'))
+    missing = 0
+    for path, _, _ in assets.VENDOR:
+        target = os.path.join(root, 'vendor', path)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as handle:
+                handle.write(STAND_INS.get(path) or STAND_INS[path.rsplit('.', 1)[1]])
+            missing += 1
+    return root, missing
+
+
+def decode(response):
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        return gzip.decompress(response.data)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(response.data)
+    return response.data
+
+
+def main():
+    problems = []
+    workdir = tempfile.mkdtemp()
+    try:
+        source_dir, stand_ins = source_tree(workdir)
+        dist = os.path.join(workdir, 'dist')
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(workdir, "assets.db")}',
+            'JOB_WORKER_ENABLED': False,
+            'ASSETS_SOURCE_DIR': source_dir,
+            'ASSETS_DIR': dist,
+        })
+        with app.app_context():
+            db.create_all()
+            db.session.execute(insert(Account), [{'username': 'assets', 'password': '!'}])
+            db.session.commit()
+        if stand_ins:
+            print(f'{stand_ins} of {len(assets.VENDOR)} vendor files not downloaded; using stand-ins')
+
+        started = time.perf_counter()
+        manifest = assets.build(app)
+        print(f'Built {len(manifest["build"])} files in {time.perf_counter() - started:.2f}s')
+        if 'br' not in {encoding for encodings in manifest['files'].values() for encoding in encodings}:
+            print('  (brotli is not installed: no .br files)')
+
+        # Names, fonts and url() rewriting
+        for name, built in manifest['bundles'].items():
+            if not os.path.exists(os.path.join(dist, built)) or built == name:
+                problems.append(f'{name}: built file {built} missing or not fingerprinted')
+        with open(os.path.join(dist, manifest['bundles']['vendor.css']), encoding='utf-8') as handle:
+            vendor_css = handle.read()
+        fonts = [name for name in manifest['build'] if name.startswith('fa-solid-900.')]
+        if len(fonts) != 2 or any(f'url({font})' not in vendor_css for font in fonts):
+            problems.append(f'vendor.css does not point at the hashed fonts {fonts}')
+        if '../webfonts' in vendor_css or 'sourceMappingURL' in vendor_css or 'data:image/svg+xml' not in vendor_css:
+            problems.append('vendor.css url()s or source map comments were not rewritten correctly')
+
+        # Serving and content negotiation
+        client = app.test_client()
+        print(f'{"file":>32} {"raw":>8} {"gzip":>8} {"br":>8}')
+        for built, encodings in sorted(manifest['files'].items()):
+            with open(os.path.join(dist, built), 'rb') as handle:
+                original = handle.read()
+            sizes = {}
+            for accept, expected in (('br, gzip', encodings[0] if encodings else None),
+                                     ('gzip', 'gzip' if 'gzip' in encodings else None), ('', None)):
+                response = client.get(f'/assets/{built}', headers={'Accept-Encoding': accept} if accept else {})
+                cache_control = response.headers.get('Cache-Control', '')
+                if (response.status_code != 200 or response.headers.get('Content-Encoding') != expected
+                        or 'immutable' not in cache_control or 'max-age=31536000' not in cache_control
+                        or (encodings and 'Accept-Encoding' not in response.headers.get('Vary', ''))
+                        or decode(response) != original):
+                    problems.append(f'/assets/{built} with Accept-Encoding {accept!r}: {response.status_code} '
+                                    f'{response.headers.get("Content-Encoding")} {cache_control}')
+                sizes[expected] = len(response.data)
+            print(f'{built:>32} {len(original):8} {sizes.get("gzip", "-"):>8} {sizes.get("br", "-"):>8}')
+        if client.get(f'/assets/{assets.MANIFEST}').status_code != 404:
+            problems.append('the manifest is served')
+
+        original = open(os.path.join(dist, manifest['bundles']['site.js']), 'rb').read()
+        started = time.perf_counter()
+        for _ in range(50):
+            gzip.compress(original, compresslevel=6)
+        print(f'  gzip on the fly would cost {(time.perf_counter() - started) / 50 * 1000:.2f} ms '
+              f'per site.js response; precompressed costs nothing')
+
+        # Pages
+        html = client.get('/').get_data(as_text=True)
+        for name, built in manifest['bundles'].items():
+            if name != 'event_live.js' and f'/assets/{built}' not in html:
+                problems.append(f'the login page does not link {built}')
+        if 'cdn' in html or 'googleapis' in html or 'searchEvents' in html:
+            problems.append('the login page still refers to a CDN or inlines the search script')
+        print(f'  login page: {len(html.encode())} bytes of HTML')
+
+        # Rebuilds
+        first = manifest
+        with open(os.path.join(source_dir, 'src', 'css', 'site.css'), 'a') as handle:
+            handle.write('.rebuilt{color:red}\n')
+        second = assets.build(app)
+        changed = {name for name in first['bundles'] if first['bundles'][name] != second['bundles'][name]}
+        if changed != {'site.css'}:
+            problems.append(f'a site.css change renamed {sorted(changed)}')
+        if client.get(f'/assets/{first["bundles"]["site.css"]}').status_code != 200:
+            problems.append('the previous build is no longer served')
+        with open(os.path.join(source_dir, 'src', 'css', 'site.css'), 'a') as handle:
+            handle.write('.rebuilt-again{color:blue}\n')
+        assets.build(app)
+        if os.path.exists(os.path.join(dist, first['bundles']['site.css'])):
+            problems.append('files two builds old were not deleted')
+        print(f'  rebuilds: site.css {first["bundles"]["site.css"]} -> {second["bundles"]["site.css"]}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if problems:
+        print('FAILED')
+        for problem in problems:
+            print(f'  - {problem}')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
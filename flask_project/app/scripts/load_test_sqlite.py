@@ -0,0 +1,161 @@
+"""
+Concurrent read throughput while create_event writes are happening.
+
+Each configuration profile gets a fresh SQLite file seeded with events. Then
+reader processes (standing in for gunicorn workers) request /api/events and
+/event/<id> through the Flask test client, while writer processes keep
+posting /create_event. For every profile the script reports reads/sec,
+writes/sec, read latency percentiles, and how many requests failed (e.g.
+"database is locked").
+
+Run from the project root:
+
+    python -m app.scripts.load_test_sqlite --readers 8 --writers 2 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from sqlalchemy import insert
+
+import config
+from app import create_app, db
+from app.models import Account, Event
+
+PROFILES = {
+    'default': config.Config,
+    'production': config.ProductionConfig,
+}
+
+
+def build_app(profile, db_path):
+    overrides = {
+        key: getattr(PROFILES[profile], key)
+        for key in dir(PROFILES[profile]) if key.isupper()
+    }
+    overrides.update({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'PASSWORD_HASH_WORKERS': 0,
+        'CACHE_BACKEND': 'null',  # measure the database, not the fragment cache
+        'TESTING': True,
+    })
+    return create_app(overrides)
+
+
+def seed(app, events):
+    with app.app_context():
+        db.create_all()
+        organizer = Account(username='loadtest', is_organizer=True)
+        organizer.set_password('loadtest')
+        db.session.add(organizer)
+        db.session.execute(insert(Event), [
+            {
+                'event_name': f'Seed event {i}',
+                'event_type': 'Talk',
+                'organizer': 'loadtest',
+                'date': f'2030-{1 + i % 12:02d}-{1 + i % 28:02d}',
+                'time': '18:00',
+                'location': 'Pittsburgh',
+                'desc': 'Seeded by load_test_sqlite',
+            }
+            for i in range(events)
+        ])
+        db.session.commit()
+
+
+def logged_in_client(app):
+    client = app.test_client()
+    client.post('/', data={'username': 'loadtest', 'password': 'loadtest', 'action': 'login'})
+    return client
+
+
+def reader(profile, db_path, args, results):
+    app = build_app(profile, db_path)
+    client = logged_in_client(app)
+    counts, latencies = Counter(), []
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        if random.random() < 0.5:
+            path = '/api/events?limit=20'
+        else:
+            path = f'/event/{random.randint(1, args.events)}'
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        latencies.append(time.perf_counter() - started)
+        counts['reads' if status == 200 else 'read_errors'] += 1
+    results.put((counts, latencies))
+
+
+def writer(profile, db_path, args, results):
+    app = build_app(profile, db_path)
+    client = logged_in_client(app)
+    counts = Counter()
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        response = client.post('/create_event', data={
+            'event_name': 'Load test event', 'event_type': 'Talk', 'desc': 'written during load test',
+            'date': '2031-01-01', 'time': '12:00', 'location': 'Online',
+        })
+        with client.session_transaction() as session:
+            flashes = session.pop('_flashes', [])
+        failed = response.status_code != 302 or any(category == 'danger' for category, _ in flashes)
+        counts['write_errors' if failed else 'writes'] += 1
+    results.put((counts, []))
+
+
+def run_profile(profile, args):
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, 'load.db')
+        seed(build_app(profile, db_path), args.events)
+
+        # Separate processes, like gunicorn workers, so SQLite locking is what is measured
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=reader, args=(profile, db_path, args, results))
+                   for _ in range(args.readers)]
+        workers += [multiprocessing.Process(target=writer, args=(profile, db_path, args, results))
+                    for _ in range(args.writers)]
+        for worker in workers:
+            worker.start()
+        counts, latencies = Counter(), []
+        for _ in workers:
+            worker_counts, worker_latencies = results.get()
+            counts.update(worker_counts)
+            latencies.extend(worker_latencies)
+        for worker in workers:
+            worker.join()
+
+        latencies.sort()
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000 if latencies else 0
+
+        print(f'{profile:>10}: {counts["reads"] / args.seconds:8.0f} reads/s  '
+              f'{counts["writes"] / args.seconds:6.0f} writes/s  '
+              f'read p50 {percentile(0.5):6.1f}ms  p99 {percentile(0.99):6.1f}ms  '
+              f'errors: {counts["read_errors"]} read / {counts["write_errors"]} write')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append',
+                        help='profile to run (repeatable); defaults to all')
+    args = parser.parse_args()
+
+    for profile in args.profile or sorted(PROFILES):
+        run_profile(profile, args)
+
+
+if __name__ == '__main__':
+    main()
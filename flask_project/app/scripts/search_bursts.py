@@ -0,0 +1,144 @@
+"""
+Count the SQL statements /search runs while many users type at once.
+
+Seeds a fresh SQLite file, then replays the same keystroke bursts against
+/search under each protection in turn. --users clients (each with its own
+remote address) type --words topic words concurrently and request
+/search for every prefix of three or more letters, --keystroke-ms apart,
+as the navbar did before it was debounced. Modes:
+
+- unprotected: every request runs its own queries (the view as it was);
+- coalesced: identical queries in flight at the same time share one execution;
+- cached: plus the SEARCH_CACHE_TTL result cache;
+- rate limited: plus SEARCH_RATE_LIMIT per client (memory, then sqlite backend).
+
+Exits non-zero if the fully protected modes run as many statements as the
+unprotected one.
+
+Run from the project root:
+
+    python -m app.scripts.search_bursts --users 50 --words 3
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.scripts.seed import TOPICS, seed_database
+
+MODES = (
+    ('unprotected', {'RATELIMIT_ENABLED': False, 'SEARCH_CACHE_TTL': 0}, False),
+    ('coalesced', {'RATELIMIT_ENABLED': False, 'SEARCH_CACHE_TTL': 0}, True),
+    ('cached', {'RATELIMIT_ENABLED': False}, True),
+    ('rate limited', {'RATELIMIT_STORAGE': 'memory'}, True),
+    ('rate limited (sqlite)', {'RATELIMIT_STORAGE': 'sqlite'}, True),
+)
+
+
+class Uncoalesced:
+    """Stands in for the SingleFlight so every request queries on its own."""
+
+    def do(self, key, function):
+        return function()
+
+
+def typing_plan(users, words):
+    """Per user, the prefixes typed, in order."""
+    plan = []
+    for _ in range(users):
+        prefixes = []
+        for word in random.choices(TOPICS, k=words):
+            prefixes.extend(word[:length] for length in range(3, len(word) + 1))
+        plan.append(prefixes)
+    return plan
+
+
+def replay(app, plan, keystroke):
+    statuses = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(len(plan))
+
+    def user(n, prefixes):
+        client = app.test_client()
+        client.environ_base['REMOTE_ADDR'] = f'10.0.{n // 250}.{n % 250 + 1}'
+        start.wait()
+        for prefix in prefixes:
+            status = client.get('/search', query_string={'query': prefix}).status_code
+            with lock:
+                statuses[status] += 1
+            time.sleep(keystroke)
+
+    threads = [threading.Thread(target=user, args=(n, prefixes)) for n, prefixes in enumerate(plan)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--words', type=int, default=3, help='words each user types')
+    parser.add_argument('--keystroke-ms', type=float, default=30)
+    parser.add_argument('--events', type=int, default=5000)
+    args = parser.parse_args()
+
+    plan = typing_plan(args.users, args.words)
+    workdir = tempfile.mkdtemp()
+    try:
+        database = f'sqlite:///{os.path.join(workdir, "search.db")}'
+        overrides = {
+            'SQLALCHEMY_DATABASE_URI': database,
+            'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30, 'check_same_thread': False}},
+            'JOB_WORKER_ENABLED': False,
+            'RATELIMIT_SQLITE_PATH': os.path.join(workdir, 'ratelimit.db'),
+        }
+        with create_app(overrides).app_context():
+            db.create_all()
+            seed_database(100, args.events, log=lambda message: None)
+
+        print(f'{args.users} users typing {args.words} words each: {sum(map(len, plan))} /search requests per mode')
+        print(f'{"mode":>22} {"200":>6} {"429":>6} {"statements":>11} {"per request":>12} {"seconds":>8}')
+        totals = {}
+        for name, config, coalesce in MODES:
+            app = create_app({**overrides, **config})
+            if not coalesce:
+                results, _ = app.extensions['search_results']
+                app.extensions['search_results'] = (results, Uncoalesced())
+            with app.app_context():
+                engine = db.engine
+            # Pick the search backend before counting
+            app.test_client().get('/search', query_string={'query': 'warmup'})
+
+            statements = Counter()
+            counter = lambda *_: statements.update(('sql',))  # noqa: E731
+            event.listen(engine, 'before_cursor_execute', counter)
+            started = time.perf_counter()
+            statuses = replay(app, plan, args.keystroke_ms / 1000)
+            seconds = time.perf_counter() - started
+            event.remove(engine, 'before_cursor_execute', counter)
+            engine.dispose()
+
+            requests = sum(statuses.values())
+            totals[name] = statements['sql']
+            print(f'{name:>22} {statuses[200]:6} {statuses[429]:6} {statements["sql"]:11} '
+                  f'{statements["sql"] / requests:12.2f} {seconds:8.2f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if max(totals['rate limited'], totals['rate limited (sqlite)']) >= totals['unprotected']:
+        print('FAILED: the protected modes did not run fewer statements', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
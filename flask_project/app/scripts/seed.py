@@ -0,0 +1,165 @@
+"""
+Fill a database with synthetic accounts, events and attendance.
+
+Event popularity follows a Zipf distribution: a few events draw most of the
+attendees and there is a long tail of small ones. Every account attends an
+exponentially distributed number of events. Events that reach their
+capacity push further signups onto the waitlist, as the live app does.
+Everything is written with batched Core inserts (events through
+app.bulk), so a few hundred thousand rows take seconds.
+
+All seeded accounts share one password (hashed once), so benchmarks can
+log in as any of them. Usernames are ``<prefix><n>``; organizers are the
+first ``--organizers`` of them.
+
+Run from the project root against the configured database:
+
+    python -m app.scripts.seed --accounts 5000 --events 2000 --attendance 6
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from app import bulk, create_app, db
+from app.models import Account, Event, EventAttendance, EventWaitlist
+from app.passwords import password_hasher
+
+DEFAULT_PASSWORD = 'password'
+
+FIRST_NAMES = ('Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn')
+LAST_NAMES = ('Smith', 'Nguyen', 'Patel', 'Garcia', 'Kim', 'Johnson', 'Lee', 'Brown', 'Davis', 'Lopez')
+TOPICS = ('Python', 'Flask', 'Machine Learning', 'Jazz', 'Chess', 'Robotics', 'Startup', 'Poetry',
+          'Basketball', 'Photography', 'Cooking', 'Climate', 'Hackathon', 'Career', 'Volunteering')
+KINDS = ('Workshop', 'Talk', 'Meetup', 'Social', 'Tournament', 'Fair', 'Seminar')
+LOCATIONS = ('Cathedral of Learning', 'William Pitt Union', 'Hillman Library', 'Posvar Hall',
+             'Petersen Events Center', 'Online')
+TAGS = ('Free Food', 'Beginner Friendly', 'Networking', 'Outdoors', 'Music', 'Tech', 'Arts',
+        'Sports', 'Career', 'Research', 'Social', 'Volunteering')
+
+
+def account_rows(count, organizers, prefix, password_hash):
+    for i in range(count):
+        yield {
+            'username': f'{prefix}{i}',
+            'password': password_hash,
+            'first_name': random.choice(FIRST_NAMES),
+            'last_name': random.choice(LAST_NAMES),
+            'hobbies': ', '.join(random.sample(TOPICS, random.randint(0, 3))),
+            'is_organizer': i < organizers,
+        }
+
+
+def event_rows(count, organizers, prefix, days):
+    today = date.today()
+    for i in range(count):
+        topic, kind = random.choice(TOPICS), random.choice(KINDS)
+        day = today + timedelta(days=random.randint(-days // 4, days))
+        yield {
+            'event_name': f'{topic} {kind}',
+            'event_type': kind,
+            'organizer': f'{prefix}{random.randrange(organizers)}' if organizers else None,
+            'date': day.isoformat(),
+            'time': f'{random.randint(8, 21)}:{random.choice(("00", "30"))}',
+            'location': random.choice(LOCATIONS),
+            'desc': f'A {kind.lower()} about {topic.lower()} for the Pitt community.',
+            'tags': ','.join(random.sample(TAGS, random.randint(1, 4))),
+            # Most events are open; the rest have a cap that popular ones will hit
+            'capacity': random.choice((None, None, None, 25, 50, 100, 250)),
+        }
+
+
+def insert_batches(table, rows, batch_size):
+    count = 0
+    for batch in bulk.batched(rows, batch_size):
+        db.session.execute(insert(table), batch)
+        db.session.commit()
+        count += len(batch)
+    return count
+
+
+def seed_database(accounts, events, organizers=None, attendance=5.0, zipf=1.1, days=180,
+                  prefix='seed', password=DEFAULT_PASSWORD, batch_size=bulk.DEFAULT_BATCH_SIZE, log=print):
+    """Insert the synthetic data inside the current app context; returns the new event ids."""
+    organizers = min(accounts, organizers if organizers is not None else max(1, accounts // 50))
+
+    started = time.perf_counter()
+    password_hash = password_hasher.hash(password)
+    first_account = (db.session.scalar(select(func.max(Account.id))) or 0) + 1
+    insert_batches(Account.__table__, account_rows(accounts, organizers, prefix, password_hash), batch_size)
+    account_ids = list(range(first_account, first_account + accounts))
+    log(f'{accounts} accounts ({organizers} organizers) in {time.perf_counter() - started:.2f}s')
+
+    started = time.perf_counter()
+    first_event = (db.session.scalar(select(func.max(Event.id))) or 0) + 1
+    report = bulk.import_rows(enumerate(event_rows(events, organizers, prefix, days), start=1), batch_size=batch_size)
+    event_ids = list(range(first_event, first_event + report.imported))
+    log(f'{report.imported} events in {time.perf_counter() - started:.2f}s')
+
+    started = time.perf_counter()
+    capacities = dict(db.session.query(Event.id, Event.capacity).filter(Event.id >= first_event))
+    # Zipf weights over a shuffled ranking, so popularity does not follow id order
+    ranked = event_ids[:]
+    random.shuffle(ranked)
+    cumulative = list(itertools.accumulate(1 / rank ** zipf for rank in range(1, len(ranked) + 1)))
+
+    counts = dict.fromkeys(event_ids, 0)
+    attending, waiting = [], []
+    joined_at = datetime.now()
+    for account_id in account_ids:
+        wanted = min(len(ranked), round(random.expovariate(1 / attendance))) if attendance else 0
+        chosen = set()
+        while len(chosen) < wanted:
+            chosen.update(random.choices(ranked, cum_weights=cumulative, k=wanted - len(chosen)))
+        for event_id in chosen:
+            capacity = capacities[event_id]
+            if capacity is None or counts[event_id] < capacity:
+                counts[event_id] += 1
+                attending.append({'account_id': account_id, 'event_id': event_id})
+            else:
+                waiting.append({'account_id': account_id, 'event_id': event_id, 'created_at': joined_at})
+
+    insert_batches(EventAttendance.__table__, attending, batch_size)
+    insert_batches(EventWaitlist.__table__, waiting, batch_size)
+    seats = [{'event_id': event_id, 'count': count} for event_id, count in counts.items() if count]
+    if seats:
+        db.session.execute(
+            update(Event.__table__).where(Event.id == bindparam('event_id')).values(attendee_count=bindparam('count')),
+            seats,
+        )
+    db.session.commit()
+    top = max(counts.values(), default=0)
+    log(f'{len(attending)} attendances and {len(waiting)} waitlist entries in '
+        f'{time.perf_counter() - started:.2f}s (most popular event: {top} attendees)')
+    return event_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--organizers', type=int, help='default: 2%% of accounts')
+    parser.add_argument('--attendance', type=float, default=5.0, help='mean events attended per account')
+    parser.add_argument('--zipf', type=float, default=1.1, help='popularity skew; higher is more skewed')
+    parser.add_argument('--days', type=int, default=180, help='events are spread over this many days')
+    parser.add_argument('--prefix', default='seed', help='username prefix')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--database', help='SQLAlchemy URI; default: the configured database')
+    parser.add_argument('--create', action='store_true', help='create missing tables first (db.create_all)')
+    parser.add_argument('--random-seed', type=int)
+    args = parser.parse_args()
+
+    random.seed(args.random_seed)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database} if args.database else None)
+    with app.app_context():
+        if args.create:
+            db.create_all()
+        seed_database(args.accounts, args.events, args.organizers, args.attendance, args.zipf, args.days,
+                      args.prefix, args.password)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Stress test for live attendee counts: hundreds of concurrent SSE subscribers.
+
+Serves the app on a local port (threaded Werkzeug server) and opens
+--subscribers streams to /event/<id>/live, spread over --events events.
+It then checks that:
+
+- every stream gets the current count when it connects;
+- a signup through app/attendance.py reaches every stream of that event,
+  and streams of other events get nothing;
+- a change committed by another process (a separate sqlite3 connection
+  writing attendee_count and attendance_log) arrives within the poll
+  interval;
+- closed streams unsubscribe.
+
+All the while it counts SQL statements, to show that they depend on the
+number of events and changes, not on the number of open streams.
+
+Run from the project root:
+
+    python -m app.scripts.stress_live --subscribers 500 --events 5
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event as sqlalchemy_event, insert
+from werkzeug.serving import make_server
+
+from app import attendance, create_app, db
+from app.live import broadcaster
+from app.models import Account, Event
+
+
+class Subscriber(threading.Thread):
+    """One EventSource-like client; keeps every ``attendance`` message it receives."""
+
+    def __init__(self, port, event_id, cookie):
+        super().__init__(daemon=True)
+        self.port, self.event_id, self.cookie = port, event_id, cookie
+        self.messages = []  # (monotonic time, state)
+        self.received = threading.Condition()
+        self.socket = None
+        self.error = None
+
+    def run(self):
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            connection.connect()
+            self.socket = connection.sock  # the response keeps using it after the connection lets go
+            connection.request('GET', f'/event/{self.event_id}/live', headers={'Cookie': self.cookie})
+            response = connection.getresponse()
+            if response.status != 200:
+                raise RuntimeError(f'HTTP {response.status}')
+            fields = {}
+            for line in iter(response.readline, b''):
+                line = line.decode().rstrip('\n')
+                if line:
+                    name, _, value = line.partition(': ')
+                    fields[name] = value
+                    continue
+                if fields.get('event') == 'attendance':
+                    with self.received:
+                        self.messages.append((time.monotonic(), json.loads(fields['data'])))
+                        self.received.notify_all()
+                fields = {}
+        except OSError:
+            pass  # closed by close()
+        except Exception as error:
+            self.error = error
+        finally:
+            if self.socket is not None:
+                self.socket.close()
+
+    def wait_for(self, predicate, timeout):
+        with self.received:
+            return self.received.wait_for(lambda: predicate(self.messages), timeout)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.shutdown(socket.SHUT_RDWR)  # the reader sees EOF and closes the socket
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        sqlalchemy_event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def seed(app, events):
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Account), [{'username': f'live{i}', 'password': '!'} for i in range(50)])
+        db.session.add_all([Event(event_name=f'Live Event {i}', event_type='Talk', capacity=40) for i in range(events)])
+        db.session.commit()
+        return [row[0] for row in db.session.query(Event.id)], [row[0] for row in db.session.query(Account.id)]
+
+
+def session_cookie(app, account_id):
+    value = app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(account_id), '_fresh': True})
+    return f'{app.config["SESSION_COOKIE_NAME"]}={value}'
+
+
+def latency(subscribers, since, predicate, timeout):
+    """Seconds until every subscriber's latest message satisfies ``predicate``; None on timeout."""
+    deadline = time.monotonic() + timeout
+    arrivals = []
+    for subscriber in subscribers:
+        if not subscriber.wait_for(lambda messages: messages and predicate(messages[-1][1]),
+                                   max(deadline - time.monotonic(), 0)):
+            return None
+        arrivals.append(subscriber.messages[-1][0] - since)
+    return max(arrivals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--events', type=int, default=5)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    args = parser.parse_args()
+
+    problems = []
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'live.db')
+    try:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30, 'check_same_thread': False}},
+            'JOB_WORKER_ENABLED': False,
+            'LIVE_POLL_INTERVAL': args.poll_interval,
+            'LIVE_KEEPALIVE': 1,
+        })
+        event_ids, account_ids = seed(app, args.events)
+        with app.app_context():
+            statements = StatementCounter(db.engine)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        cookie = session_cookie(app, account_ids[0])
+
+        # Connect
+        print(f'Opening {args.subscribers} streams over {args.events} events')
+        started, before = time.monotonic(), statements.count
+        subscribers = [Subscriber(server.port, event_ids[i % len(event_ids)], cookie) for i in range(args.subscribers)]
+        for subscriber in subscribers:
+            subscriber.start()
+        connected = latency(subscribers, started, lambda state: state['attendee_count'] == 0, 60)
+        if connected is None:
+            problems.append('not every stream got the initial count')
+            connected = float('nan')
+        errors = [subscriber.error for subscriber in subscribers if subscriber.error]
+        if errors:
+            problems.append(f'{len(errors)} streams failed, e.g. {errors[0]!r}')
+        print(f'  all connected with the current count in {connected:.2f}s, '
+              f'{statements.count - before} SQL statements, {broadcaster.subscriber_count()} subscribed')
+
+        # Idle
+        before, polls = statements.count, broadcaster.polls
+        time.sleep(3 * args.poll_interval)
+        print(f'  idle for {3 * args.poll_interval:.0f}s: {statements.count - before} SQL statements '
+              f'({broadcaster.polls - polls} polls)')
+
+        # A signup in this process
+        watched = [subscriber for subscriber in subscribers if subscriber.event_id == event_ids[0]]
+        others = [subscriber for subscriber in subscribers if subscriber.event_id != event_ids[0]]
+        received_before = sum(len(subscriber.messages) for subscriber in others)
+        before, started = statements.count, time.monotonic()
+        with app.app_context():
+            attendance.sign_up(event_ids[0], account_ids[1])
+            attendance.sign_up(event_ids[0], account_ids[2])
+        seconds = latency(watched, started, lambda state: state['attendee_count'] == 2, 10)
+        time.sleep(0.2)
+        print(f'  local signups reached all {len(watched)} streams of the event in '
+              f'{seconds if seconds is None else round(seconds * 1000, 1)} ms; '
+              f'{statements.count - before} SQL statements including the signups')
+        if seconds is None:
+            problems.append('a local signup did not reach every stream')
+        if sum(len(subscriber.messages) for subscriber in others) != received_before:
+            problems.append('streams of other events got messages')
+
+        # A change committed by another process
+        watched = [subscriber for subscriber in subscribers if subscriber.event_id == event_ids[-1]]
+        connection = sqlite3.connect(db_path, timeout=30)
+        with connection:
+            connection.execute('UPDATE event SET attendee_count = attendee_count + 1 WHERE id = ?', (event_ids[-1],))
+            connection.execute(
+                "INSERT INTO attendance_log (event_id, account_id, action, created_at) "
+                "VALUES (?, ?, 'signed_up', CURRENT_TIMESTAMP)",
+                (event_ids[-1], account_ids[3]),
+            )
+        connection.close()
+        started = time.monotonic()
+        seconds = latency(watched, started, lambda state: state['attendee_count'] == 1, 3 * args.poll_interval + 5)
+        print(f'  a change from another process reached all {len(watched)} streams in '
+              f'{seconds if seconds is None else round(seconds, 2)}s (poll interval {args.poll_interval}s)')
+        if seconds is None or seconds > args.poll_interval + 1:
+            problems.append('a change from another process was not picked up within the poll interval')
+
+        # Disconnect
+        for subscriber in subscribers:
+            subscriber.close()
+        deadline = time.monotonic() + 10
+        while broadcaster.subscriber_count() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        print(f'  after closing: {broadcaster.subscriber_count()} subscribed')
+        if broadcaster.subscriber_count():
+            problems.append('closed streams stayed subscribed')
+        server.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if problems:
+        print('FAILED')
+        for problem in problems:
+            print(f'  - {problem}')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
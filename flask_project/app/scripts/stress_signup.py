@@ -0,0 +1,150 @@
+"""
+Concurrency stress test for capacity-limited signups.
+
+Many threads sign accounts up for one event at the same moment. Some
+accounts are submitted by two threads, to exercise the duplicate-key path.
+Half of the attendees then decline concurrently, so waitlist promotion is
+exercised too. After each phase the script checks that the event was never
+oversubscribed and that attendee_count matches event_attendance.
+
+Run from the project root:
+
+    python -m app.scripts.stress_signup --threads 32 --accounts 2000 --capacity 150
+
+Exits with status 1 if any invariant is violated.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import func, insert
+
+from app import attendance, create_app, db
+from app.models import Account, Event, EventAttendance, EventWaitlist
+
+
+def make_app(db_path):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 60}},
+    })
+
+
+def seed(app, accounts, capacity):
+    with app.app_context():
+        db.create_all()
+        db.session.execute(
+            insert(Account),
+            [{'username': f'stress{i}', 'password': '!'} for i in range(accounts)],
+        )
+        event = Event(event_name='Stress Workshop', event_type='Workshop', capacity=capacity)
+        db.session.add(event)
+        db.session.commit()
+        account_ids = [row[0] for row in db.session.query(Account.id)]
+        return event.id, account_ids
+
+
+def run_concurrently(app, threads, work, action):
+    """Split ``work`` across ``threads`` threads that start together; returns (results, seconds)."""
+    results = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+    chunks = [work[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        local = Counter()
+        with app.app_context():
+            barrier.wait()
+            for item in chunk:
+                local[action(item)] += 1
+            db.session.remove()
+        with lock:
+            results.update(local)
+
+    pool = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def check(app, event_id, capacity, expected_total):
+    """Return a list of invariant violations (empty when everything holds)."""
+    with app.app_context():
+        event = db.session.get(Event, event_id)
+        attending = db.session.query(func.count()).select_from(EventAttendance).filter_by(event_id=event_id).scalar()
+        waiting = db.session.query(func.count()).select_from(EventWaitlist).filter_by(event_id=event_id).scalar()
+        both = (
+            db.session.query(func.count())
+            .select_from(EventAttendance)
+            .join(EventWaitlist, (EventWaitlist.account_id == EventAttendance.account_id)
+                  & (EventWaitlist.event_id == EventAttendance.event_id))
+            .scalar()
+        )
+        print(f'  attending={attending} attendee_count={event.attendee_count} waitlisted={waiting}')
+
+        problems = []
+        if attending > capacity:
+            problems.append(f'oversubscribed: {attending} attendees for {capacity} seats')
+        if attending != event.attendee_count:
+            problems.append(f'attendee_count {event.attendee_count} != {attending} attendance rows')
+        if attending + waiting != expected_total:
+            problems.append(f'{attending + waiting} accounts recorded, expected {expected_total}')
+        if waiting and attending < capacity:
+            problems.append(f'{waiting} waitlisted while {capacity - attending} seats are free')
+        if both:
+            problems.append(f'{both} accounts are both attending and waitlisted')
+        return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--accounts', type=int, default=2000)
+    parser.add_argument('--capacity', type=int, default=150)
+    parser.add_argument('--duplicates', type=float, default=0.1, help='fraction of accounts submitted twice')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        app = make_app(db_path)
+        event_id, account_ids = seed(app, args.accounts, args.capacity)
+
+        work = account_ids + random.sample(account_ids, int(len(account_ids) * args.duplicates))
+        random.shuffle(work)
+        print(f'Signing up {len(work)} requests ({len(account_ids)} accounts) on {args.threads} threads, '
+              f'capacity {args.capacity}')
+        results, elapsed = run_concurrently(app, args.threads, work, lambda a: attendance.sign_up(event_id, a))
+        print(f'  {dict(results)}')
+        print(f'  {len(work) / elapsed:.0f} signups/sec ({elapsed:.2f}s)')
+        problems = check(app, event_id, args.capacity, len(account_ids))
+
+        with app.app_context():
+            attendees = [row[0] for row in db.session.query(EventAttendance.account_id).filter_by(event_id=event_id)]
+        decliners = attendees[: len(attendees) // 2]
+        print(f'Declining {len(decliners)} attendees on {args.threads} threads')
+        results, elapsed = run_concurrently(app, args.threads, decliners, lambda a: attendance.decline(event_id, a))
+        print(f'  {dict(results)}')
+        print(f'  {len(decliners) / elapsed:.0f} declines/sec ({elapsed:.2f}s)')
+        problems += check(app, event_id, args.capacity, len(account_ids) - len(decliners))
+    finally:
+        os.remove(db_path)
+
+    if problems:
+        print('FAILED')
+        for problem in problems:
+            print(f'  - {problem}')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+"""Full-text search over events.
+
+On SQLite the ``event_fts`` FTS5 table is used. Triggers on ``event`` keep
+it in sync. Other database backends (or SQLite builds without FTS5) use an
+in-process inverted index. That index is built on first use and updated
+after every commit that touches an event.
+
+The navbar search (``search_summaries``) keys queries by their tokens. It
+keeps results for ``SEARCH_CACHE_TTL`` seconds, and identical queries that
+arrive while one is running wait for it instead of querying again.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import DDL, event as sa_event, false, text
+from sqlalchemy.orm import load_only
+
+from . import db
+from .cache import SingleFlight, TTLCache
+from .models import Event
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Indexed columns and their weight when ranking results
+FIELD_WEIGHTS = (
+    ('event_name', 10.0),
+    ('desc', 1.0),
+    ('location', 2.0),
+    ('tags', 5.0),
+)
+
+# Upper bound on vocabulary terms a trailing prefix may expand to
+MAX_PREFIX_EXPANSION = 64
+
+FTS_CREATE_STATEMENTS = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5(
+        event_name, "desc", location, tags,
+        content='event', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_fts_ai AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, event_name, "desc", location, tags)
+        VALUES (new.id, new.event_name, new."desc", new.location, new.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_fts_ad AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, event_name, "desc", location, tags)
+        VALUES ('delete', old.id, old.event_name, old."desc", old.location, old.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS event_fts_au
+    AFTER UPDATE OF event_name, "desc", location, tags ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, event_name, "desc", location, tags)
+        VALUES ('delete', old.id, old.event_name, old."desc", old.location, old.tags);
+        INSERT INTO event_fts(rowid, event_name, "desc", location, tags)
+        VALUES (new.id, new.event_name, new."desc", new.location, new.tags);
+    END
+    """,
+)
+
+FTS_DROP_STATEMENTS = (
+    'DROP TRIGGER IF EXISTS event_fts_au',
+    'DROP TRIGGER IF EXISTS event_fts_ad',
+    'DROP TRIGGER IF EXISTS event_fts_ai',
+    'DROP TABLE IF EXISTS event_fts',
+)
+
+# Keep the FTS table alongside the event table when using db.create_all()/drop_all()
+for _statement in FTS_CREATE_STATEMENTS:
+    sa_event.listen(Event.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+for _statement in FTS_DROP_STATEMENTS:
+    sa_event.listen(Event.__table__, 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+
+
+def tokenize(value):
+    if not value:
+        return []
+    return TOKEN_RE.findall(value.lower())
+
+
+class FTS5Backend:
+    """Queries the SQLite ``event_fts`` table, ranked with bm25()."""
+
+    name = 'fts5'
+
+    def search(self, query, limit):
+        match = self._match_expression(query)
+        if match is None:
+            return []
+        weights = ', '.join(str(weight) for _, weight in FIELD_WEIGHTS)
+        rows = db.session.execute(
+            text(
+                'SELECT rowid FROM event_fts WHERE event_fts MATCH :match '
+                'ORDER BY bm25(event_fts, %s) LIMIT :limit' % weights
+            ),
+            {'match': match, 'limit': limit},
+        )
+        return [row[0] for row in rows]
+
+    def match_clause(self, query):
+        match = self._match_expression(query)
+        if match is None:
+            return false()
+        matching = text('SELECT rowid FROM event_fts WHERE event_fts MATCH :match')
+        return Event.id.in_(matching.bindparams(match=match).columns(rowid=db.Integer))
+
+    @staticmethod
+    def _match_expression(query):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        # Quote every token so user input is never parsed as FTS syntax, and
+        # treat the last one as a prefix since the user may still be typing.
+        terms = ['"%s"' % token for token in tokens[:-1]]
+        terms.append('"%s"*' % tokens[-1])
+        return ' '.join(terms)
+
+
+class InvertedIndexBackend:
+    """Pure-Python inverted index used when FTS5 is not available."""
+
+    name = 'inverted'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._postings = defaultdict(dict)  # token -> {event_id: weight}
+        self._documents = {}  # event_id -> set of tokens
+        self._vocabulary = []  # sorted tokens, for prefix lookups
+
+    @property
+    def built(self):
+        return self._built
+
+    def build(self):
+        columns = [getattr(Event, field) for field, _ in FIELD_WEIGHTS]
+        rows = db.session.query(Event.id, *columns).yield_per(1000)
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            for row in rows:
+                self._index(row[0], dict(zip((f for f, _ in FIELD_WEIGHTS), row[1:])))
+            self._vocabulary = sorted(self._postings)
+            self._built = True
+
+    def apply(self, changes):
+        """Apply ``{event_id: fields or None}`` collected from a committed session."""
+        with self._lock:
+            if not self._built:
+                return
+            for event_id, fields in changes.items():
+                self._unindex(event_id)
+                if fields is not None:
+                    for token in self._index(event_id, fields):
+                        index = bisect.bisect_left(self._vocabulary, token)
+                        if index == len(self._vocabulary) or self._vocabulary[index] != token:
+                            self._vocabulary.insert(index, token)
+
+    def search(self, query, limit):
+        scores = self._score(query)
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [event_id for event_id, _ in top]
+
+    def match_clause(self, query):
+        scores = self._score(query)
+        if not scores:
+            return false()
+        return Event.id.in_(list(scores))
+
+    def _score(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return {}
+        if not self._built:
+            self.build()
+
+        with self._lock:
+            clauses = [self._exact(token) for token in tokens[:-1]]
+            clauses.append(self._prefix(tokens[-1]))
+            if not all(clauses):
+                return {}
+
+            # Intersect from the most selective clause outwards
+            clauses.sort(key=len)
+            scores = {}
+            for event_id, weight in clauses[0].items():
+                score = weight
+                for other in clauses[1:]:
+                    other_weight = other.get(event_id)
+                    if other_weight is None:
+                        break
+                    score += other_weight
+                else:
+                    scores[event_id] = score
+            return scores
+
+    def _index(self, event_id, fields):
+        tokens = set()
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields.get(field)):
+                postings = self._postings[token]
+                postings[event_id] = postings.get(event_id, 0.0) + weight
+                tokens.add(token)
+        self._documents[event_id] = tokens
+        return tokens
+
+    def _unindex(self, event_id):
+        for token in self._documents.pop(event_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(event_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                    del self._vocabulary[index]
+
+    def _idf(self, postings):
+        return math.log(1.0 + len(self._documents) / len(postings))
+
+    def _exact(self, token):
+        postings = self._postings.get(token)
+        if not postings:
+            return {}
+        idf = self._idf(postings)
+        return {event_id: weight * idf for event_id, weight in postings.items()}
+
+    def _prefix(self, prefix):
+        matches = {}
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not token.startswith(prefix):
+                break
+            for event_id, weight in self._exact(token).items():
+                matches[event_id] = max(matches.get(event_id, 0.0), weight)
+        return matches
+
+
+class SearchIndex:
+    """Picks a search backend per application and keeps it in sync."""
+
+    def __init__(self):
+        self._inverted = InvertedIndexBackend()
+        self._listening = False
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')  # 'auto', 'fts5' or 'inverted'
+        app.config.setdefault('SEARCH_RESULT_LIMIT', 20)
+        app.config.setdefault('SEARCH_MAX_RESULT_LIMIT', 100)
+        app.config.setdefault('SEARCH_CACHE_TTL', 5)  # seconds; 0 turns the result cache off
+        app.config.setdefault('SEARCH_CACHE_SIZE', 1024)
+        app.extensions['search_index'] = self
+        app.extensions['search_results'] = (
+            TTLCache(maxsize=app.config['SEARCH_CACHE_SIZE'], ttl=app.config['SEARCH_CACHE_TTL']),
+            SingleFlight(),
+        )
+
+        if self._listening:
+            return
+        self._listening = True
+        sa_event.listen(db.session, 'after_flush', self._collect_changes)
+        sa_event.listen(db.session, 'after_commit', self._apply_changes)
+        sa_event.listen(db.session, 'after_soft_rollback', self._discard_changes)
+
+    def backend(self, app=None):
+        app = app or current_app
+        state = app.extensions.setdefault('search_backend', {})
+        if 'backend' not in state:
+            state['backend'] = self._select_backend(app)
+        return state['backend']
+
+    def search_ids(self, query, limit=None):
+        """Return the ids of matching events, best match first."""
+        limit = limit or current_app.config['SEARCH_RESULT_LIMIT']
+        limit = min(limit, current_app.config['SEARCH_MAX_RESULT_LIMIT'])
+        return self.backend().search(query, limit)
+
+    def match_clause(self, query):
+        """SQL criterion selecting every event that matches ``query``, unranked."""
+        return self.backend().match_clause(query)
+
+    def add_events(self, events):
+        """Index events written with Core statements, which the session hooks do not see.
+
+        ``events`` is ``{event_id: {field: value}}``. FTS5 triggers already
+        cover these rows, so only the in-process index needs it.
+        """
+        self._inverted.apply(events)
+
+    def search_events(self, query, limit=None, columns=None):
+        """Return matching ``Event`` rows in rank order."""
+        ids = self.search_ids(query, limit)
+        if not ids:
+            return []
+        events = Event.query.filter(Event.id.in_(ids))
+        if columns:
+            events = events.options(load_only(*columns))
+        by_id = {event.id: event for event in events}
+        return [by_id[event_id] for event_id in ids if event_id in by_id]
+
+    def search_summaries(self, query, limit=None):
+        """``[{'id': ..., 'event_name': ...}]`` of matching events, cached and coalesced by query tokens."""
+        terms = ' '.join(tokenize(query))
+        if not terms:
+            return []
+        limit = min(limit or current_app.config['SEARCH_RESULT_LIMIT'], current_app.config['SEARCH_MAX_RESULT_LIMIT'])
+        results, flights = current_app.extensions['search_results']
+        key = (terms, limit)
+        summaries = results.get(key)
+        if summaries is None:
+            summaries = flights.do(key, lambda: self._load_summaries(key, results))
+        return summaries
+
+    def _load_summaries(self, key, results):
+        # Another request may have filled the cache between our miss and taking the flight
+        summaries = results.get(key)
+        if summaries is None:
+            terms, limit = key
+            events = self.search_events(terms, limit, columns=(Event.id, Event.event_name))
+            summaries = [{'id': event.id, 'event_name': event.event_name} for event in events]
+            if results.ttl:
+                results.set(key, summaries)
+        return summaries
+
+    def _select_backend(self, app):
+        preference = app.config['SEARCH_BACKEND']
+        if preference != 'inverted' and db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as connection:
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_fts'")
+                ).first()
+            if exists:
+                return FTS5Backend()
+            if preference == 'fts5':
+                app.logger.warning('event_fts table is missing; falling back to the inverted index')
+        return self._inverted
+
+    # Session hooks. Only the in-process index needs them; FTS5 is kept in
+    # sync by database triggers.
+
+    def _collect_changes(self, session, flush_context):
+        if not self._inverted.built:
+            return
+        changes = session.info.setdefault('search_changes', {})
+        for obj in session.new.union(session.dirty):
+            if isinstance(obj, Event):
+                changes[obj.id] = {field: getattr(obj, field) for field, _ in FIELD_WEIGHTS}
+        for obj in session.deleted:
+            if isinstance(obj, Event):
+                changes[obj.id] = None
+
+    def _apply_changes(self, session):
+        changes = session.info.pop('search_changes', None)
+        if changes:
+            self._inverted.apply(changes)
+
+    def _discard_changes(self, session, previous_transaction):
+        session.info.pop('search_changes', None)
+
+
+search_index = SearchIndex()
@@ -0,0 +1,20 @@
+// Live attendee count on the event page (app/live.py); the browser reconnects on its own when the stream ends
+(function () {
+    const page = document.querySelector('[data-live-url]');
+    if (!page) {
+        return;
+    }
+    const source = new EventSource(page.dataset.liveUrl);
+    source.addEventListener('attendance', function (message) {
+        const state = JSON.parse(message.data);
+        document.getElementById('attendeeCount').textContent =
+            state.capacity ? state.attendee_count + ' / ' + state.capacity : state.attendee_count;
+        const signupBtn = document.getElementById('signupBtn');
+        if (signupBtn) {
+            signupBtn.textContent = state.is_full ? 'Join Waitlist' : 'Sign Up';
+        }
+    });
+    source.addEventListener('gone', function () {
+        source.close();  // The event was deleted
+    });
+})();
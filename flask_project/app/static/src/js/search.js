@@ -0,0 +1,129 @@
+// Handle the search button click behavior
+document.getElementById('searchBtn').addEventListener('click', function() {
+    var searchBox = document.getElementById('searchBox');
+    var query = searchBox.value.trim();
+    if (query) {
+        searchEvents(query);  // Trigger the search function
+    }
+});
+
+// Handle Enter key press in the search box
+document.getElementById('searchBox').addEventListener('keypress', function(event) {
+    if (event.key === 'Enter') {
+        var query = this.value.trim();
+        if (query) {
+            searchEvents(query);  // Trigger the search function
+        }
+    }
+});
+
+// Handle input events in the search bar to fetch autocomplete suggestions, once typing
+// pauses for SUGGEST_DEBOUNCE_MS; answers to older keystrokes are dropped
+const SUGGEST_DEBOUNCE_MS = 250;
+let suggestTimer = null;
+let suggestSequence = 0;
+document.getElementById('searchBox').addEventListener('input', function () {
+    let query = this.value.trim();
+    let suggestionsBox = document.getElementById('suggestionsBox');
+    clearTimeout(suggestTimer);
+    let sequence = ++suggestSequence;
+
+    if (query.length > 2) {  // Trigger search after at least 3 characters
+        suggestTimer = setTimeout(function () {
+            fetch(`/suggest?q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (sequence !== suggestSequence) {
+                        return;  // The user kept typing; a newer request is on its way
+                    }
+                    // Clear previous suggestions
+                    suggestionsBox.innerHTML = '';
+
+                    if (data.length > 0) {
+                        suggestionsBox.style.display = 'block';  // Show the suggestion box
+                        data.forEach(suggestion => {
+                            let suggestionItem = document.createElement('a');
+                            suggestionItem.classList.add('list-group-item', 'list-group-item-action');
+                            suggestionItem.href = "#";
+                            suggestionItem.innerText = suggestion.type === 'tag' ? '#' + suggestion.label : suggestion.label;
+                            suggestionItem.onclick = function () {
+                                if (suggestion.type === 'event') {
+                                    window.location.href = "/event/" + suggestion.id;
+                                } else {
+                                    searchEvents(suggestion.label);  // Tags run a full search
+                                }
+                            };
+                            suggestionsBox.appendChild(suggestionItem);
+                        });
+                    } else {
+                        suggestionsBox.style.display = 'none';  // Hide suggestions if no matches
+                    }
+                })
+                .catch(error => {
+                    console.error('Error fetching search results:', error);
+                });
+        }, SUGGEST_DEBOUNCE_MS);
+    } else {
+        suggestionsBox.style.display = 'none';  // Hide suggestions if the query is too short
+    }
+});
+
+// Hide suggestions when clicking outside the search input
+window.addEventListener('click', function (e) {
+    let suggestionsBox = document.getElementById('suggestionsBox');
+    let searchBox = document.getElementById('searchBox');
+    if (!searchBox.contains(e.target)) {
+        suggestionsBox.style.display = 'none';
+    }
+});
+
+// Search function to fetch results and handle "No results found" message
+function searchEvents(query) {
+    let suggestionsBox = document.getElementById('suggestionsBox');
+    let noResultsMessage = document.getElementById('noResultsMessage');
+    noResultsMessage.style.display = 'none';  // Hide no results message initially
+
+    fetch(`/search?query=${encodeURIComponent(query)}`)
+        .then(response => {
+            if (response.status === 429) {  // Rate limited; keep the current results
+                throw new Error('Too many searches, retry after ' + response.headers.get('Retry-After') + 's');
+            }
+            return response.json();
+        })
+        .then(data => {
+            suggestionsBox.innerHTML = '';
+            if (data.length > 0) {
+                suggestionsBox.style.display = 'block';
+                data.forEach(event => {
+                    let suggestionItem = document.createElement('a');
+                    suggestionItem.classList.add('list-group-item', 'list-group-item-action');
+                    suggestionItem.href = "#";
+                    suggestionItem.innerText = event.event_name;
+                    suggestionItem.onclick = function () {
+                        window.location.href = "/event/" + event.id;
+                    };
+                    suggestionsBox.appendChild(suggestionItem);
+                });
+            } else {
+                suggestionsBox.style.display = 'none';  // Hide suggestions if no matches
+                noResultsMessage.style.display = 'block';  // Show "No results found" message
+            }
+        })
+        .catch(error => {
+            console.error('Error fetching search results:', error);
+        });
+}
+
+// Handle the magnifying glass on mobile to show/hide the search box
+document.getElementById('searchBtn').addEventListener('click', function() {
+    var mobileSearchBox = document.getElementById('mobileSearchBox');
+    if (window.innerWidth <= 576) {
+        mobileSearchBox.classList.toggle('d-none');
+        // Expanding the navbar when search box appears
+        if (!mobileSearchBox.classList.contains('d-none')) {
+            document.querySelector('.navbar').classList.add('expanded');
+        } else {
+            document.querySelector('.navbar').classList.remove('expanded');
+        }
+    }
+});
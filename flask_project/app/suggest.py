@@ -0,0 +1,133 @@
+"""Prefix autocomplete for the navbar search box.
+
+Suggestions come from a sorted in-memory array of event names and tags, so
+a lookup is a bisect plus a short scan and never touches the database. The
+array is built on first use and extended in place when an event is created.
+Other worker processes pick up new events when their copy reaches
+``SUGGEST_MAX_AGE`` and is rebuilt in the background.
+"""
+import bisect
+import threading
+import time
+
+from flask import current_app
+
+from . import db
+from .models import Event
+from .search import tokenize
+from .tags import split_tags
+
+# Entries whose key starts at the beginning of the event name rank first
+RANK_NAME, RANK_WORD, RANK_TAG = 0, 1, 2
+
+# How many matching entries a lookup examines before picking the top N
+SCAN_FACTOR = 8
+
+
+class SuggestionIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []  # sorted (key, rank, label, kind, ident) tuples
+        self._tags = set()
+        self._built_at = None
+        self._rebuilding = False
+
+    def init_app(self, app):
+        app.config.setdefault('SUGGEST_LIMIT', 8)
+        app.config.setdefault('SUGGEST_MAX_AGE', 300)  # seconds; None keeps the index forever
+        app.extensions['suggest_index'] = self
+
+    def build(self):
+        entries = []
+        tags = set()
+        for event_id, name, event_tags in db.session.query(Event.id, Event.event_name, Event.tags).yield_per(1000):
+            entries.extend(self._event_entries(event_id, name))
+            for tag in split_tags(event_tags):
+                if tag.lower() not in tags:
+                    tags.add(tag.lower())
+                    entries.append((tag.lower(), RANK_TAG, tag, 'tag', tag))
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._tags = tags
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = []
+            self._tags = set()
+            self._built_at = None
+
+    def add_event(self, event_id, name, tags=None):
+        """Insert a newly committed event without rebuilding the whole index."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            for entry in self._event_entries(event_id, name):
+                bisect.insort(self._entries, entry)
+            for tag in split_tags(tags):
+                if tag.lower() not in self._tags:
+                    self._tags.add(tag.lower())
+                    bisect.insort(self._entries, (tag.lower(), RANK_TAG, tag, 'tag', tag))
+
+    def suggest(self, prefix, limit=None):
+        prefix = ' '.join(tokenize(prefix))
+        if not prefix:
+            return []
+        limit = limit or current_app.config['SUGGEST_LIMIT']
+        self._ensure_fresh()
+
+        with self._lock:
+            start = bisect.bisect_left(self._entries, (prefix,))
+            candidates = []
+            for entry in self._entries[start:start + limit * SCAN_FACTOR]:
+                if not entry[0].startswith(prefix):
+                    break
+                candidates.append(entry)
+
+        seen = set()
+        results = []
+        for _, _, label, kind, ident in sorted(candidates, key=lambda entry: (entry[1], entry[2])):
+            if (kind, ident) in seen:
+                continue
+            seen.add((kind, ident))
+            result = {'label': label, 'type': kind}
+            if kind == 'event':
+                result['id'] = ident
+            results.append(result)
+            if len(results) == limit:
+                break
+        return results
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            self.build()
+            return
+        max_age = current_app.config['SUGGEST_MAX_AGE']
+        if max_age is None or time.monotonic() - self._built_at < max_age:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        # Keep serving the current copy while a fresh one is loaded
+        threading.Thread(target=self._rebuild, args=(current_app._get_current_object(),), daemon=True).start()
+
+    def _rebuild(self, app):
+        try:
+            with app.app_context():
+                self.build()
+        finally:
+            self._rebuilding = False
+
+    @staticmethod
+    def _event_entries(event_id, name):
+        words = tokenize(name)
+        entries = []
+        for position in range(len(words)):
+            key = ' '.join(words[position:])
+            entries.append((key, RANK_NAME if position == 0 else RANK_WORD, name, 'event', event_id))
+        return entries
+
+
+suggest_index = SuggestionIndex()
@@ -0,0 +1,115 @@
+"""Normalized event tags and tag facets.
+
+``Event.tags`` stays the comma-separated string that forms write and pages
+display. Each distinct tag is also stored once in ``tag`` (looked up by its
+case-folded slug), and ``event_tag`` links events to tags. A mapper hook
+rewrites an event's ``event_tag`` rows whenever its ``tags`` string changes.
+
+Filtering by tag is then a slug lookup plus a range scan of
+``ix_event_tag_tag_event``, rather than ``LIKE '%tag%'`` over every event
+(which also matched "Python" for "py"). Facet counts group ``event_tag`` by
+tag for the events matching the current search.
+"""
+from sqlalchemy import delete, event, func, insert, inspect, select
+
+from . import db
+from .models import Event, EventTag, Tag
+
+DEFAULT_FACET_LIMIT = 20
+MAX_FACET_LIMIT = 100
+
+
+def split_tags(tags):
+    if not tags:
+        return []
+    return [tag.strip() for tag in tags.split(',') if tag.strip()]
+
+
+def _clean(tag):
+    return ' '.join(tag.split())
+
+
+def slugify(tag):
+    return _clean(tag).casefold()
+
+
+def parse_tags(tags):
+    """Return ``{slug: name}`` for a comma-separated tag string, first spelling wins."""
+    parsed = {}
+    for name in split_tags(tags):
+        parsed.setdefault(slugify(name), _clean(name))
+    return parsed
+
+
+def set_event_tags(connection, event_id, tags):
+    """Replace the ``event_tag`` rows of one event with the tags in ``tags``."""
+    connection.execute(delete(EventTag).where(EventTag.event_id == event_id))
+    add_event_tags(connection, [(event_id, tags)])
+
+
+def add_event_tags(connection, events):
+    """Link new events to their tags; ``events`` is a list of ``(event_id, tags)``."""
+    parsed = [(event_id, parse_tags(tags)) for event_id, tags in events]
+    names = {}
+    for _, tags in parsed:
+        for slug, name in tags.items():
+            names.setdefault(slug, name)
+    if not names:
+        return
+    tag_ids = _tag_ids(connection, names)
+    connection.execute(
+        insert(EventTag),
+        [{'event_id': event_id, 'tag_id': tag_ids[slug]} for event_id, tags in parsed for slug in tags],
+    )
+
+
+def _tag_ids(connection, names):
+    known = dict(connection.execute(select(Tag.slug, Tag.id).where(Tag.slug.in_(names))).all())
+    missing = [{'slug': slug, 'name': name} for slug, name in names.items() if slug not in known]
+    if missing:
+        # A concurrent request may create the same tag; keep whichever row won
+        connection.execute(insert(Tag).prefix_with('OR IGNORE', dialect='sqlite'), missing)
+        known = dict(connection.execute(select(Tag.slug, Tag.id).where(Tag.slug.in_(names))).all())
+    return known
+
+
+# Keep event_tag in step with the tags string the forms write
+@event.listens_for(Event, 'after_insert')
+@event.listens_for(Event, 'after_update')
+def sync_event_tags(mapper, connection, target):
+    if inspect(target).attrs.tags.history.has_changes():
+        set_event_tags(connection, target.id, target.tags)
+
+
+@event.listens_for(Event, 'after_delete')
+def delete_event_tags(mapper, connection, target):
+    connection.execute(delete(EventTag).where(EventTag.event_id == target.id))
+
+
+def filter_by_tags(query, tags):
+    """Restrict an ``Event`` query to events carrying every tag in ``tags``."""
+    slugs = {slugify(tag) for tag in tags if tag.strip()}
+    if not slugs:
+        return query
+    tagged = (
+        select(EventTag.event_id)
+        .join(Tag, Tag.id == EventTag.tag_id)
+        .where(Tag.slug.in_(slugs))
+        .group_by(EventTag.event_id)
+        .having(func.count() == len(slugs))
+    )
+    return query.filter(Event.id.in_(tagged))
+
+
+def tag_facets(events=None, limit=None):
+    """Most used tags among ``events`` (an ``Event`` query), or among all events.
+
+    Returns ``[{'name', 'slug', 'count'}]`` ordered by count, then name.
+    """
+    limit = min(limit or DEFAULT_FACET_LIMIT, MAX_FACET_LIMIT)
+    count = func.count().label('count')
+    facets = db.session.query(Tag.name, Tag.slug, count).join(EventTag, EventTag.tag_id == Tag.id)
+    if events is not None:
+        facets = facets.filter(EventTag.event_id.in_(events.with_entities(Event.id).order_by(None)))
+    rows = facets.group_by(Tag.id, Tag.name, Tag.slug).order_by(count.desc(), Tag.name).limit(limit)
+    return [{'name': name, 'slug': slug, 'count': total} for name, slug, total in rows]
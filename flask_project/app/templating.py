@@ -0,0 +1,36 @@
+"""Jinja bytecode cache shared by the workers on one host.
+
+Without it every worker compiles each template from source the first time
+it renders it. With ``JINJA_BYTECODE_CACHE`` on, compiled templates are
+stored under ``JINJA_BYTECODE_CACHE_DIR`` and the other workers (and the
+next restart) load them instead. Jinja names each file after the template
+and checks the source checksum and Python version on load, so an edited
+template or a new interpreter compiles afresh rather than running stale
+code. Files are written to a temporary name and renamed, so concurrent
+workers never read half a file.
+
+``flask templates precompile`` fills the directory at deploy time, so even
+the first request of the first worker skips compilation.
+"""
+import os
+
+from jinja2 import FileSystemBytecodeCache
+
+
+def init_app(app):
+    app.config.setdefault('JINJA_BYTECODE_CACHE', False)
+    app.config.setdefault('JINJA_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+
+    if app.config['JINJA_BYTECODE_CACHE']:
+        directory = app.config['JINJA_BYTECODE_CACHE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def precompile(app):
+    """Compile every template of ``app`` into its bytecode cache; returns the template names."""
+    environment = app.jinja_env
+    names = environment.list_templates()
+    for name in names:
+        environment.get_template(name)
+    return names
@@ -1,16 +1,34 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Response, abort, current_app, make_response, render_template, request, jsonify, redirect, session, stream_with_context, url_for, flash
 from flask_login import current_user, login_user, login_required, logout_user
-from . import db
-from .models import Account, Event
+from markupsafe import Markup
+from sqlalchemy.orm import load_only
+from . import analytics, assets, attendance, auth, db, geo, ics, recommendations
+from .cache import fragment_cache
+from .conflicts import conflict_index
+from .database import read_only
+from .dates import parse_starts_at
+from .instrumentation import require_metrics_access
+from .jobs import job_queue
+from .live import broadcaster
+from .loading import no_other_relationships, with_attendee_names
+from .models import Account, Event, EventAttendance, Recommendation
+from .passwords import HashingBusy, password_hasher
+from .pagination import LISTING_COLUMNS, InvalidCursor, page_size, paginate_events, serialize_event
+from .ratelimit import rate_limiter
+from .search import search_index
+from .suggest import suggest_index
+from .tags import filter_by_tags, tag_facets
 from . import login_manager  
 
 main_bp = Blueprint('main', __name__)
 
-# User loader function
+# Recommendations shown on the home page (more are stored)
+RECOMMENDED_ON_HOME = 6
+
+# User loader function (returns a cached AccountSnapshot, see app/auth.py)
 @login_manager.user_loader
 def load_user(user_id):
-    return Account.query.get(int(user_id))
+    return auth.load_account(user_id)
 
 # Login/Signup route
 @main_bp.route('/', methods=['GET', 'POST'])
@@ -21,26 +39,33 @@ def login():
         action = request.form['action']  
         is_organizer = 'is_organizer' in request.form
 
-        if action == 'login':
-            user = Account.query.filter_by(username=username).first()
-            if user and user.check_password(password):
-                login_user(user)
-                flash('Login successful!', 'success')
-                return redirect(url_for('main.home'))
-            else:
-                flash('Invalid username or password. Please try again.', 'danger')
-
-        elif action == 'signup':
-            existing_user = Account.query.filter_by(username=username).first()
-            if existing_user:
-                flash('Username already exists. Please choose a different username.', 'danger')
-            else:
-                new_account = Account(username=username, is_organizer=is_organizer)
-                new_account.set_password(password)
-                db.session.add(new_account)
-                db.session.commit()
-                flash('Account created successfully! You can now log in.', 'success')
-                return redirect(url_for('main.login'))  
+        try:
+            if action == 'login':
+                user = Account.query.filter_by(username=username).first()
+                if user and user.check_password(password):
+                    # Upgrade hashes made with an older algorithm or cost
+                    if user.password_needs_rehash():
+                        user.set_password(password)
+                        db.session.commit()
+                    login_user(auth.remember(user))
+                    flash('Login successful!', 'success')
+                    return redirect(url_for('main.home'))
+                else:
+                    flash('Invalid username or password. Please try again.', 'danger')
+
+            elif action == 'signup':
+                existing_user = Account.query.filter_by(username=username).first()
+                if existing_user:
+                    flash('Username already exists. Please choose a different username.', 'danger')
+                else:
+                    new_account = Account(username=username, is_organizer=is_organizer)
+                    new_account.set_password(password)
+                    db.session.add(new_account)
+                    db.session.commit()
+                    flash('Account created successfully! You can now log in.', 'success')
+                    return redirect(url_for('main.login'))  
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'danger')
 
     return render_template('login.html')
 
@@ -49,23 +74,42 @@ def login():
 @login_required
 def logout():
     logout_user()
+    auth.clear_session()
     flash('You have been logged out!', 'success')
     return redirect(url_for('main.login'))  
 
-# Search functionality
+# Search functionality (ranked, uses the full-text search index; rate limited per client,
+# identical queries share one cached result)
 @main_bp.route('/search', methods=['GET'])
+@rate_limiter.limit('SEARCH_RATE_LIMIT')
+@read_only
 def search():
     query = request.args.get('query', '')  
     if query:
-        events = Event.query.filter(Event.event_name.ilike(f'%{query}%')).all()
-        return jsonify([event.event_name for event in events])  
+        return jsonify(search_index.search_summaries(query, limit=request.args.get('limit', type=int)))
     return jsonify([])  
 
+# Autocomplete suggestions (served from memory, never queries the database once built;
+# rate limited per client, since the navbar calls it as the user types)
+@main_bp.route('/suggest', methods=['GET'])
+@rate_limiter.limit('SUGGEST_RATE_LIMIT')
+@read_only
+def suggest():
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', type=int) or current_app.config['SUGGEST_LIMIT'], 50)
+    return jsonify(suggest_index.suggest(query, limit=limit))
+
+# Password hashing pool queue depth and latency (same access rules as /metrics)
+@main_bp.route('/status/password-hashing')
+def password_hashing_status():
+    require_metrics_access()
+    return jsonify(password_hasher.stats())
+
 # Settings route
 @main_bp.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
-    user = current_user  
+    user = current_user.account  # Load the Account row; current_user is a read-only snapshot
 
     if request.method == 'POST':
         first_name = request.form['first_name']
@@ -83,7 +127,9 @@ def settings():
             user.last_name = last_name
 
         user.desc = desc
-        user.hobbies = hobbies
+        if hobbies != user.hobbies:
+            user.hobbies = hobbies
+            recommendations.queue_refresh(user.id)
         user.age = age
 
         if username != user.username:
@@ -97,6 +143,7 @@ def settings():
                 return redirect(url_for('main.settings'))  
 
         db.session.commit()
+        auth.remember(user)  # Refresh the cached snapshot with the new profile
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('main.settings'))  
 
@@ -105,6 +152,7 @@ def settings():
 # Profile route
 @main_bp.route('/profile')
 @login_required
+@read_only
 def profile():
     user = current_user  
 
@@ -112,37 +160,106 @@ def profile():
         flash("You need to be logged in to view your profile.", 'danger')
         return redirect(url_for('main.login'))  
 
-    return render_template('profile.html', profile=user)
+    # Subscription URLs for calendar apps
+    feeds = {'attending': url_for('main.attending_calendar', token=ics.feed_token(ics.ATTENDING, user.id), _external=True)}
+    if user.is_organizer:
+        feeds['organizing'] = url_for('main.organizing_calendar', token=ics.feed_token(ics.ORGANIZING, user.username), _external=True)
+
+    return render_template('profile.html', profile=user, attended_events=_attended_events(user.id), feeds=feeds)
 
 # Event details route
 @main_bp.route('/event/<int:event_id>')
 @login_required
+@read_only
 def event_details(event_id):
-    event = Event.query.get_or_404(event_id)  
-    return render_template('events_details.html', event=event)
+    # The event summary is shared by all users; only the actions below it are per-user
+    summary = fragment_cache.get_or_render(fragment_cache.event_key(event_id), lambda: _render_event_summary(event_id))
+    attending = attendance.is_attending(current_user.id, event_id)
+    waitlisted = attendance.is_waitlisted(current_user.id, event_id)
+
+    # Validator covering everything this page shows: the cached summary plus the user's state
+    etag = '%s-%s-%d%d%d' % (summary.etag, current_user.id, bool(current_user.is_organizer), attending, waitlisted)
+    # Pending flash messages (signup outcomes, conflict warnings) are shown once, so that page gets no validator
+    cacheable = not current_user.is_organizer and not session.get('_flashes')
+    if cacheable:
+        if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since
+            and request.if_modified_since.timestamp() >= summary.last_modified
+        ):
+            return _not_modified(etag, summary.last_modified)
+
+    attendee_list = attendance.attendee_names(event_id) if current_user.is_organizer else []
+    response = make_response(render_template(
+        'event_details.html',
+        user=current_user,
+        event=summary.data,
+        summary_html=Markup(summary.html),
+        attending=attending,
+        waitlisted=waitlisted,
+        attendee_list=attendee_list
+    ))
+    if cacheable:
+        response.set_etag(etag)
+        response.last_modified = summary.last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Built static bundles (`flask assets build`); the name changes with the content, so they are cached for good
+@main_bp.route('/assets/<path:filename>')
+def asset(filename):
+    return assets.send(filename)
+
+# Live attendee count for an open event page, as Server-Sent Events
+@main_bp.route('/event/<int:event_id>/live')
+@login_required
+def event_live(event_id):
+    if not current_app.config['LIVE_UPDATES']:
+        abort(404)
+    # The browser sends back the id of the last state it got when it reconnects
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    response = Response(broadcaster.stream(event_id, last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass each message through
+    return response
 
 # Signup route
 @main_bp.route('/signup/<int:event_id>')
 @login_required
 def signup(event_id):
     event = Event.query.get_or_404(event_id)
-    if current_user not in event.user_id_attendance:
-        event.user_id_attendance.append(current_user)
-        db.session.commit()
+    # Events the user attends at the same time (CONFLICT_MODE warns or blocks)
+    clashes = conflict_index.signup_conflicts(current_user.id, event.id)
+    if clashes and current_app.config['CONFLICT_MODE'] == 'block':
+        flash(f"{event.event_name} overlaps {_event_names(clashes)}, which you are attending.", 'danger')
+        return redirect(url_for('main.event_details', event_id=event.id))
+    status = attendance.sign_up(event.id, current_user.id)
+    fragment_cache.invalidate_event(event.id)
+    if status == attendance.SIGNED_UP:
         flash(f"You have successfully signed up for {event.event_name}!", 'success')
+    elif status == attendance.WAITLISTED:
+        flash(f"{event.event_name} is full. You have been added to the waitlist.", 'info')
+    elif status == attendance.ALREADY_WAITLISTED:
+        flash("You are already on the waitlist for this event.", 'info')
     else:
         flash("You are already signed up for this event.", 'info')
+    if clashes and status in (attendance.SIGNED_UP, attendance.WAITLISTED):
+        flash(f"Heads up: {event.event_name} overlaps {_event_names(clashes)}, which you are also attending.", 'warning')
     return redirect(url_for('main.event_details', event_id=event.id))
 
+def _event_names(rows):
+    return ', '.join(f"{row.event_name} ({row.starts_at:%b %d %H:%M})" for row in rows)
+
 # Decline event route
 @main_bp.route('/decline/<int:event_id>')
 @login_required
 def decline(event_id):
     event = Event.query.get_or_404(event_id)
-    if current_user in event.user_id_attendance:
-        event.user_id_attendance.remove(current_user)
-        db.session.commit()
+    status = attendance.decline(event.id, current_user.id)
+    fragment_cache.invalidate_event(event.id)
+    if status == attendance.DECLINED:
         flash(f"You have successfully declined {event.event_name}.", 'success')
+    elif status == attendance.LEFT_WAITLIST:
+        flash(f"You have left the waitlist for {event.event_name}.", 'success')
     else:
         flash("You haven't signed up for this event.", 'info')
     return redirect(url_for('main.event_details', event_id=event.id))
@@ -150,64 +267,316 @@ def decline(event_id):
 # Home route (Updated)
 @main_bp.route('/home')
 @login_required
+@read_only
 def home():
     user = current_user  # Get the currently logged-in user
 
-    # Query featured events (order by date, limit to 6)
-    featured_events = Event.query.order_by(Event.date.asc()).limit(6).all()
+    # Featured events are the same for every user, so the rendered block is cached
+    featured = fragment_cache.get_or_render(fragment_cache.FEATURED_KEY, _render_featured_events)
 
-    # Query managed events (if the user is an organizer)
-    managed_events = Event.query.filter_by(organizer=user.username).all() if user.is_organizer else []
+    # Query one page of upcoming managed events (if the user is an organizer)
+    managed_events = []
+    if user.is_organizer:
+        managed_events = _event_page(Event.upcoming().filter_by(organizer=user.username).options(no_other_relationships()))
 
     # Query attended events (if the user has signed up for any)
-    attended_events = user.event_attendance if not user.is_organizer else []
+    attended_events = _attended_events(user.id) if not user.is_organizer else []
 
-    return render_template(
+    # Precomputed by app/recommendations.py; events that have started since are skipped
+    recommended_events = _recommended_events(user.id) if not user.is_organizer else []
+
+    response = make_response(render_template(
         'home.html',
         user=user,
-        featured_events=featured_events,
+        featured_html=Markup(featured.html),
         managed_events=managed_events,
-        attended_events=attended_events
-    )
+        attended_events=attended_events,
+        recommended_events=recommended_events
+    ))
+    # Let the browser revalidate instead of downloading an unchanged page again
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
 # Manager dashboard
 @main_bp.route('/manager')
+@read_only
 def manager_dashboard():
-    events = Event.query.filter_by(organizer="current_manager").all()
-    return render_template('events.html', events=events)
+    search_query = request.args.get('search', '')
+    selected_tags = request.args.getlist('tag')
+    events = Event.query
+    if current_user.is_authenticated and current_user.is_organizer:
+        events = events.filter_by(organizer=current_user.username)  # Organizers manage their own events
+    if search_query:
+        events = events.filter(search_index.match_clause(search_query))
+    events = filter_by_tags(events, selected_tags)
+    page = events.options(no_other_relationships())
+    if current_user.is_authenticated and current_user.is_organizer:
+        page = page.options(with_attendee_names())
+    return render_template(
+        'events.html',
+        user=current_user,
+        events=_event_page(page),
+        facets=tag_facets(events),
+        search_query=search_query,
+        selected_tags=selected_tags,
+    )
+
+# Organizer analytics (reads only the rollups kept by app/analytics.py; ?days= sets the window)
+@main_bp.route('/manager/analytics')
+@login_required
+@read_only
+def analytics_dashboard():
+    if not current_user.is_organizer:
+        abort(403)
+    report = analytics.dashboard(current_user.username, request.args.get('days', type=int))
+    return render_template('analytics.html', user=current_user, report=report)
+
+@main_bp.route('/api/analytics')
+@login_required
+@read_only
+def api_analytics():
+    if not current_user.is_organizer:
+        abort(403)
+    return jsonify(analytics.dashboard(current_user.username, request.args.get('days', type=int)))
+
+# Organizer schedule conflicts: double bookings and clashes at the organizer's locations
+@main_bp.route('/manager/conflicts')
+@login_required
+@read_only
+def conflicts_report():
+    if not current_user.is_organizer:
+        abort(403)
+    return render_template('conflicts.html', user=current_user, conflicts=conflict_index.report(current_user.username))
+
+@main_bp.route('/api/conflicts')
+@login_required
+@read_only
+def api_conflicts():
+    if not current_user.is_organizer:
+        abort(403)
+    return jsonify({'conflicts': conflict_index.report(current_user.username)})
+
+# Event listing API (keyset paginated, pass next_cursor back as ?cursor=; ?tag= may repeat)
+@main_bp.route('/api/events')
+@login_required
+@read_only
+def api_events():
+    return _event_page_json(_listing_query())
+
+# Search API (matching events, keyset paginated by date)
+@main_bp.route('/api/events/search')
+@login_required
+@read_only
+def api_search_events():
+    if not request.args.get('q'):
+        return jsonify({'events': [], 'next_cursor': None})
+    return _event_page_json(_listing_query())
+
+# Events near a point (?lat=&lon=&radius_km=) or a known place (?near=), nearest first, or
+# inside ?bbox=south,west,north,east by date; combines with the listing filters (?q=, ?tag=, ?upcoming=1)
+@main_bp.route('/api/events/near')
+@login_required
+@read_only
+def api_events_near():
+    limit = page_size(request.args.get('limit', type=int))
+    if request.args.get('bbox'):
+        try:
+            south, west, north, east = (float(value) for value in request.args['bbox'].split(','))
+            events = geo.in_box(_listing_query(), south, west, north, east, limit)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid bbox: {e}'}), 400
+        return jsonify({'events': [_geo_event(event) for event in events]})
+
+    place = request.args.get('near')
+    if place:
+        point = geo.geocode([place]).get(place)
+        if point is None:
+            return jsonify({'error': f'Unknown place {place!r}'}), 400
+        latitude, longitude = point
+    else:
+        latitude, longitude = request.args.get('lat', type=float), request.args.get('lon', type=float)
+        if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return jsonify({'error': 'Pass lat and lon, near or bbox.'}), 400
+    radius_km = request.args.get('radius_km', type=float) or current_app.config['GEO_DEFAULT_RADIUS_KM']
+    if not radius_km > 0:
+        return jsonify({'error': 'radius_km must be positive.'}), 400
+    radius_km = min(radius_km, current_app.config['GEO_MAX_RADIUS_KM'])
+    events = geo.nearby(_listing_query(), latitude, longitude, radius_km, limit)
+    return jsonify({
+        'center': {'latitude': latitude, 'longitude': longitude},
+        'radius_km': radius_km,
+        'events': [_geo_event(event, km) for event, km in events],
+    })
+
+# Tag counts for the events the same filters would list
+@main_bp.route('/api/events/facets')
+@login_required
+@read_only
+def api_event_facets():
+    events = _listing_query()
+    filtered = any(request.args.get(name) for name in ('q', 'tag', 'organizer', 'upcoming'))
+    return jsonify({'tags': tag_facets(events if filtered else None, request.args.get('limit', type=int))})
+
+# Calendar feeds; calendar apps cannot log in, so the URL carries a signed token
+@main_bp.route('/calendar/attending/<token>.ics')
+@read_only
+def attending_calendar(token):
+    account_id = _feed_subject(token, ics.ATTENDING)
+    return _calendar_response(ics.feed_filter(ics.ATTENDING, account_id), 'My events')
+
+@main_bp.route('/calendar/organizing/<token>.ics')
+@read_only
+def organizing_calendar(token):
+    username = _feed_subject(token, ics.ORGANIZING)
+    return _calendar_response(ics.feed_filter(ics.ORGANIZING, username), f'Events by {username}')
+
+def _feed_subject(token, kind):
+    try:
+        return ics.load_feed_token(token, kind)
+    except ics.InvalidFeedToken:
+        abort(404)
+
+def _calendar_response(statement, name):
+    # One aggregate query decides 304 before any event is loaded
+    etag = ics.feed_etag(statement)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = Response(stream_with_context(ics.stream_feed(statement, name)), mimetype='text/calendar')
+        response.headers['Content-Disposition'] = 'inline; filename="events.ics"'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _render_featured_events():
+    # Next 6 upcoming events, by start time
+    featured_events = (
+        Event.upcoming()
+        .options(load_only(*LISTING_COLUMNS), no_other_relationships())
+        .order_by(Event.starts_at.asc(), Event.id.asc())
+        .limit(6)
+        .all()
+    )
+    return render_template('_featured_events.html', featured_events=featured_events), None
+
+def _render_event_summary(event_id):
+    event = Event.query.options(load_only(*LISTING_COLUMNS), no_other_relationships()).filter_by(id=event_id).first_or_404()
+    data = {
+        'id': event.id,
+        'event_name': event.event_name,
+        'is_full': event.capacity is not None and event.attendee_count >= event.capacity,
+    }
+    return render_template('_event_summary.html', event=event), data
+
+def _not_modified(etag, last_modified):
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _attended_events(account_id):
+    return (
+        Event.query.join(EventAttendance, EventAttendance.event_id == Event.id)
+        .filter(EventAttendance.account_id == account_id)
+        .options(load_only(*LISTING_COLUMNS), no_other_relationships())
+        .order_by(Event.starts_at.asc(), Event.id.asc())
+        .all()
+    )
+
+def _recommended_events(account_id):
+    return (
+        Event.upcoming().join(Recommendation, Recommendation.event_id == Event.id)
+        .filter(Recommendation.account_id == account_id)
+        .options(load_only(*LISTING_COLUMNS), no_other_relationships())
+        .order_by(Recommendation.rank.asc())
+        .limit(RECOMMENDED_ON_HOME)
+        .all()
+    )
+
+def _listing_query():
+    events = Event.upcoming() if request.args.get('upcoming', type=int) else Event.query
+    organizer = request.args.get('organizer')
+    if organizer:
+        events = events.filter_by(organizer=organizer)
+    query = request.args.get('q')
+    if query:
+        events = events.filter(search_index.match_clause(query))
+    return filter_by_tags(events, request.args.getlist('tag'))
+
+def _event_page(query):
+    try:
+        return paginate_events(query, request.args.get('cursor'), request.args.get('limit', type=int))
+    except InvalidCursor:
+        abort(400)
+
+def _geo_event(event, km=None):
+    data = {**serialize_event(event), 'latitude': event.latitude, 'longitude': event.longitude}
+    if km is not None:
+        data['distance_km'] = round(km, 3)
+    return data
+
+def _event_page_json(query):
+    page = _event_page(query)
+    return jsonify({'events': [serialize_event(event) for event in page], 'next_cursor': page.next_cursor})
 
 # Create event
 @main_bp.route('/create_event', methods=['POST'])
 @login_required
 def create_event():
     title = request.form.get('event_name')
-    description = request.form.get('description')
+    event_type = request.form.get('event_type')
+    description = request.form.get('desc')
     date = request.form.get('date')
     time = request.form.get('time')
     location = request.form.get('location')
     tags = request.form.get('tags')
+    capacity = request.form.get('capacity', type=int)
 
     # Validate input
-    if not title or not description or not date or not time or not location:
-        flash("All fields except 'Tags' are required.", 'danger')
+    if not title or not event_type or not description or not date or not time or not location:
+        flash("All fields except 'Tags' and 'Capacity' are required.", 'danger')
+        return redirect(url_for('main.home'))
+    if capacity is not None and capacity < 1:
+        flash("Capacity must be at least 1.", 'danger')
+        return redirect(url_for('main.home'))
+
+    # Overlaps with the organizer's own events or other events at the location
+    clashes = conflict_index.booking_conflicts(current_user.username, location, parse_starts_at(date, time))
+    if any(clashes.values()) and current_app.config['CONFLICT_MODE'] == 'block':
+        _flash_booking_conflicts(clashes, 'danger')
         return redirect(url_for('main.home'))
 
     # Create the event and assign the logged-in user as the organizer
     try:
         event = Event(
             event_name=title,
-            description=description,
+            event_type=event_type,
+            desc=description,
             date=date,
             time=time,
             location=location,
             tags=tags,
+            capacity=capacity,
             organizer=current_user.username  # Associate with logged-in user
         )
         db.session.add(event)
+        db.session.flush()  # Assigns event.id for the job payload; both commit together
+        job_queue.enqueue('event_created', {'event_id': event.id})
         db.session.commit()
+        suggest_index.add_event(event.id, event.event_name, event.tags)
+        fragment_cache.invalidate_featured()
         flash("Event created successfully!", 'success')
+        _flash_booking_conflicts(clashes, 'warning')
     except Exception as e:
         flash(f"An error occurred: {str(e)}", 'danger')
 
     return redirect(url_for('main.home'))
 
+def _flash_booking_conflicts(clashes, category):
+    if clashes['organizer']:
+        flash(f"You are already running {_event_names(clashes['organizer'])} at that time.", category)
+    if clashes['location']:
+        flash(f"The location is booked for {_event_names(clashes['location'])} at that time.", category)
+
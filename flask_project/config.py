@@ -1,3 +1,130 @@
 class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Search: 'auto' uses SQLite FTS5 when available, otherwise an in-process index
+    SEARCH_BACKEND = 'auto'
+    SEARCH_RESULT_LIMIT = 20
+
+    # Navbar search: identical queries within SEARCH_CACHE_TTL seconds share one result, and
+    # each client (account or IP) gets a token bucket of SEARCH_RATE_LIMIT = (burst, per second)
+    SEARCH_CACHE_TTL = 5
+    SEARCH_RATE_LIMIT = (10, 2.0)
+    RATELIMIT_STORAGE = 'memory'
+
+    # Autocomplete: number of suggestions, how often each worker reloads its copy, and the
+    # per-client token bucket (burst, per second); the navbar asks at most every 250 ms
+    SUGGEST_LIMIT = 8
+    SUGGEST_MAX_AGE = 300
+    SUGGEST_RATE_LIMIT = (20, 5.0)
+
+    # Logged-in account snapshots: per-worker LRU cache, or carried in the signed session cookie
+    ACCOUNT_CACHE_SIZE = 1024
+    ACCOUNT_CACHE_TTL = 60
+    LOGIN_SESSION_SNAPSHOT = False
+
+    # Password hashing: 'pbkdf2:sha256', 'pbkdf2:sha512', 'scrypt' or 'bcrypt'. Cost is the
+    # iteration count, scrypt N or bcrypt rounds; changing either rehashes passwords on next login.
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256'
+    PASSWORD_HASH_COST = 600000
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_MAX_PENDING = 64
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Rendered-fragment cache: 'filesystem' (shared by all workers on the host, under CACHE_DIR),
+    # 'memory' (size-bounded LRU per worker; only safe with a single worker process) or 'null'
+    CACHE_BACKEND = 'filesystem'
+    CACHE_MAX_BYTES = 32 * 1024 * 1024
+    CACHE_DEFAULT_TIMEOUT = 300
+
+    # Per-request SQL/template timing with N+1 warnings, a Server-Timing header and
+    # Prometheus metrics at INSTRUMENTATION_METRICS_PATH. Off unless enabled. The metrics need
+    # INSTRUMENTATION_METRICS_TOKEN as a bearer token and are 404 without one, unless
+    # INSTRUMENTATION_METRICS_LOOPBACK allows loopback clients (not behind a local reverse proxy).
+    INSTRUMENTATION_ENABLED = False
+    INSTRUMENTATION_SAMPLE_RATE = 1.0
+    INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5
+    INSTRUMENTATION_METRICS_TOKEN = None
+    INSTRUMENTATION_METRICS_LOOPBACK = False
+
+    # Background jobs (notifications): worker threads per process, started on the first
+    # request; failed jobs are retried JOB_MAX_ATTEMPTS times, backing off from JOB_BACKOFF_BASE s.
+    # Recommendation jobs run in these threads too, unless JOB_DEDICATED_WORKER says a separate
+    # `flask jobs work` process is deployed for them (set it only where one is started).
+    JOB_WORKER_ENABLED = True
+    JOB_WORKERS = 2
+    JOB_MAX_ATTEMPTS = 5
+    JOB_BACKOFF_BASE = 2.0
+    JOB_DEDICATED_WORKER = False
+
+    # Event reminders go out this many seconds before the start; outbox stands in for email
+    REMINDER_LEAD = 86400
+    REMINDER_SCAN_INTERVAL = 300
+
+    # Organizer dashboard: the attendance log is folded into its rollups this often (seconds)
+    ANALYTICS_COMPACT_INTERVAL = 60
+
+    # Overlapping events at signup and event creation: 'warn', 'block' or 'off'. Events last
+    # CALENDAR_EVENT_DURATION seconds; the interval index is rebuilt every CONFLICT_INDEX_MAX_AGE s
+    CONFLICT_MODE = 'warn'
+    CONFLICT_INDEX_MAX_AGE = 600
+
+    # Live attendee counts on event pages (Server-Sent Events). Each worker probes attendance_log
+    # every LIVE_POLL_INTERVAL s for other workers' changes; streams end after LIVE_STREAM_SECONDS
+    # and the browser reconnects. Each open stream holds a worker thread, so use gthread/gevent workers.
+    LIVE_UPDATES = True
+    LIVE_POLL_INTERVAL = 2.0
+    LIVE_KEEPALIVE = 15
+    LIVE_STREAM_SECONDS = 300
+
+    # Nearby events (/api/events/near): default and largest search radius in km
+    GEO_DEFAULT_RADIUS_KM = 2.0
+    GEO_MAX_RADIUS_KM = 50.0
+
+    # Startup: STARTUP_OPTIMIZED leaves Flask-Migrate and the CLI commands out of web workers
+    # (they are still set up under the flask command). JINJA_BYTECODE_CACHE stores compiled
+    # templates under JINJA_BYTECODE_CACHE_DIR for every worker; fill it with `flask templates precompile`.
+    STARTUP_OPTIMIZED = False
+    JINJA_BYTECODE_CACHE = False
+
+    # Static bundles built by `flask assets build` into ASSETS_DIR (app/static/dist by default)
+    # and served from /assets/ with this max-age and `immutable`
+    ASSETS_MAX_AGE = 365 * 86400
+
+
+class ProductionConfig(Config):
+    """Profile for several gunicorn workers sharing one SQLite file."""
+
+    # Wait for the write lock instead of failing with "database is locked"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+        'connect_args': {'timeout': 15, 'check_same_thread': False},
+    }
+
+    # Applied to every new connection. WAL lets readers run alongside the writer.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 15000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,  # negative means KiB, i.e. 64 MB
+        'temp_store': 'MEMORY',
+    }
+
+    # Separate engine for @read_only views: a replica URL, or 'sqlite-readonly'
+    # for read-only connections to the primary SQLite file
+    SQLALCHEMY_READ_DATABASE_URI = 'sqlite-readonly'
+
+    # One set of rate-limit buckets shared by all workers on the host
+    RATELIMIT_STORAGE = 'sqlite'
+
+    # Autoscaled workers restart often: start them lean and share compiled templates
+    STARTUP_OPTIMIZED = True
+    JINJA_BYTECODE_CACHE = True
+
+    # Measure one request in twenty when instrumentation is switched on
+    INSTRUMENTATION_SAMPLE_RATE = 0.05
@@ -0,0 +1,64 @@
+"""Add full-text search index over events
+
+Revision ID: 3b9c1f7d2e4a
+Revises: 158f65ae60eb
+Create Date: 2024-12-12 14:05:11.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9c1f7d2e4a'
+down_revision = '158f65ae60eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 only exists on SQLite; other backends use the in-process index in app/search.py
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5(
+            event_name, "desc", location, tags,
+            content='event', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS event_fts_ai AFTER INSERT ON event BEGIN
+            INSERT INTO event_fts(rowid, event_name, "desc", location, tags)
+            VALUES (new.id, new.event_name, new."desc", new.location, new.tags);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS event_fts_ad AFTER DELETE ON event BEGIN
+            INSERT INTO event_fts(event_fts, rowid, event_name, "desc", location, tags)
+            VALUES ('delete', old.id, old.event_name, old."desc", old.location, old.tags);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS event_fts_au
+        AFTER UPDATE OF event_name, "desc", location, tags ON event BEGIN
+            INSERT INTO event_fts(event_fts, rowid, event_name, "desc", location, tags)
+            VALUES ('delete', old.id, old.event_name, old."desc", old.location, old.tags);
+            INSERT INTO event_fts(rowid, event_name, "desc", location, tags)
+            VALUES (new.id, new.event_name, new."desc", new.location, new.tags);
+        END
+    """)
+
+    # Index the events that already exist
+    op.execute("INSERT INTO event_fts(event_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute('DROP TRIGGER IF EXISTS event_fts_au')
+    op.execute('DROP TRIGGER IF EXISTS event_fts_ad')
+    op.execute('DROP TRIGGER IF EXISTS event_fts_ai')
+    op.execute('DROP TABLE IF EXISTS event_fts')
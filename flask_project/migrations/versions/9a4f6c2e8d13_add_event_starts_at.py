@@ -0,0 +1,88 @@
+"""Add typed, indexed starts_at column to Event
+
+Revision ID: 9a4f6c2e8d13
+Revises: 5e2d8a4c9b71
+Create Date: 2024-12-14 11:37:02.664180
+
+"""
+from datetime import datetime, time as dt_time
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f6c2e8d13'
+down_revision = '5e2d8a4c9b71'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+# Frozen copy of app/dates.py at the time of this migration
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%Y/%m/%d', '%m-%d-%Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M%p', '%I:%M %p', '%I%p', '%I %p')
+
+
+def _parse(value, formats):
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_starts_at(date, time):
+    day = _parse((date or '').strip(), DATE_FORMATS)
+    if day is None:
+        return None
+    clock = _parse((time or '').strip().upper().replace('.', ''), TIME_FORMATS)
+    return datetime.combine(day.date(), clock.time() if clock else dt_time.min)
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('starts_at', sa.DateTime(), nullable=True))
+
+    # Backfill from the date/time strings in id order, one batch per round trip
+    event = sa.table(
+        'event',
+        sa.column('id', sa.Integer),
+        sa.column('date', sa.String),
+        sa.column('time', sa.String),
+        sa.column('starts_at', sa.DateTime),
+    )
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(event.c.id, event.c.date, event.c.time)
+            .where(event.c.id > last_id)
+            .order_by(event.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        updates = [
+            {'event_id': row.id, 'starts_at': parse_starts_at(row.date, row.time)}
+            for row in rows
+        ]
+        connection.execute(
+            event.update().where(event.c.id == sa.bindparam('event_id')).values(starts_at=sa.bindparam('starts_at')),
+            updates,
+        )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_date_id')
+        batch_op.create_index(batch_op.f('ix_event_starts_at'), ['starts_at'], unique=False)
+        batch_op.create_index('ix_event_organizer_starts_at', ['organizer', 'starts_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_organizer_starts_at')
+        batch_op.drop_index(batch_op.f('ix_event_starts_at'))
+        batch_op.create_index('ix_event_date_id', ['date', 'id'], unique=False)
+        batch_op.drop_column('starts_at')
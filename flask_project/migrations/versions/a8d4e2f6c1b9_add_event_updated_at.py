@@ -0,0 +1,35 @@
+"""Add updated_at column to Event
+
+Revision ID: a8d4e2f6c1b9
+Revises: f2b7c9d4a1e3
+Create Date: 2024-12-20 09:48:13.402117
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4e2f6c1b9'
+down_revision = 'f2b7c9d4a1e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing events have no edit history; count them as changed now
+    event = sa.table('event', sa.column('updated_at', sa.DateTime))
+    op.get_bind().execute(event.update().values(updated_at=datetime.now()))
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,38 @@
+"""Add recommendation table
+
+Revision ID: b3e7f1a9d5c2
+Revises: a8d4e2f6c1b9
+Create Date: 2024-12-21 16:05:29.817342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e7f1a9d5c2'
+down_revision = 'a8d4e2f6c1b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recommendation',
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ),
+    sa.PrimaryKeyConstraint('account_id', 'event_id')
+    )
+    with op.batch_alter_table('recommendation', schema=None) as batch_op:
+        batch_op.create_index('ix_recommendation_account_rank', ['account_id', 'rank'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('recommendation', schema=None) as batch_op:
+        batch_op.drop_index('ix_recommendation_account_rank')
+
+    op.drop_table('recommendation')
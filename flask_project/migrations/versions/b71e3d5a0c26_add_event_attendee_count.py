@@ -0,0 +1,31 @@
+"""Add denormalized attendee_count to Event
+
+Revision ID: b71e3d5a0c26
+Revises: 9a4f6c2e8d13
+Create Date: 2024-12-15 16:48:29.031557
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e3d5a0c26'
+down_revision = '9a4f6c2e8d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attendee_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        'UPDATE event SET attendee_count = '
+        '(SELECT COUNT(*) FROM event_attendance WHERE event_attendance.event_id = event.id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('attendee_count')
@@ -0,0 +1,81 @@
+"""Add attendance log and rollup tables
+
+Revision ID: c5d2e8a4f7b1
+Revises: b3e7f1a9d5c2
+Create Date: 2024-12-22 10:41:07.215604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2e8a4f7b1'
+down_revision = 'b3e7f1a9d5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('attendance_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('account_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['account_id'], ['account.id'], ),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('attendance_daily',
+    sa.Column('organizer', sa.String(length=100), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('signed_up', sa.Integer(), nullable=False),
+    sa.Column('waitlisted', sa.Integer(), nullable=False),
+    sa.Column('promoted', sa.Integer(), nullable=False),
+    sa.Column('declined', sa.Integer(), nullable=False),
+    sa.Column('left_waitlist', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('organizer', 'day')
+    )
+    op.create_table('event_attendance_stats',
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('organizer', sa.String(length=100), nullable=False),
+    sa.Column('signed_up', sa.Integer(), nullable=False),
+    sa.Column('waitlisted', sa.Integer(), nullable=False),
+    sa.Column('promoted', sa.Integer(), nullable=False),
+    sa.Column('declined', sa.Integer(), nullable=False),
+    sa.Column('left_waitlist', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['event.id'], ),
+    sa.PrimaryKeyConstraint('event_id')
+    )
+    with op.batch_alter_table('event_attendance_stats', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_event_attendance_stats_organizer'), ['organizer'], unique=False)
+
+    op.create_table('tag_attendance_stats',
+    sa.Column('organizer', sa.String(length=100), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('signed_up', sa.Integer(), nullable=False),
+    sa.Column('waitlisted', sa.Integer(), nullable=False),
+    sa.Column('promoted', sa.Integer(), nullable=False),
+    sa.Column('declined', sa.Integer(), nullable=False),
+    sa.Column('left_waitlist', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ),
+    sa.PrimaryKeyConstraint('organizer', 'tag_id')
+    )
+    op.create_table('rollup_state',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('rollup_state')
+    op.drop_table('tag_attendance_stats')
+    with op.batch_alter_table('event_attendance_stats', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_event_attendance_stats_organizer'))
+
+    op.drop_table('event_attendance_stats')
+    op.drop_table('attendance_daily')
+    op.drop_table('attendance_log')
@@ -0,0 +1,141 @@
+"""Add venue gazetteer and event coordinates
+
+Revision ID: d7a3f1c8b5e2
+Revises: c5d2e8a4f7b1
+Create Date: 2024-12-23 09:12:44.508317
+
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3f1c8b5e2'
+down_revision = 'c5d2e8a4f7b1'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+# Frozen copy of app/geo.py at the time of this migration
+CELL_DEGREES = 0.01
+GRID_COLUMNS = round(360 / CELL_DEGREES)
+
+PLACES = (
+    ('Cathedral of Learning', 40.4443, -79.9532),
+    ('Cathy', 40.4443, -79.9532),
+    ('William Pitt Union', 40.4433, -79.9546),
+    ('WPU', 40.4433, -79.9546),
+    ('Hillman Library', 40.4425, -79.954),
+    ('Posvar Hall', 40.4416, -79.9537),
+    ('Wesley W. Posvar Hall', 40.4416, -79.9537),
+    ('Petersen Events Center', 40.4439, -79.9622),
+    ('The Pete', 40.4439, -79.9622),
+    ('Heinz Memorial Chapel', 40.4447, -79.9513),
+    ('Soldiers and Sailors Memorial Hall', 40.4451, -79.9563),
+    ('Alumni Hall', 40.4454, -79.954),
+    ('Sennott Square', 40.4415, -79.9562),
+    ('Benedum Hall', 40.4437, -79.9585),
+    ('Frick Fine Arts Building', 40.4419, -79.9512),
+    ('Litchfield Towers', 40.4424, -79.9568),
+    ('Trees Hall', 40.445, -79.965),
+    ('Schenley Plaza', 40.4424, -79.9529),
+    ('Schenley Park', 40.434, -79.942),
+    ('Phipps Conservatory', 40.439, -79.9475),
+    ('Carnegie Museum of Natural History', 40.4433, -79.9498),
+    ('Carnegie Mellon University', 40.4433, -79.9436),
+    ('Oakland', 40.4418, -79.9561),
+    ('Shadyside', 40.456, -79.933),
+    ('Squirrel Hill', 40.438, -79.923),
+    ('Lawrenceville', 40.467, -79.961),
+    ('Strip District', 40.451, -79.983),
+    ('South Side', 40.4286, -79.975),
+    ('Station Square', 40.434, -80.005),
+    ('Mount Washington', 40.432, -80.009),
+    ('Downtown', 40.4413, -79.9986),
+    ('Point State Park', 40.4416, -80.0127),
+    ('PPG Paints Arena', 40.4395, -79.9892),
+    ('PNC Park', 40.4469, -80.0057),
+    ('Acrisure Stadium', 40.4468, -80.0158),
+    ('Pittsburgh', 40.4406, -79.9959),
+)
+
+
+def location_key(location):
+    if not location:
+        return None
+    return ' '.join(location.casefold().split()) or None
+
+
+def cell(latitude, longitude):
+    row = math.floor((latitude + 90) / CELL_DEGREES)
+    column = math.floor((longitude + 180) / CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+def upgrade():
+    venue = op.create_table('venue',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.bulk_insert(venue, [
+        {'key': location_key(name), 'name': name, 'latitude': latitude, 'longitude': longitude}
+        for name, latitude, longitude in PLACES
+    ])
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('geo_cell', sa.Integer(), nullable=True))
+
+    # Geocode existing events from the gazetteer in id order, one batch per round trip
+    places = {location_key(name): (latitude, longitude) for name, latitude, longitude in PLACES}
+    event = sa.table(
+        'event',
+        sa.column('id', sa.Integer),
+        sa.column('location', sa.String),
+        sa.column('latitude', sa.Float),
+        sa.column('longitude', sa.Float),
+        sa.column('geo_cell', sa.Integer),
+    )
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(event.c.id, event.c.location)
+            .where(event.c.id > last_id)
+            .order_by(event.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            point = places.get(location_key(row.location))
+            if point is not None:
+                updates.append({'event_id': row.id, 'lat': point[0], 'lon': point[1], 'cell': cell(*point)})
+        if updates:
+            connection.execute(
+                event.update()
+                .where(event.c.id == sa.bindparam('event_id'))
+                .values(latitude=sa.bindparam('lat'), longitude=sa.bindparam('lon'), geo_cell=sa.bindparam('cell')),
+                updates,
+            )
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_event_geo_cell'), ['geo_cell'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_event_geo_cell'))
+        batch_op.drop_column('geo_cell')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
+
+    op.drop_table('venue')
@@ -0,0 +1,26 @@
+"""Add index on Event.updated_at
+
+Revision ID: e3b8c6d1f4a7
+Revises: d7a3f1c8b5e2
+Create Date: 2024-12-24 10:05:31.617204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b8c6d1f4a7'
+down_revision = 'd7a3f1c8b5e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_event_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_event_updated_at'))